@@ -0,0 +1,156 @@
+"""Benchmark the ``socat`` and ``mux`` socket proxy engines against each other
+
+Both engines are run on this machine (rather than in a sidecar container), in
+front of a minimal HTTP server, and hammered with short-lived HTTP/1.0
+connections through their unix socket, the same way nginx uses them::
+
+    python benchmarks/proxy_engines.py --requests 5000 --concurrency 50
+
+The ``socat`` engine needs the ``socat`` binary; it is skipped if it isn't
+installed. The ``mux`` engine only needs Python.
+"""
+
+import argparse, asyncio, json, multiprocessing, os, shutil, socket, statistics
+import subprocess, sys, tempfile, time
+
+PROXY = os.path.join(os.path.dirname(__file__), "..", "dna", "proxy.py")
+RESPONSE = b"HTTP/1.0 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+
+def serve_backend(port):
+    """Answer every connection with a tiny HTTP response, then close it"""
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(RESPONSE)
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", port, backlog=1024)
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(path, timeout=10):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if time.time() > deadline:
+            raise TimeoutError(f"{path} never appeared")
+        time.sleep(0.05)
+
+
+def start_socat(root, port):
+    path = os.path.join(root, "bench.sock")
+    proc = subprocess.Popen(
+        ["socat", f"unix-listen:{path},fork,reuseaddr", f"tcp-connect:127.0.0.1:{port}"]
+    )
+    wait_for(path)
+    return proc, path
+
+
+def start_mux(root, port):
+    proc = subprocess.Popen([sys.executable, PROXY, root])
+    control = os.path.join(root, ".mux-control")
+    wait_for(control)
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(control)
+        request = {"op": "bind", "name": "bench", "host": "127.0.0.1", "port": port}
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        assert json.loads(sock.makefile().readline())["ok"]
+    return proc, os.path.join(root, "bench.sock")
+
+
+async def load(path, requests, concurrency):
+    """Send ``requests`` requests through ``path``, ``concurrency`` at a time
+
+    :return: the latency of every successful request, and the number of errors
+    """
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(b"GET / HTTP/1.0\r\n\r\n")
+                body = await reader.read()
+                writer.close()
+                if not body.endswith(b"ok"):
+                    raise ConnectionError("short response")
+                latencies.append(time.perf_counter() - start)
+            except OSError:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def bench(name, start, port, requests, concurrency):
+    root = tempfile.mkdtemp(prefix=f"dna-bench-{name}-")
+    proc, path = start(root, port)
+    try:
+        asyncio.run(load(path, min(requests, 200), concurrency))  # warm up
+        began = time.perf_counter()
+        latencies, errors = asyncio.run(load(path, requests, concurrency))
+        elapsed = time.perf_counter() - began
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+    latencies.sort()
+    quantile = (
+        lambda q: latencies[int(q * (len(latencies) - 1))] * 1000
+        if latencies
+        else float("nan")
+    )
+    return {
+        "engine": name,
+        "rps": len(latencies) / elapsed,
+        "p50": quantile(0.5),
+        "p99": quantile(0.99),
+        "mean": statistics.mean(latencies) * 1000 if latencies else float("nan"),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--engines", nargs="+", default=["socat", "mux"])
+    args = parser.parse_args()
+
+    port = free_port()
+    backend = multiprocessing.Process(target=serve_backend, args=(port,), daemon=True)
+    backend.start()
+    time.sleep(0.5)
+
+    engines = {"socat": start_socat, "mux": start_mux}
+    print(
+        f"{'engine':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'errors':>8}"
+    )
+    for name in args.engines:
+        if name == "socat" and not shutil.which("socat"):
+            print(f"{name:<8}skipped (socat isn't installed)")
+            continue
+        r = bench(name, engines[name], port, args.requests, args.concurrency)
+        print(
+            f"{name:<8}{r['rps']:>10.0f}{r['p50']:>10.2f}{r['p99']:>10.2f}{r['mean']:>10.2f}{r['errors']:>8}"
+        )
+
+    backend.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark the ``direct`` proxy mode against the ``socket`` proxy mode
+
+In ``socket`` mode, nginx connects to a service's unix socket, and the socket
+engine opens a second connection to the container. In ``direct`` mode, nginx
+connects to the container's address itself. nginx is the same in both modes,
+so this leaves it out, and measures the hop after it: straight to a minimal
+HTTP server over TCP, or through each socket engine's unix socket::
+
+    python benchmarks/proxy_modes.py --requests 5000 --concurrency 50
+
+The ``socket-socat`` path needs the ``socat`` binary; it is skipped if it isn't
+installed.
+"""
+
+import argparse, asyncio, multiprocessing, shutil, statistics, tempfile, time
+from proxy_engines import free_port, serve_backend, start_mux, start_socat
+
+
+async def load(connect, requests, concurrency):
+    """Send ``requests`` requests over connections opened by ``connect``,\
+        ``concurrency`` at a time
+
+    :return: the latency of every successful request, and the number of errors
+    """
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                reader, writer = await connect()
+                writer.write(b"GET / HTTP/1.0\r\n\r\n")
+                body = await reader.read()
+                writer.close()
+                if not body.endswith(b"ok"):
+                    raise ConnectionError("short response")
+                latencies.append(time.perf_counter() - start)
+            except OSError:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def bench(name, port, requests, concurrency):
+    """Run the load against one path
+
+    :return: a dictionary of the throughput, latency percentiles, and errors
+    """
+    proc, root = None, None
+    if name == "direct":
+        connect = lambda: asyncio.open_connection("127.0.0.1", port)
+    else:
+        root = tempfile.mkdtemp(prefix=f"dna-bench-{name}-")
+        start = start_socat if name == "socket-socat" else start_mux
+        proc, path = start(root, port)
+        connect = lambda: asyncio.open_unix_connection(path)
+
+    try:
+        asyncio.run(load(connect, min(requests, 200), concurrency))  # warm up
+        began = time.perf_counter()
+        latencies, errors = asyncio.run(load(connect, requests, concurrency))
+        elapsed = time.perf_counter() - began
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(root, ignore_errors=True)
+
+    latencies.sort()
+    quantile = (
+        lambda q: latencies[int(q * (len(latencies) - 1))] * 1000
+        if latencies
+        else float("nan")
+    )
+    return {
+        "path": name,
+        "rps": len(latencies) / elapsed,
+        "p50": quantile(0.5),
+        "p99": quantile(0.99),
+        "mean": statistics.mean(latencies) * 1000 if latencies else float("nan"),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--paths", nargs="+", default=["direct", "socket-mux", "socket-socat"]
+    )
+    args = parser.parse_args()
+
+    port = free_port()
+    backend = multiprocessing.Process(target=serve_backend, args=(port,), daemon=True)
+    backend.start()
+    time.sleep(0.5)
+
+    print(
+        f"{'path':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'errors':>8}"
+    )
+    for name in args.paths:
+        if name == "socket-socat" and not shutil.which("socat"):
+            print(f"{name:<14}skipped (socat isn't installed)")
+            continue
+        r = bench(name, port, args.requests, args.concurrency)
+        print(
+            f"{name:<14}{r['rps']:>10.0f}{r['p50']:>10.2f}{r['p99']:>10.2f}{r['mean']:>10.2f}{r['errors']:>8}"
+        )
+
+    backend.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,14 @@
 from dna.dna import DNA
 from dna.socat import SocatHelper
+from dna.registry import ServiceRegistry
+from dna.aio import AsyncDNA
+from dna.scheduler import DeployScheduler, DeployJob
+from dna.events import EventWatcher
+from dna.health import HealthMonitor
+from dna.stats import StatsSampler
+from dna.resources import ResourceAllocator
+from dna.hosts import HostPool, DockerHost
+from dna.images import ImageCollector
+from dna.builds import BuildCache, BuildExecutor
+from dna.pulls import PullManager, PullProgress
 import dna.utils
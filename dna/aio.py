@@ -0,0 +1,234 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from dna.dna import DNA
+
+
+class AsyncDNA:
+    """An ``asyncio`` facade over :class:`~dna.DNA`
+
+    Every blocking call (Docker API requests, ``nginx`` reloads, ``certbot``
+    runs) is handed off to a thread pool, so a single event loop can drive many
+    deploys at once. All the work is still done by the wrapped
+    :class:`~dna.DNA` instance, which means the on-disk layout (``.dna/nginx``,
+    ``.dna/socks``, and the :class:`~dna.utils.SQLite` database) is exactly the
+    same as if you had used it directly.
+
+    :param dna: the DNA instance to wrap
+    :type dna: :class:`~dna.DNA`
+    :param max_workers: the maximum number of blocking calls to run at once\
+        (defaults to ``None``, which uses the :class:`~concurrent.futures.ThreadPoolExecutor`\
+        default)
+    :type max_workers: int
+
+    Operations on the same service are run one at a time, in the order they
+    were awaited. Everything else runs concurrently, which is safe because the
+    wrapped :class:`~dna.DNA` instance guards its own shared state: the
+    :class:`~dna.ServiceRegistry` is protected by a reentrant lock, every
+    :class:`~dna.utils.SQLite` call is ``@synchronized``, and
+    :meth:`~dna.utils.Certbot.run_bot` serializes ``certbot`` runs. The same
+    instance can therefore also be used directly from other threads.
+    """
+
+    def __init__(self, dna, max_workers=None):
+        self.dna = dna
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._service_locks = {}
+
+    @classmethod
+    async def create(
+        cls,
+        service_name,
+        default=None,
+        cb_args=[],
+        socat_engine="socat",
+        socat_shards=1,
+        socat_pins=None,
+        overcommit=1.0,
+        docker_hosts=None,
+        max_workers=None,
+    ):
+        """Create a :class:`~dna.DNA` instance without blocking the event loop,
+        and wrap it
+
+        The parameters are the same as those of :class:`~dna.DNA`, plus
+        ``max_workers`` (see :class:`~dna.AsyncDNA`).
+
+        :return: the new :class:`~dna.AsyncDNA`
+        """
+        loop = asyncio.get_running_loop()
+        dna = await loop.run_in_executor(
+            None,
+            partial(
+                DNA,
+                service_name,
+                default=default,
+                cb_args=cb_args,
+                socat_engine=socat_engine,
+                socat_shards=socat_shards,
+                socat_pins=socat_pins,
+                overcommit=overcommit,
+                docker_hosts=docker_hosts,
+            ),
+        )
+        return cls(dna, max_workers=max_workers)
+
+    def close(self):
+        """Shut down the thread pool once all pending calls are done"""
+        self.executor.shutdown(wait=True)
+
+    ###########################################################
+    ##
+    ## Running Blocking Calls
+    ##
+    ###########################################################
+
+    async def _run(self, func, *args, **kwargs):
+        """Run ``func`` in the thread pool and wait for its result
+
+        :param func: the blocking function to call
+        :type func: func
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def _iterate(self, gen):
+        """Drain the blocking generator ``gen`` in the thread pool
+
+        :param gen: the generator to drain
+        :type gen: generator
+
+        :yields: each item produced by ``gen``
+        """
+        done = object()
+        while True:
+            item = await self._run(next, gen, done)
+            if item is done:
+                return
+            yield item
+
+    def _service_lock(self, service):
+        """Get the lock that serializes operations on ``service``
+
+        :param service: the name of the service
+        :type service: str
+
+        The locks are created lazily so that they belong to the event loop
+        that actually awaits them.
+
+        :return: an :class:`~asyncio.Lock`
+        """
+        if service not in self._service_locks:
+            self._service_locks[service] = asyncio.Lock()
+        return self._service_locks[service]
+
+    ###########################################################
+    ##
+    ## Preparing for Service Deploys
+    ##
+    ###########################################################
+
+    async def pull_image(self, image, tag=None, digest=None):
+        """See :meth:`~dna.DNA.pull_image`"""
+        return await asyncio.wrap_future(self.dna.pulls.pull(image, tag, digest))
+
+    async def pull_image_stream(self, image, tag=None, digest=None):
+        """Like :meth:`~dna.AsyncDNA.pull_image`, but yield the pull output
+
+        :yields: each line of output, as a string
+        """
+        async for line in self._iterate(
+            self.dna.pull_image(image, tag, stream=True, digest=digest)
+        ):
+            yield line
+
+    async def build_image(self, **options):
+        """See :meth:`~dna.DNA.build_image`"""
+        return await self._run(self.dna.build_image, **options)
+
+    async def build_image_stream(self, **options):
+        """Like :meth:`~dna.AsyncDNA.build_image`, but yield the build output
+
+        :yields: each line of output, as a string
+        """
+        async for line in self._iterate(self.dna.build_image(stream=True, **options)):
+            yield line
+
+    ###########################################################
+    ##
+    ## Deploying and Managing Services
+    ##
+    ###########################################################
+
+    async def run_deploy(
+        self,
+        service,
+        image,
+        port,
+        blue_green=False,
+        ready_timeout=60,
+        resources=None,
+        host=None,
+        **docker_options
+    ):
+        """See :meth:`~dna.DNA.run_deploy`"""
+        async with self._service_lock(service):
+            return await self._run(
+                self.dna.run_deploy,
+                service,
+                image,
+                port,
+                blue_green=blue_green,
+                ready_timeout=ready_timeout,
+                resources=resources,
+                host=host,
+                **docker_options,
+            )
+
+    async def add_domain(
+        self,
+        service,
+        domain,
+        force_wildcard=False,
+        force_provision=False,
+        proxy_set_header={},
+    ):
+        """See :meth:`~dna.DNA.add_domain`"""
+        domains = await self.add_domains(
+            service, [domain], force_wildcard, force_provision, proxy_set_header
+        )
+        return bool(domains)
+
+    async def add_domains(
+        self,
+        service,
+        domains,
+        force_wildcard=False,
+        force_provision=False,
+        proxy_set_header={},
+    ):
+        """See :meth:`~dna.DNA.add_domains`"""
+        async with self._service_lock(service):
+            return await self._run(
+                self.dna.add_domains,
+                service,
+                domains,
+                force_wildcard=force_wildcard,
+                force_provision=force_provision,
+                proxy_set_header=proxy_set_header,
+            )
+
+    async def stop_service(self, service):
+        """See :meth:`~dna.DNA.stop_service`"""
+        async with self._service_lock(service):
+            return await self._run(self.dna.stop_service, service)
+
+    async def delete_service(self, service):
+        """See :meth:`~dna.DNA.delete_service`"""
+        async with self._service_lock(service):
+            await self._run(self.dna.delete_service, service)
+
+    async def set_proxy_mode(self, service, mode):
+        """See :meth:`~dna.DNA.set_proxy_mode`"""
+        async with self._service_lock(service):
+            return await self._run(self.dna.set_proxy_mode, service, mode)
@@ -0,0 +1,373 @@
+import hashlib, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Lock
+from docker.utils.build import exclude_paths
+import dna.utils as utils
+from dna.utils import metrics
+
+
+class BuildCache:
+    """Skips builds whose context has already been built, by content hash
+
+    Every build made through :meth:`~dna.DNA.build_image` is keyed by a hash
+    of its context: the path, executable bit and contents of every file that
+    would be sent to Docker (so ``.dockerignore`` is honored), the Dockerfile,
+    and every build option that affects the result, such as ``buildargs`` or
+    ``target``. The hash is stored in the DNA database along with the id of
+    the image that was built, and attached to that image as the
+    ``dna.context-hash`` label.
+
+    When a later build has the same hash and its image still exists, the image
+    is just retagged instead of being rebuilt. Builds with ``nocache`` or
+    ``pull`` always run, since they ask for changes the context can't show
+    (such as a newer base image).
+
+    Files are hashed incrementally: the digest of each file is remembered along
+    with its size and modification time, and only files where either changed
+    are read again.
+
+    :param dna: the DNA instance whose builds to cache
+    :type dna: :class:`~dna.DNA`
+
+    :ivar hits: the number of builds that were skipped
+    :ivar misses: the number of builds that had to run
+    """
+
+    #: The label that holds the context hash of a built image
+    LABEL = "dna.context-hash"
+
+    #: Build options that don't change the image that gets built
+    UNHASHED = {
+        "path",
+        "tag",
+        "rm",
+        "forcerm",
+        "quiet",
+        "timeout",
+        "cache_from",
+        "container_limits",
+        "shmsize",
+        "decode",
+        "stream",
+    }
+
+    def __init__(self, dna):
+        self.dna = dna
+        self.hits = 0
+        self.misses = 0
+        self._files = {}
+        self._lock = Lock()
+
+    def _ignore_patterns(self, path):
+        """Read the patterns in the context's ``.dockerignore``, the same way Docker does
+
+        :param path: the path to the build context
+        :type path: str
+
+        :return: a list of patterns
+        """
+        dockerignore = os.path.join(path, ".dockerignore")
+        if not os.path.exists(dockerignore):
+            return []
+        with open(dockerignore) as f:
+            lines = [line.strip() for line in f.read().splitlines()]
+        return [line for line in lines if line and not line.startswith("#")]
+
+    def _file_digest(self, path):
+        """Get the digest of the file at ``path``, reading it only if it changed
+
+        :param path: the absolute path to the file
+        :type path: str
+
+        :return: the hex digest of the file's contents
+        """
+        st = os.lstat(path)
+        cached = self._files.get(path)
+        if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached[2]
+
+        if os.path.islink(path):
+            digest = hashlib.sha256(os.readlink(path).encode("utf-8")).hexdigest()
+        else:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+        self._files[path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def context_hash(
+        self, path=None, dockerfile=None, nocache=False, pull=False, **options
+    ):
+        """Hash a build context and the options it would be built with
+
+        :param path: the path to the build context
+        :type path: str
+        :param dockerfile: the path to the Dockerfile, relative to ``path``\
+            (defaults to ``None``, which uses ``Dockerfile``)
+        :type dockerfile: str
+        :param nocache: flag that the build must not use any cache (defaults\
+            to ``False``)
+        :type nocache: bool
+        :param pull: flag to pull newer versions of the base images (defaults\
+            to ``False``)
+        :type pull: bool
+        :param options: the other build options
+        :type options: kwargs
+
+        :return: the hex digest of the context, or ``None`` if it can't be\
+            cached (``path`` isn't a local directory, or ``nocache`` or ``pull``\
+            is set)
+        """
+        if nocache or pull or not path or not os.path.isdir(path):
+            return None
+        dockerfile = dockerfile or "Dockerfile"
+
+        h = hashlib.sha256()
+        hashed = {k: v for k, v in options.items() if k not in BuildCache.UNHASHED}
+        hashed["dockerfile"] = dockerfile
+        h.update(json.dumps(hashed, sort_keys=True, default=str).encode("utf-8"))
+
+        files = exclude_paths(path, self._ignore_patterns(path), dockerfile=dockerfile)
+        for rel in sorted(files):
+            full = os.path.join(path, rel)
+            if os.path.isdir(full) and not os.path.islink(full):
+                continue
+            executable = os.lstat(full).st_mode & 0o111
+            h.update(
+                f"{rel}\0{executable:o}\0{self._file_digest(full)}\0".encode("utf-8")
+            )
+
+        # a Dockerfile outside the context isn't covered by the walk above
+        full = os.path.join(path, dockerfile)
+        if not os.path.abspath(full).startswith(os.path.abspath(path) + os.sep):
+            h.update(f"{dockerfile}\0{self._file_digest(full)}\0".encode("utf-8"))
+        return h.hexdigest()
+
+    def label(self, options, context_hash):
+        """Attach ``context_hash`` to the labels in ``options``
+
+        :param options: the build options
+        :type options: dict
+        :param context_hash: the hash of the build context, if any
+        :type context_hash: str
+
+        :return: a copy of ``options`` with the label added
+        """
+        if not context_hash:
+            return options
+        labels = dict(options.get("labels") or {})
+        labels[BuildCache.LABEL] = context_hash
+        return {**options, "labels": labels}
+
+    def reuse(self, context_hash, tag=None):
+        """Retag the image previously built from ``context_hash``, if there is one
+
+        :param context_hash: the hash of the build context
+        :type context_hash: str
+        :param tag: the tag to give the image (defaults to ``None``)
+        :type tag: str
+
+        :return: the id of the reused image, or ``None`` if the build has to run
+        """
+        build = self.dna.db.get_build(context_hash) if context_hash else None
+        if build and self.dna.docker.get_image(build.image_id):
+            if tag:
+                self.dna.docker.tag_image(build.image_id, tag)
+            with self._lock:
+                self.hits += 1
+            metrics.inc("dna_build_cache_total", result="hit")
+            return build.image_id
+
+        with self._lock:
+            self.misses += 1
+        metrics.inc("dna_build_cache_total", result="miss")
+        return None
+
+    def record(self, context_hash, image_id, tag=None):
+        """Remember that ``context_hash`` was built into the image ``image_id``
+
+        :param context_hash: the hash of the build context
+        :type context_hash: str
+        :param image_id: the id of the built image
+        :type image_id: str
+        :param tag: the tag the image was built with (defaults to ``None``)
+        :type tag: str
+        """
+        if context_hash and image_id:
+            self.dna.db.record_build(context_hash, image_id, tag)
+
+
+class BuildExecutor:
+    """Builds many images at once on a bounded pool, within a CPU and memory budget
+
+    Builds run on ``workers`` threads. Each running build holds one slot of
+    the budget: an equal share of the ``cpus`` (passed to Docker as
+    ``cpusetcpus``) and of the ``memory`` (passed as ``memory`` and
+    ``memswap``), and a reduced ``cpushares`` so that running containers win
+    any contention. Limits set in a spec's own ``container_limits`` take
+    precedence.
+
+    Every build goes through ``dna.builds`` (see :class:`~dna.BuildCache`),
+    and its output is written to its own logfile, ``<name>-build.log`` in the
+    DNA instance's log folder (see :meth:`~dna.DNA.build_logs`).
+
+    :param dna: the DNA instance to build with
+    :type dna: :class:`~dna.DNA`
+    :param workers: the maximum number of builds to run at once (defaults to ``2``)
+    :type workers: int
+    :param cpus: the CPUs builds may use (defaults to ``None``, which uses all\
+        but the first CPU, unless there is only one)
+    :type cpus: list[int]
+    :param memory: the number of bytes of memory all builds may use together\
+        (defaults to ``None``, which doesn't limit memory)
+    :type memory: int
+    :param cpu_shares: the relative CPU weight of builds, where containers have\
+        ``1024`` (defaults to ``512``)
+    :type cpu_shares: int
+    """
+
+    def __init__(self, dna, workers=2, cpus=None, memory=None, cpu_shares=512):
+        self.dna = dna
+        self.workers = workers
+        self.cpus = list(cpus) if cpus is not None else self._default_cpus()
+        self.memory = memory
+        self.cpu_shares = cpu_shares
+
+    def _default_cpus(self):
+        """Get every CPU this process may run on except the first, leaving\
+            it to running containers
+
+        :return: a list of CPU numbers
+        """
+        if hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+        return cpus[1:] or cpus
+
+    def _slots(self):
+        """Split the budget into one set of container limits per worker
+
+        :return: a list of ``container_limits`` dictionaries
+        """
+        slots = []
+        share = max(1, len(self.cpus) // self.workers)
+        for i in range(self.workers):
+            cpus = (
+                self.cpus[i * share : (i + 1) * share]
+                or self.cpus[i % len(self.cpus) :][:1]
+            )
+            limits = {
+                "cpushares": self.cpu_shares,
+                "cpusetcpus": ",".join(map(str, cpus)),
+            }
+            if self.memory:
+                limits["memory"] = limits["memswap"] = self.memory // self.workers
+            slots.append(limits)
+        return slots
+
+    def _build(self, spec, slots):
+        """Run one build, holding a slot of the budget while it runs
+
+        :param spec: the build spec (see :meth:`~dna.BuildExecutor.run`)
+        :type spec: dict
+        :param slots: the free slots of the budget
+        :type slots: :class:`~queue.Queue`
+
+        :return: the result of the build
+        """
+        options = dict(spec)
+        name = options.pop("name")
+        result = {
+            "name": name,
+            "tag": options.get("tag"),
+            "cached": False,
+            "error": None,
+        }
+        logger = utils.Logger(f"{self.dna.logs}/{name}-build.log")
+        logger.open()
+
+        limits = slots.get()
+        start = time.time()
+        try:
+            with metrics.track("dna_build"):
+                context_hash = self.dna.builds.context_hash(**options)
+                if context_hash and self.dna.builds.reuse(
+                    context_hash, options.get("tag")
+                ):
+                    logger.write(
+                        f"Build context unchanged ({context_hash[:12]}), reusing image."
+                    )
+                    result["cached"] = True
+                else:
+                    options["container_limits"] = {
+                        **limits,
+                        **options.get("container_limits", {}),
+                    }
+                    options = self.dna.builds.label(options, context_hash)
+                    image_id = None
+                    for line in self.dna.docker.build_image_stream(rm=True, **options):
+                        if "error" in line:
+                            raise RuntimeError(line["error"].strip())
+                        image_id = line.get("aux", {}).get("ID", image_id)
+                        logger.write(line.get("stream", ""))
+                    self.dna.builds.record(context_hash, image_id, options.get("tag"))
+        except Exception as e:
+            logger.write(f"Build failed: {e!r}")
+            result["error"] = repr(e)
+        finally:
+            slots.put(limits)
+            logger.close()
+
+        result["duration"] = time.time() - start
+        self.dna.print(
+            f"Built {name} in {result['duration']:.2f}s"
+            + (" (cached)" if result["cached"] else "")
+            + (f" with error {result['error']}" if result["error"] else "")
+        )
+        return result
+
+    def run(self, specs):
+        """Build every spec in ``specs``, and wait for them all to finish
+
+        Each spec is a dictionary of options for :meth:`~dna.DNA.build_image`\
+            (such as ``path``, ``tag``, and ``buildargs``), plus a ``name``\
+            that identifies the build and its logfile.
+
+        .. code-block:: python
+
+            summary = BuildExecutor(dna, workers=4).run([
+                {"name": "web", "path": "services/web", "tag": "web:latest"},
+                {"name": "api", "path": "services/api", "tag": "api:latest"},
+            ])
+
+        :param specs: the builds to run
+        :type specs: list[dict]
+
+        :return: a dictionary containing the ``builds`` (a list of results, in\
+            the same order as ``specs``, each with the ``name``, ``tag``,\
+            ``duration``, whether it was ``cached``, and its ``error`` if it\
+            failed), the number of ``cache_hits`` and ``failed`` builds, and\
+            the total ``duration``
+        """
+        names = [spec["name"] for spec in specs]
+        if len(set(names)) != len(names):
+            raise ValueError("Every build spec needs a unique name")
+
+        slots = Queue()
+        for limits in self._slots():
+            slots.put(limits)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            builds = list(pool.map(lambda spec: self._build(spec, slots), specs))
+
+        return {
+            "builds": builds,
+            "cache_hits": sum(build["cached"] for build in builds),
+            "failed": sum(build["error"] is not None for build in builds),
+            "duration": time.time() - start,
+        }
@@ -1,7 +1,21 @@
 import os, shutil, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import dna.utils as utils
 from dna.socat import SocatHelper
+from dna.registry import ServiceRegistry
+from dna.manifest import Action, plan_manifest, hash_options
+from dna.events import EventWatcher
+from dna.health import HealthMonitor
+from dna.stats import StatsSampler
+from dna.images import ImageCollector
+from dna.builds import BuildCache, BuildExecutor
+from dna.pulls import PullManager
+from dna.resources import ResourceAllocator
+from dna.hosts import HostPool, LOCAL
+from queue import Queue
 import time
+from uuid import uuid4
 
 
 class DNA:
@@ -13,15 +27,49 @@ class DNA:
     :type default: str
     :param cb_args: additional arguments to be used whenever ``certbot`` is called
     :type cb_args: list[str]
+    :param socat_engine: the engine that proxies sockets to containers, either\
+        ``socat`` or ``mux`` (defaults to ``socat``, see :class:`~dna.SocatHelper`)
+    :type socat_engine: str
+    :param socat_shards: the number of sidecar containers to spread sockets over\
+        (defaults to ``1``, see :class:`~dna.SocatHelper`)
+    :type socat_shards: int
+    :param socat_pins: a dictionary mapping services to the index of the sidecar\
+        shard they should always be bound on (defaults to ``None``)
+    :type socat_pins: dict
+    :param overcommit: how far the resources declared by services may overcommit\
+        a host (defaults to ``1.0``, see :class:`~dna.ResourceAllocator`)
+    :type overcommit: float
+    :param docker_hosts: a dictionary mapping the names of other Docker hosts to\
+        run services on to their endpoints (defaults to ``None``, see :class:`~dna.HostPool`)
+    :type docker_hosts: dict
+    :ivar registry: the :class:`~dna.ServiceRegistry` indexing this instance's services
+    :ivar nginx_reloader: the :class:`~dna.utils.Debouncer` that coalesces nginx reloads
+    :ivar events: the :class:`~dna.EventWatcher` started by :meth:`~dna.DNA.watch_events`, if any
+    :ivar health: the :class:`~dna.HealthMonitor` started by :meth:`~dna.DNA.monitor_health`, if any
+    :ivar stats: the :class:`~dna.StatsSampler` started by :meth:`~dna.DNA.sample_stats`, if any
+    :ivar gc: the :class:`~dna.ImageCollector` that removes unused images in the background
+    :ivar builds: the :class:`~dna.BuildCache` that skips builds of unchanged contexts
+    :ivar pulls: the :class:`~dna.PullManager` that runs and merges image pulls
+    :ivar resources: the :class:`~dna.ResourceAllocator` that sets aside CPUs and memory for services
+    :ivar hosts: the :class:`~dna.HostPool` of Docker hosts that services are placed on
+
+    The latency and outcome of :meth:`~dna.DNA.run_deploy`, :meth:`~dna.DNA.start_service`,
+    :meth:`~dna.DNA.add_domains` (and so :meth:`~dna.DNA.add_domain`),
+    :meth:`~dna.DNA.remove_domain`, :meth:`~dna.DNA.stop_service`,
+    :meth:`~dna.DNA.set_proxy_mode`, and :meth:`~dna.DNA.delete_service` are
+    recorded in :data:`~dna.utils.metrics`.
     """
 
+    #: The ways nginx can reach a service (see :meth:`~dna.DNA.set_proxy_mode`)
+    PROXY_MODES = ("socket", "direct")
+
     ###########################################################
     ##
     ## Configuring DNA
     ##
     ###########################################################
 
-    def __init__(self, service_name, default=None, cb_args=[]):
+    def __init__(self, service_name, default=None, cb_args=[], socat_engine="socat", socat_shards=1, socat_pins=None, overcommit=1.0, docker_hosts=None):
         self._configure(service_name)
 
         self.nginx = utils.Nginx(default)
@@ -33,10 +81,24 @@ class DNA:
 
         self.print = self.internal_logger.write
         self.print(f"Starting DNA...")
-        self.socat = SocatHelper(self)
+        self.registry = ServiceRegistry()
+        self.hosts = HostPool(self, docker_hosts)
+        self.events = None
+        self.health = None
+        self.stats = None
+        self.nginx_reloader = utils.Debouncer(self._do_nginx_reload)
+        self._batch_lock = threading.Lock()
+        self._batch_depth = 0
+        self._deferred = {}
+        self._timing = threading.local()
+        self.socat = SocatHelper(self, engine=socat_engine, shards=socat_shards, pins=socat_pins)
+        self.gc = ImageCollector(self).start()
+        self.builds = BuildCache(self)
+        self.pulls = PullManager(self)
+        self.resources = ResourceAllocator(self, overcommit=overcommit)
 
         self.propagate_services()
-        self.socat.bind_all(self.services)
+        self.socat.bind_all([s for s in self.services if self.hosts.is_local(s.name)])
 
         self.print(f"Successfully started DNA instance in {self.path}.")
 
@@ -75,6 +137,49 @@ class DNA:
 
         self.db = utils.SQLite(rel="/.dna/", name=service_name)
 
+    @contextmanager
+    def batch(self):
+        """Defer side effects shared between operations until the end of the block
+
+        Inside ``with dna.batch():``, nginx reloads, image collection requests, and calls to\
+            :meth:`~dna.DNA.propagate_services` are collected instead of being\
+            run, and each one is run once when the outermost batch exits (even if\
+            the block raised). Batches may be nested, and apply to operations\
+            made from any thread while they are open.
+
+        .. code-block:: python
+
+            with dna.batch():
+                for service in services:
+                    dna.run_deploy(service.name, service.image, service.port)
+        """
+        with self._batch_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._batch_lock:
+                self._batch_depth -= 1
+                deferred = {} if self._batch_depth else self._deferred
+                if not self._batch_depth:
+                    self._deferred = {}
+            for func in deferred.values():
+                func()
+
+    def _defer(self, key, func):
+        """Run ``func`` now, or once at the end of the open batch, if there is one
+
+        :param key: identifies the side effect, so that it is only collected once
+        :type key: str
+        :param func: the side effect
+        :type func: func
+        """
+        with self._batch_lock:
+            if self._batch_depth:
+                self._deferred.setdefault(key, func)
+                return
+        func()
+
     def set_print(self, func):
         """Set the print function to ``func``
 
@@ -87,15 +192,128 @@ class DNA:
         """Reset the print function to the internal logger"""
         self.print = self.internal_logger.write
 
+    ###########################################################
+    ##
+    ## Timing Deploys
+    ##
+    ###########################################################
+
+    @contextmanager
+    def _timed_deploy(self, service, deploy_id=None):
+        """Record the phases timed by this thread inside the block under one deploy
+
+        If a deploy is already being timed by this thread, its id is reused.
+
+        :param service: the name of the service being deployed
+        :type service: str
+        :param deploy_id: the id to record phases under (defaults to ``None``,\
+            which generates a new one)
+        :type deploy_id: str
+
+        :yields: the deploy id
+        """
+        outer = self._current_deploy()
+        if outer:
+            yield outer[0]
+            return
+        self._timing.deploy = (deploy_id or uuid4().hex, service)
+        try:
+            yield self._timing.deploy[0]
+        finally:
+            self._timing.deploy = None
+
+    def _current_deploy(self):
+        """Get the deploy being timed by this thread, if any
+
+        :return: a ``(deploy_id, service)`` tuple, or ``None``
+        """
+        return getattr(self._timing, "deploy", None)
+
+    def _record_phase(self, deploy, phase, started_at):
+        """Save the duration of a phase that started at ``started_at`` and just ended
+
+        :param deploy: the ``(deploy_id, service)`` the phase belongs to; if\
+            ``None``, nothing is saved
+        :type deploy: tuple
+        :param phase: the name of the phase
+        :type phase: str
+        :param started_at: the timestamp the phase started at
+        :type started_at: float
+        """
+        if deploy:
+            duration = time.time() - started_at
+            self.db.record_deploy_phase(deploy[0], deploy[1], phase, started_at, duration)
+
+    @contextmanager
+    def _phase(self, phase):
+        """Time the block as ``phase`` of the deploy being timed by this thread
+
+        :param phase: the name of the phase
+        :type phase: str
+        """
+        deploy, start = self._current_deploy(), time.time()
+        try:
+            yield
+        finally:
+            self._record_phase(deploy, phase, start)
+
+    def deploy_phase_stats(self, service=None, since=None):
+        """Get the median and 95th percentile duration of each deploy phase
+
+        Phases include ``kill``, ``run``, ``socket`` (waiting for the\
+            socat socket to appear), ``db``, ``nginx_config``, ``nginx_reload``,\
+            ``cert_match``, ``cert_install`` and ``cert_provision``, as well as\
+            ``ready`` and ``swap`` for blue/green deploys.
+
+        :param service: only include deploys of this service (defaults to\
+            ``None``, which includes all services)
+        :type service: str
+        :param since: only include phases that started after this timestamp\
+            (defaults to ``None``, which includes all phases)
+        :type since: float
+
+        :return: a dictionary mapping each phase to a dictionary containing\
+            its ``count``, ``p50`` and ``p95`` (in seconds)
+        """
+        durations = {}
+        for phase in self.db.get_deploy_phases(service=service, since=since):
+            durations.setdefault(phase.phase, []).append(phase.duration)
+
+        def percentile(values, q):
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        stats = {}
+        for phase, values in durations.items():
+            values.sort()
+            stats[phase] = {
+                "count": len(values),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+            }
+        return stats
+
+    def deploy_phases(self, deploy_id):
+        """Get the timed phases of one deploy
+
+        :param deploy_id: the id of the deploy
+        :type deploy_id: str
+
+        :return: a list of :class:`~dna.utils.DeployPhase` objects
+        """
+        return self.db.get_deploy_phases(deploy_id=deploy_id)
+
     ###########################################################
     ##
     ## Preparing for Service Deploys
     ##
     ###########################################################
 
-    def pull_image(self, image, tag=None, stream=False):
+    def pull_image(self, image, tag=None, stream=False, digest=None):
         """Pull and save a Docker image by name or URL
 
+        Pulls go through ``pulls`` (see :class:`~dna.PullManager`), so pulling\
+            an image that is already being pulled waits for that pull instead.
+
         :param image: the name or url of the image to pull
         :type image: str
         :param tag: the initial tag to assign to the image (defaults to ``None``,\
@@ -103,27 +321,103 @@ class DNA:
         :type tag: str
         :param stream: flag to yield pull output (defaults to ``False``)
         :type stream: bool
+        :param digest: if the local image already has this digest, skip the pull\
+            (defaults to ``None``, which always pulls)
+        :type digest: str
+
+        :return: a generator of output lines if ``stream`` is ``True``, else the\
+            result of the pull (see :meth:`~dna.PullManager.pull`)
         """
         if stream:
-            for line in self.docker.pull_image_stream(image, tag):
-                yield line.get("stream", "")
-        else:
-            self.docker.pull_image(image, tag)
+            return self._stream_pull(image, tag, digest)
+        return self.pulls.pull(image, tag, digest).result()
+
+    def _stream_pull(self, image, tag, digest):
+        """Pull ``image`` through ``pulls``, yielding its output as it arrives
+
+        :yields: each line of output, as a string
+        """
+        lines = Queue()
+        future = self.pulls.pull(image, tag, digest, on_line=lines.put)
+        future.add_done_callback(lambda f: lines.put(None))
+        for line in iter(lines.get, None):
+            parts = [line.get("id"), line.get("status"), line.get("progress")]
+            yield " ".join(p for p in parts if p) + "\n"
+        result = future.result()
+        yield f"{'Skipped' if result['skipped'] else 'Pulled'} {image}:{result['tag']}.\n"
+
+    def pull_images(self, images):
+        """Pull several Docker images at once
+
+        :param images: the images to pull (see :meth:`~dna.PullManager.pull_all`)
+        :type images: list[str or dict]
+
+        :return: the results and combined progress of the pulls (see\
+            :meth:`~dna.PullManager.pull_all`)
+        """
+        return self.pulls.pull_all(images)
 
     def build_image(self, stream=False, **options):
         """Build a Docker image using the given options
 
+        If an image was already built from an identical context, it is retagged\
+            instead (see :class:`~dna.BuildCache`).
+
         :param stream: flag to yield build output (defaults to ``False``)
         :type stream: bool
         :param options: options to use to the build the image (ideally contains\
             at least a path to a build context, as well as a Dockerfile)
         :type options: kwargs
+
+        :return: a generator of output lines if ``stream`` is ``True``, else the\
+            id of the built (or reused) image
         """
         if stream:
-            for line in self.docker.build_image_stream(rm=True, **options):
-                yield line.get("stream", "")
-        else:
-            self.docker.build_image(rm=True, **options)
+            return self._stream_build(options)
+        context_hash = self.builds.context_hash(**options)
+        image_id = self.builds.reuse(context_hash, options.get("tag")) if context_hash else None
+        if image_id:
+            return image_id
+
+        options = self.builds.label(options, context_hash)
+        image_id = self.docker.build_image(rm=True, **options).id
+        self.builds.record(context_hash, image_id, options.get("tag"))
+        return image_id
+
+    def _stream_build(self, options):
+        """Build an image like :meth:`~dna.DNA.build_image`, yielding its output as it arrives
+
+        :yields: each line of output, as a string
+        """
+        context_hash = self.builds.context_hash(**options)
+        if context_hash and self.builds.reuse(context_hash, options.get("tag")):
+            yield f"Build context unchanged ({context_hash[:12]}), reusing image.\n"
+            return
+
+        options = self.builds.label(options, context_hash)
+        image_id = None
+        for line in self.docker.build_image_stream(rm=True, **options):
+            image_id = line.get("aux", {}).get("ID", image_id)
+            yield line.get("stream", "")
+        self.builds.record(context_hash, image_id, options.get("tag"))
+
+    def build_images(self, specs, workers=2, cpus=None, memory=None):
+        """Build many Docker images at once, within a CPU and memory budget
+
+        :param specs: the builds to run (see :meth:`~dna.BuildExecutor.run`)
+        :type specs: list[dict]
+        :param workers: the maximum number of builds to run at once (defaults to ``2``)
+        :type workers: int
+        :param cpus: the CPUs builds may use (defaults to ``None``, see\
+            :class:`~dna.BuildExecutor`)
+        :type cpus: list[int]
+        :param memory: the number of bytes of memory all builds may use together\
+            (defaults to ``None``, which doesn't limit memory)
+        :type memory: int
+
+        :return: a summary of the builds (see :meth:`~dna.BuildExecutor.run`)
+        """
+        return BuildExecutor(self, workers=workers, cpus=cpus, memory=memory).run(specs)
 
     ###########################################################
     ##
@@ -142,25 +436,274 @@ class DNA:
         :type options: kwargs
         """
         self.print("Finding and killing container, if it exists...")
-        self.docker.wipe_container(service)
+        with self._phase("kill"):
+            self.docker.wipe_container(service)
 
         self.print("Starting container...")
-        con = self.docker.run_image(
-            image, service, detach=True, network=self.socat.bridge, **options
-        )
+        with self._phase("run"):
+            con = self.docker.run_image(
+                image, service, detach=True, network=self.socat.bridge, **options
+            )
+        self.db.record_deployed_image(service, con.image.id)
 
-        self.print("Pruning images...")
-        self.docker.prune_images()
+        self._collect_images()
 
         self.print(f"Done! Successfully deployed {image} as {service}.")
 
-    def _do_nginx_deploy(self, service, domain, force_wildcard=False, force_provision=False, proxy_set_header={}):
-        """Adds an nginx proxy from the ``domain`` to the ``service``
+    def _do_remote_deploy(self, service, image, port, host, **options):
+        """Deploys the image named ``image`` to a container named ``service`` on\
+            another Docker host, publishing ``port`` for nginx to reach
+
+        :param service: the name of the service being launched
+        :type service: str
+        :param image: the name of the image holding the service
+        :type image: str
+        :param port: the port inside the container that the service front-end runs on
+        :type port: str
+        :param host: the host to run the container on
+        :type host: :class:`~dna.hosts.DockerHost`
+        :param options: other options to pass to docker on deploy
+        :type options: kwargs
+        """
+        self.print(f"Finding and killing container on {host.name}, if it exists...")
+        with self._phase("kill"):
+            host.docker.wipe_container(service)
+
+        self.print(f"Starting container on {host.name}...")
+        with self._phase("run"):
+            con = host.docker.run_image(image, service, detach=True, ports={f"{port}/tcp": None}, **options)
+        self.db.record_deployed_image(service, con.image.id)
+        if self.get_proxy_mode(service) != "direct":
+            self.db.set_proxy_route(service, "direct")
+
+        self.print(f"Done! Successfully deployed {image} as {service} on {host.name}.")
+
+    def _do_placement(self, service, host):
+        """Places ``service`` on ``host``, removing its container (and socket)\
+            from the host it ran on before, if that was another one
+
+        This is only done once the service was deployed on ``host``, so that the\
+            old container keeps serving if the deploy fails.
+
+        :param service: the name of the service
+        :type service: str
+        :param host: the host to place the service on
+        :type host: :class:`~dna.hosts.DockerHost`
+        """
+        previous = self.hosts.placement(service)
+        info = self.get_service_info(service)
+        if previous != host.name and info:
+            self.print(f"Moving {service} from {previous} to {host.name}...")
+            if previous == LOCAL:
+                self.socat.unbind(service, info.port)
+                if self.events:
+                    self.events.retire(self.docker.container_id(service))
+            self.hosts.get(previous).docker.wipe_container(service)
+            self.registry.deactivate(service)
+            if host.local:
+                # local services are reached through their socket by default
+                self.db.delete_proxy_route(service)
+                self._set_proxy_pass(service, f"http://unix:{self.socks}/{service}.sock")
+        self.hosts.assign(service, host.name)
+
+    def _prepare_deploy(self, service, resources=None, host=None, docker_options={}):
+        """Chooses the Docker host to deploy ``service`` on, and sets aside the\
+            ``resources`` it declares there
+
+        :return: the :class:`~dna.hosts.DockerHost` to deploy on, the options to\
+            pass to docker (see :meth:`~dna.ResourceAllocator.docker_options`), and\
+            what the service had set aside before (see :meth:`~dna.ResourceAllocator.restore`)
+        """
+        target = self.hosts.get(host) if host else self.hosts.choose(service, resources)
+        allocation = self.db.get_allocation(service)
+        previous = allocation.to_json() if allocation else None
+        if resources is None and target.name != self.hosts.placement(service) and allocation:
+            # the resources the service declared before move with it
+            resources = dict(cores=allocation.cores, cpu_shares=allocation.cpu_shares, memory=allocation.memory)
+        if resources is not None:
+            self.resources.allocate(service, host=target.name, **resources)
+        return target, {**self.resources.docker_options(service), **docker_options}, previous
+
+    def _do_blue_green_deploy(self, service, image, port, ready_timeout=60, drain_timeout=10, **options):
+        """Deploys the image named ``image`` to a container named ``service``
+        without dropping traffic to the container it replaces
+
+        :param service: the name of the service being launched
+        :type service: str
+        :param image: the name of the image holding the service
+        :type image: str
+        :param port: the port inside the container that the service front-end runs on
+        :type port: str
+        :param ready_timeout: the number of seconds to wait for the new container\
+            to accept connections (defaults to ``60``)
+        :type ready_timeout: int
+        :param drain_timeout: the number of seconds to give the old container to\
+            finish in-flight requests before it is killed (defaults to ``10``)
+        :type drain_timeout: int
+        :param options: other options to pass to docker on deploy
+        :type options: kwargs
+
+        :return: whether the new container was deployed; if it never became\
+            ready, it is removed and the old container keeps serving
+
+        * Starts the new container as ``service-next`` and binds it to the\
+            staging socket ``service-next.sock``
+        * Probes the staging socket until the new container answers
+        * Gives the new container the ``service`` alias on the bridge network,\
+            so the existing ``service.sock`` listener (which resolves ``service``\
+            on every connection) starts sending it traffic
+        * Stops the old container gracefully, and renames the new one to ``service``
+        """
+        staging = f"{service}-next"
+        bridge = self.socat.bridge
+
+        self.print(f"Starting container as {staging}...")
+        with self._phase("run"):
+            self.docker.wipe_container(staging)
+            con = self.docker.run_image(image, staging, detach=True, network=bridge, **options)
+
+        self.print("Waiting for the new container to become ready...")
+        with self._phase("ready"):
+            self.socat.bind(staging, port)
+            ready = self.socat.wait_ready(staging, timeout=ready_timeout)
+            self.socat.unbind(staging, port)
+
+        if not ready:
+            self.print(f"{staging} did not become ready within {ready_timeout} seconds!")
+            self.docker.wipe_container(staging)
+            self.print(f"Kept the existing {service} container.")
+            return False
+
+        self.print(f"Swapping traffic from {service} to {staging}...")
+        with self._phase("swap"):
+            self.docker.connect_container(bridge, staging, aliases=[service])
+            self.refresh_proxy(service, container=staging)
+        with self._phase("kill"):
+            if self.events:
+                self.events.retire(self.docker.container_id(service))
+            self.docker.wipe_container(service, timeout=drain_timeout)
+        self.docker.rename_container(staging, service)
+        self.db.record_deployed_image(service, con.image.id)
+
+        self._collect_images()
+
+        self.print(f"Done! Successfully deployed {image} as {service} with no downtime.")
+        return True
+
+    def _collect_images(self):
+        """Ask :attr:`~dna.DNA.gc` to remove unused images in the background, or do\
+            so at the end of the open batch"""
+        self._defer("gc", self.gc.request)
+
+    def _reload_nginx(self):
+        """Reload nginx so that it picks up config changes, or do so at the end of\
+            the open batch
+
+        Reloads requested by several threads at around the same time are\
+            coalesced by :attr:`~dna.DNA.nginx_reloader`.
+        """
+        self._defer("reload", self.nginx_reloader)
+
+    def _do_nginx_reload(self):
+        """Reload nginx"""
+        out = utils.sh("nginx", "-s", "reload", stream=False)
+        self.print(out)
+
+    def _write_nginx_config(self, service, domain, proxy_set_header={}):
+        """Writes an nginx config that proxies ``domain`` to ``service``, unless
+        one already exists
 
         :param service: the name of the service to point to
         :type service: str
         :param domain: the url to proxy
         :type domain: str
+        :param proxy_set_header: a dictionary of proxy headers to pass into\
+            nginx
+        :type proxy_set_header: dict
+
+        :return: whether a new config was written
+        """
+        if os.path.exists(f"{self.confs}/{domain}.conf"):
+            self.print(f"An nginx config for {domain} already exists!")
+            return False
+
+        logs_pre = f"{self.logs}/{service}-"
+        address = self._direct_address(service)
+        if address:
+            host, port = address.rsplit(":", 1)
+            config = self.nginx.gen_config_with_port(
+                domain, port, logs_pre=logs_pre, proxy_set_header=proxy_set_header, host=host,
+            )
+        else:
+            socket = f"{self.socks}/{service}.sock"
+            config = self.nginx.gen_config_with_sock(
+                domain, socket, logs_pre=logs_pre, proxy_set_header=proxy_set_header,
+            )
+        with open(f"{self.confs}/{domain}.conf", "w") as out:
+            out.write(config)
+        return True
+
+    def _direct_address(self, service, container=None):
+        """Gets the address nginx should proxy ``service`` to directly
+
+        :param service: the name of the service
+        :type service: str
+        :param container: the container to look up (defaults to ``None``, which\
+            uses the ``service`` container)
+        :type container: str
+
+        :return: the ``ip:port`` of the container on the socat bridge (or, for a\
+            service on another Docker host, the host's address and the port the\
+            container publishes), or ``None`` if the service uses the ``socket``\
+            proxy mode or its container isn't running
+        """
+        if self.get_proxy_mode(service) != "direct":
+            return None
+        info = self.get_service_info(service)
+        if not info:
+            return None
+        host = self.hosts.host_of(service)
+        if not host.local:
+            port = host.docker.published_port(container or service, info.port)
+            return f"{host.address}:{port}" if port else None
+        ip = self.docker.container_address(container or service, self.socat.bridge)
+        return f"{ip}:{info.port}" if ip else None
+
+    def _set_proxy_pass(self, service, proxy_pass):
+        """Points the nginx configs of every domain of ``service`` to ``proxy_pass``
+
+        :return: whether any config changed
+        """
+        changed = False
+        for domain in self.get_service_info(service).domains:
+            path = f"{self.confs}/{domain.url}.conf"
+            if os.path.exists(path):
+                changed = self.nginx.set_proxy_pass(path, proxy_pass) or changed
+        if changed:
+            self._reload_nginx()
+        return changed
+
+    def _attach_certs(self, certs):
+        """Installs matched certificates, one ``certbot`` run per certificate
+
+        :param certs: a dictionary mapping domains to the certificates to\
+            install on them
+        :type certs: dict
+        """
+        by_cert = {}
+        for domain, cert in certs.items():
+            by_cert.setdefault(cert.live_dir, (cert, []))[1].append(domain)
+        for cert, domains in by_cert.values():
+            self.print(f"Installing a matching certificate on {', '.join(domains)}...")
+            self.certbot.attach_cert(cert, domains, logger=self.print)
+
+    def _do_nginx_deploy(self, service, domains, force_wildcard=False, force_provision=False, proxy_set_header={}):
+        """Adds nginx proxies from each of the ``domains`` to the ``service``
+
+        :param service: the name of the service to point to
+        :type service: str
+        :param domains: the urls to proxy
+        :type domains: list[str]
         :param force_wildcard: forcibly use a wildcard SSL certificate only\
             (defaults to ``False``)
         :type force_wildcard: bool
@@ -171,50 +714,66 @@ class DNA:
             nginx
         :type proxy_set_header: dict
 
+        All the configs are written before nginx is reloaded once. Existing
+        certificates are matched in a single pass, and any domains left without
+        one are provisioned together in a single ``certbot`` run, which yields one
+        certificate covering all of them.
+
         Note that if ``force_wildcard`` and ``force_provision`` are both ``True``,\
-            then a certificate will be provisioned for ``domain`` as well as ``*.domain``.
+            then a certificate will be provisioned for each domain as well as ``*.domain``.
         """
         self.print("Doing nginx deploy...")
-        if os.path.exists(f"{self.confs}/{domain}.conf"):
-            self.print(f"An nginx config for {domain} already exists!")
+        with self._phase("nginx_config"):
+            domains = [d for d in domains if self._write_nginx_config(service, d, proxy_set_header)]
+        if not domains:
             self.print("Nothing to do.")
             return
-
-        socket = f"{self.socks}/{service}.sock"
-        with open(f"{self.confs}/{domain}.conf", "w") as out:
-            out.write(
-                self.nginx.gen_config_with_sock(
-                    domain, socket, logs_pre=f"{self.logs}/{service}-", proxy_set_header=proxy_set_header,
-                )
-            )
-        out = utils.sh("nginx", "-s", "reload", stream=False)
-        self.print(out)
-
-        self.print("Installing or provisioning certificate, as needed...")
-        cert = self.certbot.cert_else_false(domain, force_wildcard)
-        if cert and not force_provision:
-            self.print(f"Found a matching certificate! Installing...")
-            self.certbot.attach_cert(cert, domain, logger=self.print)
-        else:
+        with self._phase("nginx_reload"):
+            self._reload_nginx()
+
+        self.print("Installing or provisioning certificates, as needed...")
+        certs = {}
+        if not force_provision:
+            with self._phase("cert_match"):
+                certs = self.certbot.match_certs(domains, force_wildcard=force_wildcard)
+        with self._phase("cert_install"):
+            self._attach_certs(certs)
+
+        missing = [d for d in domains if d not in certs]
+        if missing:
             wildcard = force_provision and force_wildcard
-            self.print(f"Provisioning a new {'wildcard' if wildcard else ''} certificate...")
-            domains = [domain]
+            self.print(f"Provisioning a new {'wildcard ' if wildcard else ''}certificate for {', '.join(missing)}...")
+            names = list(missing)
             if wildcard:
-                domains.append(f"*.{domain}")
-            self.certbot.run_bot(domains, logger=self.print)
+                names.extend(f"*.{d}" for d in missing)
+            with self._phase("cert_provision"):
+                self.certbot.run_bot(names, logger=self.print)
             if wildcard:
                 self.print("Installing wildcard certificate...")
-                cert = self.certbot.cert_else_false(f"*.{domain}", force_wildcard)
-                if cert:
-                    self.certbot.attach_cert(cert, domain, logger=self.print)
-                else:
-                    self.print("Something went wrong when provisioning/installing the wildcard certificate!")
-                    self.print(f"Couldn't secure {domain}.")
-        self.print(f"Done! Sucessfully proxied {domain} to {service}.")
-        
+                with self._phase("cert_install"):
+                    certs = self.certbot.match_certs(missing, force_exact=True)
+                    self._attach_certs(certs)
+                for domain in missing:
+                    if domain not in certs:
+                        self.print("Something went wrong when provisioning/installing the wildcard certificate!")
+                        self.print(f"Couldn't secure {domain}.")
+        self.print(f"Done! Sucessfully proxied {', '.join(domains)} to {service}.")
+
+    def _do_socat_deploy(self, service, port):
+        """Binds ``port`` inside the ``service`` container to ``service.sock``, timing
+        how long the socket takes to appear
 
-    def _do_db_deploy(self, service, image, port):
-        """Saves the service to the :class:`~dna.utils.SQLite` database for this DNA instance
+        :param service: the name of the service
+        :type service: str
+        :param port: the port inside the container that the service front-end runs on
+        :type port: str
+        """
+        deploy, start = self._current_deploy(), time.time()
+        self.socat.bind(service, port, callback=lambda: self._record_phase(deploy, "socket", start))
+
+    def _do_db_deploy(self, service, image, port, options=None):
+        """Saves the service to the :class:`~dna.utils.SQLite` database for this DNA instance,
+        and registers it as running
 
         :param service: the name of the service
         :type service: str
@@ -222,17 +781,31 @@ class DNA:
         :type image: str
         :param port: the port inside the container that the service front-end runs on
         :type port: str
+        :param options: the docker options the service was deployed with, whose\
+            hash is saved so that manifests can tell when they change (defaults\
+            to ``None``, which means none)
+        :type options: dict
         """
         self.print("Doing database deploy...")
-        if not self.db.get_service_by_name(service):
-            self.db.create_service(service, image, port)
-            self.print("Done!")
-        else:
-            self.print("Service already exists in database!")
-
-    def run_deploy(self, service, image, port, **docker_options):
+        with self._phase("db"):
+            existing = self.db.get_service_by_name(service)
+            if not existing:
+                self.db.create_service(service, image, port)
+                self.print("Done!")
+            elif (existing.image, existing.port) != (image, port):
+                self.db.update_service(service, image, port)
+                self.print("Updated the service's image and port.")
+            else:
+                self.print("Service already exists in database!")
+            self.db.set_options_hash(service, hash_options(options))
+            self.registry.add(self.db.get_service_by_name(service))
+
+    @utils.metrics.instrument("dna_operation", "operation")
+    def run_deploy(
+        self, service, image, port, blue_green=False, ready_timeout=60, resources=None, host=None, **docker_options
+    ):
         """Deploys a service to a container, binds that container port to socat, saves
-        the service in the database, and re-propagates the services in this DNA instance.
+        the service in the database, and registers it with this DNA instance.
 
         :param service: the name of the service
         :type service: str
@@ -240,14 +813,67 @@ class DNA:
         :type image: str
         :param port: the port inside the container that the service front-end runs on
         :type port: str
-        :param docker_options: other options to pass to docker on deploy
+        :param blue_green: flag to start the new container alongside the running\
+            one and only switch traffic over once it is ready (defaults to ``False``,\
+            which stops the running container first)
+        :type blue_green: bool
+        :param ready_timeout: with ``blue_green``, the number of seconds to wait for\
+            the new container to become ready (defaults to ``60``)
+        :type ready_timeout: int
+        :param resources: the ``cores``, ``cpu_shares``, and ``memory`` the service\
+            needs (defaults to ``None``, which keeps what it had; see\
+            :class:`~dna.ResourceAllocator`)
+        :type resources: dict
+        :param host: the name of the Docker host to run the service on, moving it\
+            there if it runs elsewhere (defaults to ``None``, which keeps it where\
+            it is, or places a new service on the least-loaded host; see\
+            :class:`~dna.HostPool`)
+        :type host: str
+        :param docker_options: other options to pass to docker on deploy, which\
+            take precedence over the limits set by :attr:`~dna.DNA.resources`
         :type docker_options: kwargs
-        """
-        self._do_docker_deploy(service, image, **docker_options)
-        self.socat.bind(service, port)
-        self._do_db_deploy(service, image, port)
 
-        self.propagate_services()
+        :return: whether the service was deployed
+
+        :raises RuntimeError: if ``resources`` would overcommit the host, before\
+            anything is deployed
+
+        A service that moves to another host keeps running on its old host until\
+            it was deployed on the new one. If the deploy fails, the service gets\
+            back the resources it had before.
+
+        .. note:: ``blue_green`` only applies when the service is already running\
+            on the local host; otherwise a regular deploy is done.
+        """
+        options = dict(docker_options)
+        self.gc.hold(image)
+        try:
+            target, docker_options, previous = self._prepare_deploy(service, resources, host, docker_options)
+            with self._timed_deploy(service):
+                try:
+                    if not target.local:
+                        self._do_remote_deploy(service, image, port, target, **docker_options)
+                        deployed = True
+                    elif blue_green and self.registry.is_active(service) and self.hosts.is_local(service):
+                        deployed = self._do_blue_green_deploy(service, image, port, ready_timeout, **docker_options)
+                    else:
+                        self._do_docker_deploy(service, image, **docker_options)
+                        deployed = True
+                    if deployed:
+                        if target.local:
+                            self._do_socat_deploy(service, port)
+                        self._do_placement(service, target)
+                        self._do_db_deploy(service, image, port, options)
+                        self.refresh_proxy(service)
+                except Exception:
+                    self.resources.restore(service, previous)
+                    raise
+                if not deployed:
+                    self.resources.restore(service, previous)
+                    return False
+            return True
+        finally:
+            self.gc.release(image)
 
     ###########################################################
     ##
@@ -255,26 +881,149 @@ class DNA:
     ##
     ###########################################################
 
+    @property
+    def services(self):
+        """The services managed by this DNA instance whose containers are running
+
+        This is a read-only view of :attr:`~dna.DNA.registry`, which is kept up
+        to date by every DNA operation.
+
+        :return: a list of :class:`~dna.utils.Service` objects
+        """
+        return self.registry.active()
+
     def propagate_services(self):
-        """Populates ``self.services`` with the services managed by this DNA\
-            instance
-        
-        For the names of all the docker containers connected to this\
-            service's socat bridge, calls :meth:`~dna.DNA.get_service_info`.
-        
+        """Reloads :attr:`~dna.DNA.registry` from Docker and the database
+
+        Inspects this instance's socat bridge once to find the running\
+            containers, and loads all the services (and their domains) from\
+            the database in a single query.
+
+        This happens automatically on startup; every other DNA operation\
+            updates the registry in place, so you only need to call this if\
+            containers or database records were changed outside of DNA.
+
         .. warning:: If a service was deployed using DNA but the socat bridge\
             does not yield it (the container is off or was deleted), the service\
-            will not be propagated.
+            will be registered but not listed in :attr:`~dna.DNA.services`.
+
+        Inside a :meth:`~dna.DNA.batch`, this is deferred until the batch exits.
         """
+        self._defer("propagate", self._do_propagate_services)
+
+    def _do_propagate_services(self):
+        """Reloads :attr:`~dna.DNA.registry` from Docker and the database"""
         dna = self.docker.get_network(self.socat.bridge, low_level=True)
-        self.services = []
-        for con in dna["Containers"]:
-            if dna["Containers"][con]["Name"] == self.socat.container:
-                continue
-            service = self.get_service_info(dna["Containers"][con]["Name"])
-            if not service:
-                continue
-            self.services.append(service)
+        running = {con["Name"] for con in dna["Containers"].values()}
+        running.difference_update(self.socat.containers)
+        running.update(self.hosts.running())
+        self.registry.load(self.db.get_services(), active=running)
+
+    def watch_events(self):
+        """Keep :attr:`~dna.DNA.registry` and the socat bindings up to date as\
+            containers start and stop, by following the Docker event stream
+
+        :return: the running :class:`~dna.EventWatcher`, which you can use to\
+            add listeners for service state changes
+        """
+        if not self.events:
+            self.events = EventWatcher(self)
+        return self.events.start()
+
+    def monitor_health(self, interval=10, **options):
+        """Probe every running service's socket in the background, and rebind\
+            the sockets whose listener died
+
+        :param interval: the number of seconds between rounds of probes\
+            (defaults to ``10``)
+        :type interval: float
+        :param options: other options for the :class:`~dna.HealthMonitor`
+        :type options: kwargs
+
+        :return: the running :class:`~dna.HealthMonitor`
+        """
+        if not self.health:
+            self.health = HealthMonitor(self, interval=interval, **options)
+        return self.health.start()
+
+    def service_health(self, service=None):
+        """Gets the readiness and last probe latency of ``service``, or of every\
+            running service, as of the last probe by :attr:`~dna.DNA.health`
+
+        :param service: the name of the service (defaults to ``None``, which gets\
+            every service)
+        :type service: str
+
+        :return: the status of the service, or a dictionary mapping each service\
+            to its status (see :meth:`~dna.HealthMonitor.get`); ``None`` if\
+            :meth:`~dna.DNA.monitor_health` hasn't been called
+        """
+        if not self.health:
+            return None
+        return self.health.get(service)
+
+    def sample_stats(self, interval=5, **options):
+        """Sample the CPU, memory, network, and disk usage of every container on\
+            the bridge network in the background
+
+        :param interval: the number of seconds between samples (defaults to ``5``)
+        :type interval: float
+        :param options: other options for the :class:`~dna.StatsSampler`
+        :type options: kwargs
+
+        :return: the running :class:`~dna.StatsSampler`
+        """
+        if not self.stats:
+            self.stats = StatsSampler(self, interval=interval, **options)
+        return self.stats.start()
+
+    def service_stats(self, service=None, since=None):
+        """Gets the recent resource usage samples of ``service``, or of every\
+            container, kept in memory by :attr:`~dna.DNA.stats`
+
+        :param service: the name of the service (defaults to ``None``, which gets\
+            every container)
+        :type service: str
+        :param since: only get samples taken after this timestamp (defaults to ``None``)
+        :type since: float
+
+        :return: the samples (see :meth:`~dna.StatsSampler.samples`), or ``None``\
+            if :meth:`~dna.DNA.sample_stats` hasn't been called
+        """
+        if not self.stats:
+            return None
+        return self.stats.samples(service, since)
+
+    def stats_rollups(self, service=None, since=None):
+        """Gets the saved summaries of resource usage over time
+
+        :param service: only get the rollups of this service (defaults to ``None``)
+        :type service: str
+        :param since: only get rollups of windows that started after this\
+            timestamp (defaults to ``None``)
+        :type since: float
+
+        :return: a list of dictionaries (see :meth:`~dna.utils.StatsRollup.to_json`),\
+            oldest first
+        """
+        return [rollup.to_json() for rollup in self.db.get_stats_rollups(service, since)]
+
+    def resource_usage(self, host=LOCAL):
+        """Gets the CPUs and memory set aside for services by :attr:`~dna.DNA.resources`
+
+        :param host: the name of the Docker host (defaults to ``local``)
+        :type host: str
+
+        :return: a summary of the allocations (see :meth:`~dna.ResourceAllocator.usage`)
+        """
+        return self.resources.usage(host)
+
+    def host_usage(self):
+        """Gets how loaded each Docker host of :attr:`~dna.DNA.hosts` is
+
+        :return: a dictionary mapping each host to its load (see :meth:`~dna.HostPool.load`)
+        """
+        return self.hosts.load()
 
     def get_service_info(self, service):
         """Gets the requested service
@@ -285,8 +1034,20 @@ class DNA:
         :return: a :class:`~dna.utils.Service` object\
             representing the requested service
         """
-        return self.db.get_service_by_name(service)
+        return self.registry.get(service) or self.db.get_service_by_name(service)
+
+    def get_service_by_domain(self, domain):
+        """Gets the service that ``domain`` is proxied to
+
+        :param domain: the url of the domain
+        :type domain: str
+
+        :return: a :class:`~dna.utils.Service` object\
+            representing the requested service, if there is one
+        """
+        return self.registry.get_by_domain(domain)
 
+    @utils.metrics.instrument("dna_operation", "operation")
     def start_service(self, service):
         """Start the requested service, if it is stopped
 
@@ -297,12 +1058,91 @@ class DNA:
         """
         service = self.get_service_info(service)
         if service:
-            if self.docker.start_container(service.name):
-                self.socat.bind(service.name, service.port)
-                self.propagate_services()
+            host = self.hosts.host_of(service.name)
+            if host.docker.start_container(service.name):
+                if host.local:
+                    self.socat.bind(service.name, service.port)
+                self.registry.add(service)
+                self.refresh_proxy(service.name)
                 return True
         return False
 
+    def get_proxy_mode(self, service):
+        """Gets how nginx reaches ``service``
+
+        :param service: the name of the service
+        :type service: str
+
+        :return: either ``socket`` or ``direct`` (see :meth:`~dna.DNA.set_proxy_mode`)
+        """
+        route = self.db.get_proxy_route(service)
+        return route.mode if route else "socket"
+
+    @utils.metrics.instrument("dna_operation", "operation")
+    def set_proxy_mode(self, service, mode):
+        """Choose how nginx reaches ``service``
+
+        In ``socket`` mode (the default), nginx proxies to ``service.sock``,\
+            which socat forwards to the container. In ``direct`` mode, nginx\
+            proxies straight to the container's address on the socat bridge,\
+            skipping the socket hop; the configs are updated whenever that\
+            address changes (see :meth:`~dna.DNA.refresh_proxy`).
+
+        The service stays bound to its socket in both modes, so switching back\
+            to ``socket`` mode is instant. Services on other Docker hosts (see\
+            :class:`~dna.HostPool`) have no socket, so they are always ``direct``.
+
+        :param service: the name of the service
+        :type service: str
+        :param mode: either ``socket`` or ``direct``
+        :type mode: str
+
+        :return: whether the mode was set
+
+        .. note:: Existing configs are edited in place, so changes made to them\
+            by ``certbot`` are kept.
+        """
+        if mode not in DNA.PROXY_MODES:
+            raise ValueError(f"Unknown proxy mode {mode}")
+        if mode == "socket" and not self.hosts.is_local(service):
+            raise ValueError(f"{service} runs on {self.hosts.placement(service)}, which has no sockets")
+        if not self.get_service_info(service):
+            return False
+
+        self.db.set_proxy_route(service, mode)
+        if mode == "direct":
+            self.refresh_proxy(service)
+        else:
+            self._set_proxy_pass(service, f"http://unix:{self.socks}/{service}.sock")
+        return True
+
+    def refresh_proxy(self, service, container=None):
+        """Point the nginx configs of ``service`` to its container's current\
+            address, if it uses the ``direct`` proxy mode and the address changed
+
+        This is called automatically after deploys and when containers start,\
+            including by :class:`~dna.EventWatcher`.
+
+        :param service: the name of the service
+        :type service: str
+        :param container: the container to point to (defaults to ``None``, which\
+            uses the ``service`` container)
+        :type container: str
+
+        :return: whether the configs were updated
+        """
+        route = self.db.get_proxy_route(service)
+        if not route or route.mode != "direct":
+            return False
+        address = self._direct_address(service, container)
+        if not address or address == route.address:
+            return False
+
+        self.print(f"Pointing {service} directly to {address}...")
+        self._set_proxy_pass(service, f"http://{address}")
+        self.db.set_proxy_route(service, "direct", address)
+        return True
+
     def add_domain(self, service, domain, force_wildcard=False, force_provision=False, proxy_set_header={}):
         """Proxy ``domain`` to ``service``, if it is not already bound to another service
 
@@ -323,12 +1163,42 @@ class DNA:
         .. important:: If ``force_wildcard`` and ``force_provision`` are both ``True``,\
             then a certificate will be provisioned for ``domain`` as well as ``*.domain``
         """
-        if self.db.add_domain_to_service(domain, service):
-            self._do_nginx_deploy(service, domain, force_wildcard, force_provision, proxy_set_header)
-            self.propagate_services()
-            return True
-        return False
+        return bool(self.add_domains(service, [domain], force_wildcard, force_provision, proxy_set_header))
+
+    @utils.metrics.instrument("dna_operation", "operation")
+    def add_domains(self, service, domains, force_wildcard=False, force_provision=False, proxy_set_header={}):
+        """Proxy each of the ``domains`` to ``service``, skipping any that are already\
+            bound to another service
 
+        This is much faster than calling :meth:`~dna.DNA.add_domain` once per domain:\
+            nginx is reloaded once, and all the domains that need a new certificate\
+            share a single one, provisioned in one ``certbot`` run.
+
+        :param service: the name of the service
+        :type service: str
+        :param domains: the urls to proxy to the service front-end
+        :type domains: list[str]
+        :param force_wildcard: forcibly use wildcard SSL certificates only\
+            (defaults to ``False``)
+        :type force_wildcard: bool
+        :param force_provision: forcibly provision a certificate even if\
+            other matches exist (defaults to ``False``)
+        :type force_provision: bool
+        :param proxy_set_header: a dictionary of proxy headers to pass into\
+            nginx
+        :type proxy_set_header: dict
+
+        :return: the domains that are now bound to the service
+        """
+        domains = [d for d in domains if self.db.add_domain_to_service(d, service)]
+        if domains:
+            with self._timed_deploy(service):
+                self._do_nginx_deploy(service, domains, force_wildcard, force_provision, proxy_set_header)
+            for domain in domains:
+                self.registry.bind_domain(domain, service)
+        return domains
+
+    @utils.metrics.instrument("dna_operation", "operation")
     def remove_domain(self, service, domain):
         """Remove ``domain`` from ``service``, if it is bound to it
 
@@ -342,11 +1212,12 @@ class DNA:
         """
         if self.db.remove_domain_from_service(domain, service):
             os.remove(f"{self.confs}/{domain}.conf")
-            out = utils.sh("nginx", "-s", "reload", stream=False)
-            self.propagate_services()
+            self._reload_nginx()
+            self.registry.unbind_domain(domain)
             return True
         return False
 
+    @utils.metrics.instrument("dna_operation", "operation")
     def stop_service(self, service):
         """Stop the requested service, if it is not stopped
 
@@ -357,12 +1228,15 @@ class DNA:
         """
         service = self.get_service_info(service)
         if service:
-            if self.docker.stop_container(service.name):
-                self.socat.unbind(service.name, service.port)
-                self.propagate_services()
+            host = self.hosts.host_of(service.name)
+            if host.docker.stop_container(service.name):
+                if host.local:
+                    self.socat.unbind(service.name, service.port)
+                self.registry.deactivate(service.name)
                 return True
         return False
 
+    @utils.metrics.instrument("dna_operation", "operation")
     def delete_service(self, service):
         """Unproxy all domains attached to ``service``, unbind ``service`` from socat,
         stop and delete the ``service``'s Docker container, and remove it from the
@@ -378,14 +1252,78 @@ class DNA:
 
         for domain in service.domains:
             os.remove(f"{self.confs}/{domain.url}.conf")
-        out = utils.sh("nginx", "-s", "reload", stream=False)
-        self.print(out)
+        self._reload_nginx()
+
+        host = self.hosts.host_of(service.name)
+        if host.local:
+            self.socat.unbind(service.name, service.port)
+        host.docker.wipe_container(service.name)
+
+        self.registry.remove(service.name)
+        self.db.delete_proxy_route(service.name)
+        self.resources.release(service.name)
+        self.hosts.forget(service.name)
+        self.db.delete_options_hash(service.name)
+        self.db.delete_service(service)
 
-        self.socat.unbind(service.name, service.port)
-        self.docker.wipe_container(service.name)
+    def apply(self, manifest, dry_run=False, prune=False, max_workers=4):
+        """Bring this DNA instance in line with ``manifest``, doing as little work as possible
 
-        self.db.delete_service(service)
-        self.propagate_services()
+        The services in the manifest are compared against the database and the\
+            running containers (see :func:`~dna.manifest.plan_manifest`). The\
+            resulting actions for each service are run in order, but different\
+            services are handled in parallel, and nginx reloads and image collection requests\
+            are batched (see :meth:`~dna.DNA.batch`).
+
+        :param manifest: the desired state (see :func:`~dna.manifest.parse_manifest`)
+        :type manifest: dict or list[dict]
+        :param dry_run: flag to only plan the actions, without running them\
+            (defaults to ``False``)
+        :type dry_run: bool
+        :param prune: flag to delete services that aren't in the manifest\
+            (defaults to ``False``)
+        :type prune: bool
+        :param max_workers: the maximum number of services to work on at once\
+            (defaults to ``4``)
+        :type max_workers: int
+
+        :return: the list of :class:`~dna.manifest.Action` objects, whose states\
+            show what was done
+        """
+        self._do_propagate_services()
+        actions = plan_manifest(self, manifest, prune)
+        for action in actions:
+            self.print(f"Planned {action}")
+        if dry_run or not actions:
+            return actions
+
+        chains = {}
+        for action in actions:
+            chains.setdefault(action.service, []).append(action)
+
+        with self.batch():
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for chain in chains.values():
+                    pool.submit(self._apply_actions, chain)
+        return actions
+
+    def _apply_actions(self, actions):
+        """Run ``actions`` in order, skipping the rest once one fails
+
+        :param actions: the actions to run
+        :type actions: list[:class:`~dna.manifest.Action`]
+        """
+        for action in actions:
+            try:
+                action.run(self)
+                action.state = Action.DONE
+            except Exception as e:
+                action.state, action.error = Action.FAILED, e
+                self.print(f"Failed to {action}: {e!r}")
+                for rest in actions:
+                    if rest.state == Action.PLANNED:
+                        rest.state = Action.SKIPPED
+                return
 
     ###########################################################
     ##
@@ -393,15 +1331,43 @@ class DNA:
     ##
     ###########################################################
 
-    def docker_logs(self, service):
+    def docker_logs(self, service, tail=100, since=None, until=None):
         """Get the docker logs for ``service``
 
         :param service: the name of the service
         :type service: str
+        :param tail: the number of lines to get, or ``"all"`` (defaults to ``100``)
+        :type tail: int or str
+        :param since: only get logs after this unix timestamp (defaults to ``None``)
+        :type since: int
+        :param until: only get logs before this unix timestamp (defaults to ``None``)
+        :type until: int
 
         :return: a string of log messages
         """
-        return self.docker.service_logs(service)
+        docker = self.hosts.host_of(service).docker
+        return docker.service_logs(service, tail=tail, since=since, until=until)
+
+    def stream_docker_logs(self, service, tail=100, since=None, until=None, follow=True):
+        """Stream the docker logs for ``service`` as they are written, over a\
+            single connection to Docker
+
+        :param service: the name of the service
+        :type service: str
+        :param tail: the number of existing lines to start with, or ``"all"``\
+            (defaults to ``100``)
+        :type tail: int or str
+        :param since: only get logs after this unix timestamp (defaults to ``None``)
+        :type since: int
+        :param until: only get logs before this unix timestamp (defaults to ``None``)
+        :type until: int
+        :param follow: flag to keep waiting for new lines (defaults to ``True``)
+        :type follow: bool
+
+        :yields: each log line; close the generator to stop following
+        """
+        docker = self.hosts.host_of(service).docker
+        return docker.stream_logs(service, tail=tail, since=since, until=until, follow=follow)
 
     def nginx_logs(self, service, error=False):
         """Get the nginx logs for ``service``
@@ -417,6 +1383,17 @@ class DNA:
         with open(path) as f:
             return f.read()
 
+    def build_logs(self, name):
+        """Get the logs of the last build called ``name`` made by :meth:`~dna.DNA.build_images`
+
+        :param name: the name of the build
+        :type name: str
+
+        :return: a string of log messages
+        """
+        with open(f"{self.logs}/{name}-build.log") as f:
+            return f.read()
+
     def dna_logs(self):
         """Get dna's own logs"""
         with open(self.logs + "/dna.log") as f:
@@ -429,4 +1406,8 @@ class DNA:
     def create_logs_client(self, fallback=None, precheck=lambda f: f):
         """See :class:`~dna.utils.create_logs_client`"""
         return utils.create_logs_client(self, fallback, precheck)
+
+    def create_metrics_client(self, precheck=lambda f: f):
+        """See :class:`~dna.utils.create_metrics_client`"""
+        return utils.create_metrics_client(self, precheck)
         
@@ -0,0 +1,214 @@
+import time, traceback
+from threading import Lock, Thread
+
+
+class EventWatcher:
+    """Keeps a DNA instance's service state live by following the Docker event stream
+
+    Every container that runs on a DNA instance's bridge network shows up in
+    the stream as a ``connect`` event on that network when it starts, and as a
+    ``disconnect`` event when it stops, crashes, or is removed. The watcher
+    subscribes to just those events and:
+
+    * marks services as running or stopped in the :class:`~dna.ServiceRegistry`
+    * rebinds a service's socket if its container was started without one\
+      (such as by ``docker start``, or a restart policy)
+    * rebinds every running service of a ``socat`` container if it restarts
+    * points nginx at a container's new address, for services in the\
+      ``direct`` proxy mode (see :meth:`~dna.DNA.set_proxy_mode`)
+
+    Listeners added with :meth:`~dna.EventWatcher.add_listener` are called with
+    ``(service, state)`` whenever a service's state changes, where ``state`` is
+    ``"running"`` or ``"stopped"``.
+
+    :param dna: the DNA instance to keep up to date
+    :type dna: :class:`~dna.DNA`
+    :param retry: the number of seconds to wait before resubscribing if the\
+        stream drops (defaults to ``1``)
+    :type retry: float
+    """
+
+    RUNNING = "running"
+    STOPPED = "stopped"
+
+    def __init__(self, dna, retry=1):
+        self.dna = dna
+        self.retry = retry
+        self.listeners = []
+
+        self._names = {}
+        self._retired = set()
+        self._lock = Lock()
+        self._stream = None
+        self._thread = None
+        self._running = False
+        self._since = None
+
+    def add_listener(self, func):
+        """Call ``func(service, state)`` whenever a service starts or stops
+
+        :param func: the listener
+        :type func: func
+        """
+        self.listeners.append(func)
+
+    def remove_listener(self, func):
+        """Stop calling ``func`` on state changes
+
+        :param func: the listener
+        :type func: func
+        """
+        self.listeners.remove(func)
+
+    def retire(self, id):
+        """Ignore the ``disconnect`` of the container with the given ``id``,\
+            which is being replaced by another container of the same service
+
+        :param id: the id of the container
+        :type id: str
+        """
+        if id:
+            with self._lock:
+                self._retired.add(id)
+
+    def start(self):
+        """Start following the event stream in a background thread
+
+        :return: this watcher
+        """
+        with self._lock:
+            if self._running:
+                return self
+            self._running = True
+        net = self.dna.docker.get_network(self.dna.socat.bridge, low_level=True)
+        self._names = {id: con["Name"] for id, con in net["Containers"].items()}
+        self._since = time.time()
+        self._thread = Thread(target=self._watch, name="dna-events", daemon=True)
+        self._thread.start()
+        self.dna.print("Watching Docker events...")
+        return self
+
+    def stop(self):
+        """Stop following the event stream"""
+        with self._lock:
+            self._running = False
+            stream = self._stream
+        if stream:
+            stream.close()
+        if self._thread:
+            self._thread.join()
+        self.dna.print("Stopped watching Docker events.")
+
+    def _watch(self):
+        """Follow the event stream until stopped, resubscribing if it drops
+
+        Resubscriptions start from the last event seen, so no events are missed.
+        """
+        while self._running:
+            try:
+                stream = self.dna.docker.events(
+                    since=self._since, type="network", network=self.dna.socat.bridge
+                )
+                with self._lock:
+                    self._stream = stream
+                if not self._running:
+                    stream.close()
+                for event in stream:
+                    self._since = event.get("time", self._since)
+                    self._handle(event)
+            except Exception:
+                if self._running:
+                    self.dna.print(traceback.format_exc())
+            if self._running:
+                time.sleep(self.retry)
+
+    def _handle(self, event):
+        """Update the DNA instance's state in response to a network event
+
+        :param event: the event, as decoded from the stream
+        :type event: dict
+        """
+        id = event.get("Actor", {}).get("Attributes", {}).get("container")
+        action = event.get("Action")
+        if not id or action not in ("connect", "disconnect"):
+            return
+
+        if action == "connect":
+            name = self._names.get(id) or self.dna.docker.container_name(id)
+            self._names[id] = name
+        else:
+            # the container may have been renamed since it connected (such as
+            # by a blue/green deploy), so prefer its current name if it still exists
+            name = self.dna.docker.container_name(id) or self._names.get(id)
+            self._names.pop(id, None)
+            with self._lock:
+                retired = id in self._retired
+                self._retired.discard(id)
+            if retired:
+                # the service is still served by the container that replaced this one
+                return
+        if not name:
+            return
+
+        shard = self.dna.socat.containers.get(name)
+        if shard:
+            self._handle_socat(action, shard)
+            return
+
+        service = self.dna.registry.get(name)
+        if not service:
+            return
+
+        was_running = self.dna.registry.is_active(name)
+        if action == "connect":
+            self.dna.registry.activate(name)
+            if name not in self.dna.socat.bindings:
+                self.dna.print(f"{name} started without a socket, binding it...")
+                self.dna.socat.bind(service.name, service.port)
+            # the container may have a new address on the bridge
+            self.dna.refresh_proxy(name)
+            if not was_running:
+                self._notify(name, EventWatcher.RUNNING)
+        else:
+            self.dna.registry.deactivate(name)
+            if was_running:
+                self._notify(name, EventWatcher.STOPPED)
+
+    def _handle_socat(self, action, shard):
+        """Respond to a ``socat`` container stopping or starting
+
+        Only the services bound on that container's shard are affected.
+
+        :param action: either ``connect`` or ``disconnect``
+        :type action: str
+        :param shard: the shard of the container
+        :type shard: :class:`~dna.socat.SocatShard`
+        """
+        self.dna.socat.reset(shard)
+        if action == "connect":
+            self.dna.print(
+                f"The socat container {shard.container} restarted, rebinding its services..."
+            )
+            socat = self.dna.socat
+            hosts = self.dna.hosts
+            socat.bind_all(
+                [
+                    s
+                    for s in self.dna.services
+                    if hosts.is_local(s.name) and socat.shard_for(s.name) is shard
+                ]
+            )
+
+    def _notify(self, service, state):
+        """Call every listener with ``(service, state)``
+
+        :param service: the name of the service
+        :type service: str
+        :param state: the new state of the service
+        :type state: str
+        """
+        for listener in list(self.listeners):
+            try:
+                listener(service, state)
+            except Exception:
+                self.dna.print(traceback.format_exc())
@@ -0,0 +1,220 @@
+import time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from dna.utils import metrics
+
+
+class HealthMonitor:
+    """Probes the socket of every running service in the background, and rebinds
+    the ones whose listener died
+
+    Every ``interval`` seconds, each running service on the local host is
+    checked with :meth:`~dna.SocatHelper.check`, which makes one connection
+    through its socket to the container port. The service is then in one of
+    three states:
+
+    * ``ready``: the container answered through the socket
+    * ``unready``: the listener accepted the connection, but the container\
+      didn't answer (rebinding wouldn't help, so the socket is left alone)
+    * ``dead``: the socket refused the connection, or the service isn't bound
+
+    Dead sockets are rebound, backing off exponentially (from ``backoff`` up to
+    ``max_backoff`` seconds) between attempts while they keep failing, so a
+    broken sidecar isn't hammered with binds.
+
+    :param dna: the DNA instance whose services to monitor
+    :type dna: :class:`~dna.DNA`
+    :param interval: the number of seconds between rounds of probes (defaults to ``10``)
+    :type interval: float
+    :param timeout: the maximum number of seconds to wait for each probe and\
+        rebind (defaults to ``2``)
+    :type timeout: float
+    :param backoff: the number of seconds to wait before retrying a failed\
+        rebind, doubled after every failure (defaults to ``1``)
+    :type backoff: float
+    :param max_backoff: the maximum number of seconds between rebinds\
+        (defaults to ``60``)
+    :type max_backoff: float
+    :param workers: the maximum number of services to probe at once (defaults to ``8``)
+    :type workers: int
+    """
+
+    READY = "ready"
+    UNREADY = "unready"
+    DEAD = "dead"
+
+    def __init__(
+        self, dna, interval=10, timeout=2, backoff=1, max_backoff=60, workers=8
+    ):
+        self.dna = dna
+        self.interval = interval
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="dna-health"
+        )
+
+        self._lock = Lock()
+        self._status = {}
+        self._wake = Event()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start probing in a background thread
+
+        :return: this monitor
+        """
+        if self._running:
+            return self
+        self._running = True
+        self._thread = Thread(target=self._loop, name="dna-health", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background thread"""
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self.executor.shutdown(wait=True)
+
+    def _loop(self):
+        """Run a round of probes every ``interval`` seconds, until stopped"""
+        while self._running:
+            try:
+                self.check_all()
+            except Exception:
+                self.dna.print(traceback.format_exc())
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def check_all(self):
+        """Probe every running service now, rebinding dead sockets that are due
+
+        :return: the status of every running service (see :meth:`~dna.HealthMonitor.get`)
+        """
+        services = [s for s in self.dna.services if self.dna.hosts.is_local(s.name)]
+        with self._lock:
+            running = {service.name for service in services}
+            for name in list(self._status):
+                if name not in running:
+                    del self._status[name]
+        list(self.executor.map(self.check, services))
+        return self.get()
+
+    def check(self, service):
+        """Probe one service now, rebinding its socket if it is dead and due
+
+        :param service: the service to check
+        :type service: :class:`~dna.utils.Service`
+
+        :return: its status (see :meth:`~dna.HealthMonitor.get`)
+        """
+        socat = self.dna.socat
+        name = service.name
+        if name in socat.bindings:
+            listening, latency = socat.check(name, self.timeout)
+        else:
+            listening, latency = False, None
+        if latency is not None:
+            metrics.observe("dna_socket_probe_duration_seconds", latency)
+
+        now = time.time()
+        with self._lock:
+            status = self._status.setdefault(name, self._new_status())
+            status["checked_at"] = now
+            status["latency"] = latency
+            if latency is not None:
+                status["state"], status["failures"], status["retry_at"] = (
+                    HealthMonitor.READY,
+                    0,
+                    None,
+                )
+            elif listening:
+                status["state"] = HealthMonitor.UNREADY
+            else:
+                status["state"] = HealthMonitor.DEAD
+            due = (
+                status["state"] == HealthMonitor.DEAD
+                and (status["retry_at"] or 0) <= now
+            )
+
+        if due:
+            self._rebind(service)
+        return self.get(name)
+
+    def _rebind(self, service):
+        """Rebind the socket of ``service``, scheduling the next attempt if it fails"""
+        name = service.name
+        self.dna.print(f"The socket of {name} is dead, rebinding it...")
+        try:
+            self.dna.socat.rebind(name, service.port, timeout=self.timeout).result()
+            listening, latency = self.dna.socat.check(name, self.timeout)
+        except Exception as e:
+            self.dna.print(f"Couldn't rebind {name}: {e!r}")
+            listening, latency = False, None
+
+        with self._lock:
+            status = self._status.setdefault(name, self._new_status())
+            status["rebinds"] += 1
+            if listening:
+                status["state"] = (
+                    HealthMonitor.READY
+                    if latency is not None
+                    else HealthMonitor.UNREADY
+                )
+                status["latency"], status["failures"], status["retry_at"] = (
+                    latency,
+                    0,
+                    None,
+                )
+            else:
+                status["failures"] += 1
+                delay = min(
+                    self.max_backoff, self.backoff * 2 ** (status["failures"] - 1)
+                )
+                status["retry_at"] = time.time() + delay
+        metrics.inc(
+            "dna_socket_rebind_total", result="success" if listening else "error"
+        )
+
+    def _new_status(self):
+        return {
+            "state": HealthMonitor.DEAD,
+            "latency": None,
+            "checked_at": None,
+            "failures": 0,
+            "rebinds": 0,
+            "retry_at": None,
+        }
+
+    def get(self, service=None):
+        """Get the last known status of ``service``, or of every service
+
+        :param service: the name of the service (defaults to ``None``, which gets\
+            the status of every service)
+        :type service: str
+
+        :return: a dictionary containing the ``state`` of the service, whether\
+            it is ``ready``, the ``latency`` of the last successful probe (in\
+            seconds), when it was ``checked_at``, the number of consecutive\
+            rebind ``failures``, the total number of ``rebinds``, and when the\
+            next rebind may happen (``retry_at``); or, without ``service``, a\
+            dictionary mapping each service to its status. Services that haven't\
+            been checked yet have no status (``None``).
+        """
+        with self._lock:
+            if service is not None:
+                status = self._status.get(service)
+                return (
+                    dict(status, ready=status["state"] == HealthMonitor.READY)
+                    if status
+                    else None
+                )
+            return {
+                name: dict(status, ready=status["state"] == HealthMonitor.READY)
+                for name, status in self._status.items()
+            }
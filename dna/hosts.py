@@ -0,0 +1,278 @@
+from threading import Lock
+from urllib.parse import urlparse
+from dna.utils import Docker, metrics
+
+#: The name of the Docker host DNA runs on
+LOCAL = "local"
+
+
+class DockerHost:
+    """One Docker endpoint that services can be placed on
+
+    :param name: the name of the host
+    :type name: str
+    :param docker: the interface to the host's Docker daemon
+    :type docker: :class:`~dna.utils.Docker`
+    :param address: the address nginx reaches the host's published ports at\
+        (defaults to ``None``, for the local host, which is reached through sockets)
+    :type address: str
+    """
+
+    def __init__(self, name, docker, address=None):
+        self.name = name
+        self.docker = docker
+        self.address = address
+
+    def __repr__(self):
+        return f"DockerHost({self.name}, {self.address})"
+
+    @property
+    def local(self):
+        """Whether this is the host DNA runs on"""
+        return self.name == LOCAL
+
+
+class HostPool:
+    """Manages the Docker hosts a DNA instance runs services on, and places each
+    new service on the least-loaded one
+
+    The host DNA runs on is always in the pool, as ``local``, and runs services
+    as before: on the socat bridge, behind sockets. Services placed on any other
+    host publish their port on a random port of that host, and nginx proxies
+    straight to ``address:port`` (as in the ``direct`` proxy mode, see
+    :meth:`~dna.DNA.set_proxy_mode`). Since they have no sockets, the
+    :class:`~dna.EventWatcher`, :class:`~dna.HealthMonitor`, and
+    :class:`~dna.StatsSampler` only cover local services. Their images are
+    pulled by the host they run on, so they need to be in a registry.
+
+    A new service goes to the host with the lowest load that can fit the
+    resources it declares (see :class:`~dna.ResourceAllocator`), where the load
+    adds up the share of the host's CPUs dedicated to services, the share of
+    its memory promised to services, and its share of all the services. Ties
+    go to the local host. Placements are saved in the database as
+    :class:`~dna.utils.Placement` objects, and services stay on their host
+    across redeploys unless they are moved with the ``host`` of
+    :meth:`~dna.DNA.run_deploy`.
+
+    :param dna: the DNA instance whose services to place
+    :type dna: :class:`~dna.DNA`
+    :param hosts: a dictionary mapping the names of other hosts to their\
+        endpoints (defaults to ``None``, see :meth:`~dna.HostPool.add`)
+    :type hosts: dict
+    """
+
+    def __init__(self, dna, hosts=None):
+        self.dna = dna
+        self.hosts = {LOCAL: DockerHost(LOCAL, dna.docker)}
+        self._lock = Lock()
+        self._placements = {p.service: p.host for p in dna.db.get_placements()}
+        for name, endpoint in (hosts or {}).items():
+            self.add(name, endpoint)
+
+    def add(self, name, endpoint, address=None):
+        """Add a Docker host to the pool
+
+        :param name: the name of the host
+        :type name: str
+        :param endpoint: the URL of the host's Docker daemon, such as\
+            ``tcp://10.0.0.2:2376``, or an object with the interface of\
+            :class:`~dna.utils.Docker` (such as an in-process fake)
+        :type endpoint: str or :class:`~dna.utils.Docker`
+        :param address: the address nginx reaches the host at (defaults to\
+            ``None``, which uses the hostname of the endpoint)
+        :type address: str
+
+        :return: the new :class:`~dna.hosts.DockerHost`
+        """
+        docker = Docker(base_url=endpoint) if isinstance(endpoint, str) else endpoint
+        if address is None:
+            address = urlparse(getattr(docker, "base_url", None) or "").hostname
+        if not address:
+            raise ValueError(f"Can't tell the address of {name}, pass one")
+        with self._lock:
+            if name in self.hosts:
+                raise ValueError(f"There is already a Docker host called {name}")
+            self.hosts[name] = DockerHost(name, docker, address)
+            return self.hosts[name]
+
+    def remove(self, name):
+        """Remove a Docker host from the pool, once no service is placed on it
+
+        :param name: the name of the host
+        :type name: str
+        """
+        if name == LOCAL:
+            raise ValueError("The local Docker host can't be removed")
+        placed = self.services(name)
+        if placed:
+            raise RuntimeError(f"{name} still runs {', '.join(placed)}")
+        with self._lock:
+            self.hosts.pop(name, None)
+
+    def get(self, name):
+        """Get the Docker host called ``name``
+
+        :param name: the name of the host
+        :type name: str
+
+        :return: the :class:`~dna.hosts.DockerHost`
+        """
+        host = self.hosts.get(name)
+        if host is None:
+            raise ValueError(f"Unknown Docker host {name}")
+        return host
+
+    def placement(self, service):
+        """Get the name of the Docker host ``service`` is placed on
+
+        :param service: the name of the service
+        :type service: str
+
+        :return: the name of the host, which is ``local`` for services that were\
+            never placed
+        """
+        return self._placements.get(service, LOCAL)
+
+    def host_of(self, service):
+        """Get the Docker host ``service`` is placed on
+
+        :param service: the name of the service
+        :type service: str
+
+        :return: the :class:`~dna.hosts.DockerHost` (see :meth:`~dna.HostPool.placement`)
+        """
+        return self.get(self.placement(service))
+
+    def is_local(self, service):
+        """Return whether ``service`` runs on the local host
+
+        :param service: the name of the service
+        :type service: str
+        """
+        return self.placement(service) == LOCAL
+
+    def services(self, name):
+        """Get the services placed on the Docker host called ``name``
+
+        :param name: the name of the host
+        :type name: str
+
+        :return: a sorted list of service names
+        """
+        if name == LOCAL:
+            return sorted(
+                service.name
+                for service in self.dna.registry
+                if self.is_local(service.name)
+            )
+        return sorted(
+            service for service, host in self._placements.items() if host == name
+        )
+
+    def load(self, name=None):
+        """Get how loaded a Docker host is
+
+        :param name: the name of the host (defaults to ``None``, which gets the\
+            load of every host)
+        :type name: str
+
+        :return: a dictionary containing the number of ``services`` on the host,\
+            the ``cores`` dedicated to them out of its ``cpus``, the bytes of\
+            ``memory`` promised to them out of its ``memory_capacity``, and the\
+            resulting ``score``; or, without ``name``, a dictionary mapping each\
+            host to its load
+        """
+        if name is None:
+            return {name: self.load(name) for name in list(self.hosts)}
+        allocations = self.dna.db.get_allocations(name)
+        capacity = self.dna.resources.capacity(name)
+        services = len(self.services(name))
+        total = sum(len(self.services(host)) for host in list(self.hosts))
+        cores = sum(allocation.cores or 0 for allocation in allocations)
+        memory = sum(allocation.memory or 0 for allocation in allocations)
+        return {
+            "services": services,
+            "cores": cores,
+            "cpus": len(capacity["cpus"]),
+            "memory": memory,
+            "memory_capacity": capacity["memory"],
+            "score": cores / len(capacity["cpus"])
+            + memory / capacity["memory"]
+            + services / max(total, 1),
+        }
+
+    def choose(self, service, resources=None):
+        """Choose the Docker host to deploy ``service`` on, without placing it
+
+        :param service: the name of the service
+        :type service: str
+        :param resources: the resources the service declares (defaults to ``None``)
+        :type resources: dict
+
+        :return: the host the service is placed on, if it is (services that\
+            were deployed before they could be placed run on the local host);\
+            else the least-loaded :class:`~dna.hosts.DockerHost` that can fit it
+        """
+        if (
+            service in self._placements
+            or service in self.dna.registry
+            or self.dna.db.get_service_by_name(service)
+        ):
+            return self.host_of(service)
+        hosts = list(self.hosts.values())
+        if len(hosts) == 1:
+            return hosts[0]
+        fitting = [
+            h
+            for h in hosts
+            if self.dna.resources.fits(service, host=h.name, **(resources or {}))
+        ]
+        # when nothing fits, the allocator explains why on the least-loaded host
+        return min(
+            fitting or hosts,
+            key=lambda h: (self.load(h.name)["score"], not h.local, h.name),
+        )
+
+    def assign(self, service, name):
+        """Place ``service`` on the Docker host called ``name``
+
+        :param service: the name of the service
+        :type service: str
+        :param name: the name of the host
+        :type name: str
+        """
+        self.get(name)
+        self.dna.db.set_placement(service, name)
+        with self._lock:
+            moved = self._placements.get(service) != name
+            self._placements[service] = name
+        if moved:
+            metrics.inc("dna_placement_total", host=name)
+
+    def forget(self, service):
+        """Forget where ``service`` is placed
+
+        :param service: the name of the service
+        :type service: str
+        """
+        self.dna.db.delete_placement(service)
+        with self._lock:
+            self._placements.pop(service, None)
+
+    def running(self):
+        """Get the services placed on other hosts whose containers are running
+
+        Hosts that can't be reached are skipped, so their services count as stopped.
+
+        :return: a set of service names
+        """
+        running = set()
+        for host in list(self.hosts.values()):
+            placed = set(self.services(host.name)) if not host.local else set()
+            if not placed:
+                continue
+            try:
+                running |= placed & host.docker.running_containers()
+            except Exception as e:
+                self.dna.print(f"Couldn't list the containers on {host.name}: {e!r}")
+        return running
@@ -0,0 +1,250 @@
+import shutil, time, traceback
+from collections import Counter
+from threading import Event, Lock, Thread
+from dna.utils import metrics
+
+
+def _normalize(image):
+    """Add the implicit ``latest`` tag to an image name that has none"""
+    if image.startswith("sha256:") or ":" in image.rsplit("/", 1)[-1]:
+        return image
+    return f"{image}:latest"
+
+
+class ImageCollector:
+    """Removes Docker images that DNA no longer needs, in the background
+
+    Images are collected according to a retention policy:
+
+    * Images used by a container (running or not) are never removed.
+    * Images tagged with one of the ``protected`` tags are never removed.
+    * Images held for a pending deploy (see :meth:`~dna.ImageCollector.hold`)\
+      are never removed.
+    * The ``keep_last`` most recently deployed images of every registered\
+      service are kept, so that recent deploys can be rolled back quickly.
+    * Every other untagged (dangling) image is removed.
+    * If the remaining images take up more than ``budget`` bytes, the oldest\
+      ones that aren't kept by the rules above are removed (tagged or not)\
+      until they fit, but only if a service ran them and hasn't deployed them\
+      for ``min_age`` seconds. Images that were pulled or built but never\
+      deployed are left alone, since they are likely about to be.
+
+    A collection runs every ``interval`` seconds, whenever free disk space in
+    the Docker root directory drops below ``min_free``, and shortly after
+    :meth:`~dna.ImageCollector.request` is called (but no more than once every
+    ``cooldown`` seconds). Deploys only call :meth:`~dna.ImageCollector.request`,
+    so they never wait for a collection.
+
+    :param dna: the DNA instance whose images to collect
+    :type dna: :class:`~dna.DNA`
+    :param keep_last: the number of recent images to keep per service (defaults to ``2``)
+    :type keep_last: int
+    :param budget: the maximum number of bytes all images may take up (defaults to\
+        ``None``, which doesn't enforce a budget)
+    :type budget: int
+    :param min_age: the number of seconds since an image was last deployed\
+        before it may be removed to fit the ``budget`` (defaults to ``3600``)
+    :type min_age: float
+    :param protected: tags whose images are never removed (defaults to\
+        ``["socat:latest"]``)
+    :type protected: list[str]
+    :param interval: the number of seconds between scheduled collections (defaults\
+        to ``3600``)
+    :type interval: float
+    :param cooldown: the minimum number of seconds between requested collections\
+        (defaults to ``300``)
+    :type cooldown: float
+    :param min_free: the fraction of free disk space below which a collection runs\
+        (defaults to ``0.1``)
+    :type min_free: float
+    :param check_every: the number of seconds between disk space checks (defaults\
+        to ``60``)
+    :type check_every: float
+
+    :ivar last_report: the report of the last collection, if there was one (see\
+        :meth:`~dna.ImageCollector.collect`)
+    :ivar reclaimed: the total number of bytes reclaimed by this collector
+    """
+
+    def __init__(
+        self,
+        dna,
+        keep_last=2,
+        budget=None,
+        min_age=3600,
+        protected=["socat:latest"],
+        interval=3600,
+        cooldown=300,
+        min_free=0.1,
+        check_every=60,
+    ):
+        self.dna = dna
+        self.keep_last = keep_last
+        self.budget = budget
+        self.min_age = min_age
+        self.protected = list(protected)
+        self.interval = interval
+        self.cooldown = cooldown
+        self.min_free = min_free
+        self.check_every = check_every
+
+        self.last_report = None
+        self.reclaimed = 0
+
+        self._lock = Lock()
+        self._held = Counter()
+        self._held_lock = Lock()
+        self._wake = Event()
+        self._requested = False
+        self._last_run = 0
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start collecting in a background thread
+
+        :return: this collector
+        """
+        if self._running:
+            return self
+        self._running = True
+        self._last_run = time.time()
+        self._thread = Thread(target=self._loop, name="dna-image-gc", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background thread"""
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def request(self):
+        """Ask for a collection soon, without waiting for it"""
+        self._requested = True
+        self._wake.set()
+
+    def hold(self, image):
+        """Keep ``image`` until it is released, such as while a deploy of it is\
+            pending (holds are counted, so each one needs its own release)
+
+        :param image: the name (with an optional tag) or id of the image
+        :type image: str
+        """
+        with self._held_lock:
+            self._held[_normalize(image)] += 1
+
+    def release(self, image):
+        """Release a hold on ``image`` (see :meth:`~dna.ImageCollector.hold`)
+
+        :param image: the name (with an optional tag) or id of the image
+        :type image: str
+        """
+        with self._held_lock:
+            self._held[_normalize(image)] -= 1
+            self._held += Counter()
+
+    def _disk_pressure(self):
+        """Return whether free space in the Docker root directory is below ``min_free``"""
+        try:
+            usage = shutil.disk_usage(self.dna.docker.root_dir())
+        except OSError:
+            return False
+        return usage.free < self.min_free * usage.total
+
+    def _loop(self):
+        """Run collections whenever they're due, until stopped"""
+        while self._running:
+            self._wake.wait(self.check_every)
+            self._wake.clear()
+            if not self._running:
+                return
+
+            since = time.time() - self._last_run
+            due = since >= self.interval or (self._requested and since >= self.cooldown)
+            if not due and not self._disk_pressure():
+                continue
+
+            self._requested = False
+            try:
+                self.collect()
+            except Exception:
+                self.dna.print(traceback.format_exc())
+
+    def _plan(self, images, in_use):
+        """Choose the images to remove
+
+        :param images: all the top-level images
+        :type images: list[:class:`~docker.models.images.Image`]
+        :param in_use: the ids of images used by containers
+        :type in_use: set[str]
+
+        :return: a list of :class:`~docker.models.images.Image` objects to remove,\
+            in the order they should be removed
+        """
+        keep = set(in_use)
+        for service in self.dna.registry:
+            keep.update(self.dna.db.get_deployed_images(service.name, self.keep_last))
+        with self._held_lock:
+            held = set(self._held)
+        for image in images:
+            if any(tag in self.protected for tag in image.tags):
+                keep.add(image.id)
+            if image.id in held or held.intersection(image.tags):
+                keep.add(image.id)
+
+        removable = [image for image in images if image.id not in keep]
+        remove = [image for image in removable if not image.tags]
+
+        if self.budget is not None:
+            deployed = self.dna.db.get_image_deploys()
+            cutoff = time.time() - self.min_age
+            evictable = [
+                image
+                for image in removable
+                if image.id in deployed and deployed[image.id] <= cutoff
+            ]
+            total = sum(image.attrs["Size"] for image in images if image not in remove)
+            for image in sorted(evictable, key=lambda i: i.attrs["Created"]):
+                if total <= self.budget:
+                    break
+                if image not in remove:
+                    remove.append(image)
+                    total -= image.attrs["Size"]
+        return remove
+
+    def collect(self):
+        """Run a collection now
+
+        :return: a dictionary containing the ``removed`` image ids, the number\
+            of bytes ``reclaimed``, and the collection's ``started_at`` timestamp\
+            and ``duration``
+        """
+        with self._lock:
+            start = time.time()
+            self.dna.print("Collecting unused images...")
+            before = self.dna.docker.disk_usage()
+            images = self.dna.docker.list_images()
+            remove = self._plan(images, self.dna.docker.images_in_use())
+
+            removed = []
+            for image in remove:
+                if self.dna.docker.remove_image(image.id):
+                    removed.append(image.id)
+            reclaimed = max(0, before - self.dna.docker.disk_usage()) if removed else 0
+
+            self.reclaimed += reclaimed
+            self._last_run = time.time()
+            self.last_report = {
+                "removed": removed,
+                "reclaimed": reclaimed,
+                "started_at": start,
+                "duration": self._last_run - start,
+            }
+            metrics.inc("dna_image_gc_reclaimed_bytes_total", reclaimed)
+            metrics.inc("dna_image_gc_removed_images_total", len(removed))
+            self.dna.print(
+                f"Removed {len(removed)} images, reclaiming {reclaimed} bytes."
+            )
+            return self.last_report
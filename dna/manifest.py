@@ -0,0 +1,232 @@
+import hashlib
+import json
+
+
+def hash_options(options):
+    """Hash docker options in a way that doesn't depend on their order
+
+    :param options: the options to pass to docker on deploy
+    :type options: dict
+
+    :return: the hex digest of the options
+    """
+    encoded = json.dumps(options or {}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class Action:
+    """Represents one step needed to bring a DNA instance in line with a manifest
+
+    :param kind: one of ``deploy``, ``start``, ``add_domains``, ``remove_domain``,\
+        or ``delete``
+    :type kind: str
+    :param service: the name of the service the action applies to
+    :type service: str
+    :param reason: a short explanation of why the action is needed
+    :type reason: str
+    :param params: the arguments of the action, such as the ``image`` and ``port``\
+        of a ``deploy`` or the ``domains`` of an ``add_domains``
+    :type params: kwargs
+
+    :ivar state: one of ``planned``, ``done``, ``failed``, or ``skipped`` (an\
+        earlier action for the same service failed)
+    :ivar error: the exception raised by the action, if it ``failed``
+    """
+
+    PLANNED = "planned"
+    DONE = "done"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+    def __init__(self, kind, service, reason, **params):
+        self.kind = kind
+        self.service = service
+        self.reason = reason
+        self.params = params
+        self.state = Action.PLANNED
+        self.error = None
+
+    def __repr__(self):
+        return f"Action({self.kind}, {self.service}, {self.state})"
+
+    def __str__(self):
+        params = ", ".join(
+            f"{k}={v}"
+            for k, v in self.params.items()
+            if k not in ("options", "resources")
+        )
+        return (
+            f"{self.kind} {self.service}"
+            + (f" ({params})" if params else "")
+            + f": {self.reason}"
+        )
+
+    def to_json(self):
+        """Represent this Action as a JSON dictionary
+
+        :return: a dictionary containing the kind, service, reason, parameters,\
+            state, and error (if any) of this action
+        """
+        return {
+            "kind": self.kind,
+            "service": self.service,
+            "reason": self.reason,
+            "params": self.params,
+            "state": self.state,
+            "error": repr(self.error) if self.error else None,
+        }
+
+    def run(self, dna):
+        """Perform this action on ``dna``
+
+        :param dna: the DNA instance to act on
+        :type dna: :class:`~dna.DNA`
+        """
+        if self.kind == "deploy":
+            p = self.params
+            dna.run_deploy(
+                self.service,
+                p["image"],
+                p["port"],
+                resources=p.get("resources"),
+                host=p.get("host"),
+                **p.get("options", {}),
+            )
+        elif self.kind == "start":
+            dna.start_service(self.service)
+        elif self.kind == "add_domains":
+            dna.add_domains(self.service, self.params["domains"])
+        elif self.kind == "remove_domain":
+            dna.remove_domain(self.service, self.params["domain"])
+        elif self.kind == "delete":
+            dna.delete_service(self.service)
+
+
+def parse_manifest(manifest):
+    """Normalize a manifest into a list of service specifications
+
+    A manifest is either a list of service specifications, or a dictionary
+    with a ``services`` key holding that list. Each specification is a
+    dictionary with the following keys:
+
+    * ``name``: the name of the service (required)
+    * ``image``: the Docker image containing the service (required)
+    * ``port``: the container port running the front-end of the service (required)
+    * ``options``: other options to pass to docker on deploy (optional)
+    * ``resources``: the ``cores``, ``cpu_shares``, and ``memory`` the service\
+      needs (optional, see :class:`~dna.ResourceAllocator`)
+    * ``host``: the name of the Docker host to run the service on (optional,\
+      see :class:`~dna.HostPool`)
+    * ``domains``: the urls to proxy to the service (optional)
+
+    :param manifest: the manifest to parse
+    :type manifest: dict or list[dict]
+
+    :return: a list of dictionaries, each with all of the keys above
+    """
+    if isinstance(manifest, dict):
+        manifest = manifest.get("services", [])
+
+    specs, seen = [], set()
+    for spec in manifest:
+        missing = [key for key in ("name", "image", "port") if key not in spec]
+        if missing:
+            raise ValueError(f"Service {spec} is missing {', '.join(missing)}")
+        if spec["name"] in seen:
+            raise ValueError(f"Service {spec['name']} is listed more than once")
+        seen.add(spec["name"])
+        specs.append(
+            {
+                "name": spec["name"],
+                "image": spec["image"],
+                "port": str(spec["port"]),
+                "options": spec.get("options", {}),
+                "resources": spec.get("resources"),
+                "host": spec.get("host"),
+                "domains": list(spec.get("domains", [])),
+            }
+        )
+    return specs
+
+
+def plan_manifest(dna, manifest, prune=False):
+    """Compute the minimal list of actions that bring ``dna`` in line with ``manifest``
+
+    Services are compared against the DNA instance's registry (which reflects
+    both the database and the containers running on the bridge network):
+
+    * A service that isn't registered, or whose image, port, declared\
+      resources, host, or docker ``options`` changed, is deployed.
+    * A registered service that isn't running is started, or redeployed if its\
+      container no longer exists.
+    * Domains missing from a service are added, and extra ones are removed.
+    * With ``prune``, registered services missing from the manifest are deleted.
+
+    :param dna: the DNA instance to compare against
+    :type dna: :class:`~dna.DNA`
+    :param manifest: the desired state (see :func:`~dna.manifest.parse_manifest`)
+    :type manifest: dict or list[dict]
+    :param prune: flag to delete services that aren't in the manifest (defaults\
+        to ``False``)
+    :type prune: bool
+
+    :return: a list of :class:`~dna.manifest.Action` objects, in the order they\
+        should be run for each service
+    """
+    actions = []
+    specs = parse_manifest(manifest)
+
+    for spec in specs:
+        name = spec["name"]
+        deploy = dict(
+            image=spec["image"],
+            port=spec["port"],
+            options=spec["options"],
+            resources=spec["resources"],
+            host=spec["host"],
+        )
+        service = dna.registry.get(name)
+
+        if not service:
+            actions.append(Action("deploy", name, "new service", **deploy))
+        elif service.image != spec["image"] or service.port != spec["port"]:
+            actions.append(Action("deploy", name, "image or port changed", **deploy))
+        elif spec["resources"] is not None and not dna.resources.matches(
+            name, spec["resources"]
+        ):
+            actions.append(Action("deploy", name, "resources changed", **deploy))
+        elif spec["host"] is not None and spec["host"] != dna.hosts.placement(name):
+            actions.append(Action("deploy", name, "host changed", **deploy))
+        elif (dna.db.get_options_hash(name) or hash_options({})) != hash_options(
+            spec["options"]
+        ):
+            actions.append(Action("deploy", name, "options changed", **deploy))
+        elif not dna.registry.is_active(name):
+            if dna.hosts.host_of(name).docker.container_exists(name):
+                actions.append(Action("start", name, "container is stopped"))
+            else:
+                actions.append(Action("deploy", name, "container is missing", **deploy))
+
+        current = [d.url for d in service.domains] if service else []
+        added = [d for d in spec["domains"] if d not in current]
+        if added:
+            actions.append(
+                Action("add_domains", name, "domains missing", domains=added)
+            )
+        for domain in current:
+            if domain not in spec["domains"]:
+                actions.append(
+                    Action(
+                        "remove_domain", name, "domain not in manifest", domain=domain
+                    )
+                )
+
+    if prune:
+        names = {spec["name"] for spec in specs}
+        for service in dna.registry:
+            if service.name not in names:
+                actions.append(
+                    Action("delete", service.name, "service not in manifest")
+                )
+
+    return actions
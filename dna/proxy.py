@@ -0,0 +1,196 @@
+"""A single-process, event-driven proxy from unix sockets to TCP addresses
+
+This is the ``mux`` engine of :class:`~dna.SocatHelper`. Unlike the ``socat``
+engine, which runs one ``socat`` process per service that forks again for
+every connection, one instance of this script serves every socket of a DNA
+instance from a single ``asyncio`` event loop.
+
+It only uses the standard library, since it runs inside the sidecar container
+(where this file is mounted) rather than alongside DNA::
+
+    python proxy.py /socks
+
+The routing table maps socket names to TCP addresses, and is updated at
+runtime over a control socket (``.mux-control`` in the socket folder), which
+accepts one JSON request per line:
+
+* ``{"op": "bind", "name": "app", "host": "app", "port": 8000}`` listens on\
+  ``app.sock`` (replacing any existing listener) and replies once it is live
+* ``{"op": "unbind", "name": "app"}`` stops listening on ``app.sock``
+* ``{"op": "list"}`` replies with the routing table
+
+The routing table is saved to ``.routes.json`` in the socket folder, so the
+proxy serves the same routes again if it restarts.
+"""
+
+import asyncio, json, os, signal, sys
+from functools import partial
+
+#: The size of the buffer used to copy data between connections
+BUFFER = 64 * 1024
+
+#: The name of the control socket
+CONTROL = ".mux-control"
+
+#: The name of the saved routing table
+TABLE = ".routes.json"
+
+
+async def pipe(reader, writer):
+    """Copy everything from ``reader`` to ``writer``, then half-close ``writer``"""
+    try:
+        while True:
+            data = await reader.read(BUFFER)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except OSError:
+        pass
+    finally:
+        try:
+            if writer.can_write_eof():
+                writer.write_eof()
+        except OSError:
+            pass
+
+
+class Proxy:
+    """Serves every route in the routing table from one event loop
+
+    :param root: the folder to create sockets in
+    :type root: str
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.routes = {}
+        self.servers = {}
+        self.connections = 0
+
+    def _path(self, name):
+        return os.path.join(self.root, f"{name}.sock")
+
+    def _save(self):
+        """Atomically save the routing table"""
+        tmp = os.path.join(self.root, TABLE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.routes, f)
+        os.replace(tmp, os.path.join(self.root, TABLE))
+
+    async def _handle(self, name, reader, writer):
+        """Proxy one connection to the address ``name`` currently routes to
+
+        The address is looked up (and its host resolved) on every connection,
+        so rebinding a route or restarting its container takes effect at once.
+        """
+        self.connections += 1
+        route = self.routes.get(name)
+        try:
+            if not route:
+                return
+            try:
+                up_reader, up_writer = await asyncio.open_connection(*route)
+            except OSError:
+                return
+            try:
+                await asyncio.gather(pipe(reader, up_writer), pipe(up_reader, writer))
+            finally:
+                up_writer.close()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def bind(self, name, host, port):
+        """Route ``name.sock`` to ``host:port``, listening on it if needed"""
+        self.routes[name] = [host, int(port)]
+        path = self._path(name)
+        if name not in self.servers or not os.path.exists(path):
+            await self._close(name)
+            if os.path.exists(path):
+                os.remove(path)
+            self.servers[name] = await asyncio.start_unix_server(
+                partial(self._handle, name), path=path
+            )
+            os.chmod(path, 0o666)
+        self._save()
+
+    async def _close(self, name):
+        server = self.servers.pop(name, None)
+        if server:
+            server.close()
+            await server.wait_closed()
+
+    async def unbind(self, name):
+        """Stop listening on ``name.sock`` and forget its route"""
+        self.routes.pop(name, None)
+        await self._close(name)
+        if os.path.exists(self._path(name)):
+            os.remove(self._path(name))
+        self._save()
+
+    async def _control(self, reader, writer):
+        """Answer requests on the control socket, one JSON object per line"""
+        try:
+            async for line in reader:
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                    if op == "bind":
+                        await self.bind(
+                            request["name"], request["host"], request["port"]
+                        )
+                        reply = {"ok": True}
+                    elif op == "unbind":
+                        await self.unbind(request["name"])
+                        reply = {"ok": True}
+                    elif op == "list":
+                        reply = {
+                            "ok": True,
+                            "routes": self.routes,
+                            "connections": self.connections,
+                        }
+                    else:
+                        reply = {"ok": False, "error": f"unknown op {op}"}
+                except Exception as e:
+                    reply = {"ok": False, "error": repr(e)}
+                writer.write((json.dumps(reply) + "\n").encode("utf-8"))
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """Restore the saved routes and serve until stopped"""
+        try:
+            with open(os.path.join(self.root, TABLE)) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        for name, (host, port) in saved.items():
+            await self.bind(name, host, port)
+
+        control = os.path.join(self.root, CONTROL)
+        if os.path.exists(control):
+            os.remove(control)
+        server = await asyncio.start_unix_server(self._control, path=control)
+        os.chmod(control, 0o600)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+
+        # like socat, remove the sockets on exit (the routes stay saved)
+        server.close()
+        for name in list(self.servers):
+            await self._close(name)
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        os.remove(control)
+
+
+if __name__ == "__main__":
+    asyncio.run(Proxy(sys.argv[1] if len(sys.argv) > 1 else "/socks").serve())
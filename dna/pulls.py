@@ -0,0 +1,241 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from dna.utils import metrics
+
+
+class PullProgress:
+    """Aggregates the per-layer progress of one or more image pulls
+
+    Layers are identified by the id Docker reports for them, so a base layer
+    shared by several images pulled at once is only counted once.
+
+    :param window: the number of seconds to measure the current ``rate`` over\
+        (defaults to ``5``)
+    :type window: float
+    """
+
+    #: Statuses that mean a layer doesn't need to be downloaded any further
+    DONE = ("Download complete", "Already exists", "Pull complete")
+
+    def __init__(self, window=5):
+        self.window = window
+        self.started_at = time.time()
+        self.layers = {}
+        self._lock = Lock()
+        self._samples = deque()
+
+    def update(self, line):
+        """Record one line of ``docker pull`` output
+
+        :param line: the decoded line
+        :type line: dict
+        """
+        id, status = line.get("id"), line.get("status", "")
+        if not id or status.startswith("Pulling from") or status.startswith("Digest"):
+            return
+        detail = line.get("progressDetail") or {}
+
+        with self._lock:
+            layer = self.layers.setdefault(
+                id, {"status": status, "current": 0, "total": 0}
+            )
+            if status == "Downloading" and "current" in detail:
+                layer["current"] = max(layer["current"], detail["current"])
+                layer["total"] = detail.get("total", layer["total"])
+            elif status in PullProgress.DONE:
+                layer["current"] = layer["total"] = max(
+                    layer["current"], layer["total"]
+                )
+            if layer["status"] not in PullProgress.DONE or status == "Pull complete":
+                layer["status"] = status
+
+            now = time.time()
+            self._samples.append((now, self._downloaded()))
+            while self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+
+    def _downloaded(self):
+        """Get the number of bytes downloaded so far (without locking)"""
+        return sum(layer["current"] for layer in self.layers.values())
+
+    def to_json(self):
+        """Represent this progress as a JSON dictionary
+
+        :return: a dictionary containing the number of ``layers`` and how many\
+            are ``done``, the number of bytes ``downloaded`` and the ``total``\
+            known so far, the ``elapsed`` seconds, and the download ``rate``\
+            over the last ``window`` seconds and ``average`` rate overall (in\
+            bytes per second)
+        """
+        with self._lock:
+            downloaded = self._downloaded()
+            total = sum(layer["total"] for layer in self.layers.values())
+            done = sum(
+                layer["status"] in PullProgress.DONE for layer in self.layers.values()
+            )
+            samples = list(self._samples)
+
+        elapsed = time.time() - self.started_at
+        rate = 0
+        if len(samples) > 1 and samples[-1][0] > samples[0][0]:
+            rate = (samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0])
+        return {
+            "layers": len(self.layers),
+            "done": done,
+            "downloaded": downloaded,
+            "total": total,
+            "elapsed": elapsed,
+            "rate": rate,
+            "average": downloaded / elapsed if elapsed else 0,
+        }
+
+
+class PullManager:
+    """Pulls images concurrently, merging identical pulls that are in flight
+
+    Each call to :meth:`~dna.PullManager.pull` returns a
+    :class:`~concurrent.futures.Future`. If the same image and tag is already
+    being pulled, the future of that pull is returned instead of starting
+    another one. Progress is reported to a :class:`~dna.PullProgress`, which
+    defaults to ``progress`` (shared by every pull made by this manager).
+
+    :param dna: the DNA instance to pull with
+    :type dna: :class:`~dna.DNA`
+    :param workers: the maximum number of pulls to run at once (defaults to ``4``)
+    :type workers: int
+
+    :ivar progress: the :class:`~dna.PullProgress` of every pull made by this manager
+    """
+
+    def __init__(self, dna, workers=4):
+        self.dna = dna
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="dna-pull"
+        )
+        self.progress = PullProgress()
+        self._lock = Lock()
+        self._inflight = {}
+
+    def _is_current(self, image, tag, digest):
+        """Return whether the local copy of ``image`` already has ``digest``
+
+        :param image: the name of the image
+        :type image: str
+        :param tag: the tag of the image
+        :type tag: str
+        :param digest: the expected digest, such as ``sha256:...``
+        :type digest: str
+        """
+        local = self.dna.docker.get_image(f"{image}:{tag}")
+        if not local:
+            return False
+        return any(
+            d.split("@")[-1] == digest for d in local.attrs.get("RepoDigests", [])
+        )
+
+    def _pull(self, key, image, tag, digest, watchers, on_line):
+        """Run one pull, reporting its output to every progress in ``watchers``
+
+        :return: the result of the pull (see :meth:`~dna.PullManager.pull`)
+        """
+        start = time.time()
+        try:
+            if digest and self._is_current(image, tag, digest):
+                self.dna.print(f"{image}:{tag} is already at {digest}, skipping pull.")
+                metrics.inc("dna_pull_total", result="skipped")
+                return {
+                    "image": image,
+                    "tag": tag,
+                    "skipped": True,
+                    "duration": time.time() - start,
+                }
+
+            for line in self.dna.docker.pull_image_stream(image, tag):
+                if "error" in line:
+                    raise RuntimeError(line["error"].strip())
+                with self._lock:
+                    current = list(watchers)
+                for progress in current:
+                    progress.update(line)
+                if on_line:
+                    on_line(line)
+            metrics.inc("dna_pull_total", result="pulled")
+            return {
+                "image": image,
+                "tag": tag,
+                "skipped": False,
+                "duration": time.time() - start,
+            }
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def pull(self, image, tag=None, digest=None, progress=None, on_line=None):
+        """Pull ``image`` in the background
+
+        :param image: the name or url of the image to pull
+        :type image: str
+        :param tag: the tag to pull (defaults to ``None``, which pulls the tag\
+            in ``image``, or ``latest``)
+        :type tag: str
+        :param digest: if the local image already has this digest, skip the pull\
+            (defaults to ``None``, which always pulls)
+        :type digest: str
+        :param progress: the progress to report to, in addition to that of any\
+            identical pull in flight (defaults to ``None``, which uses ``progress``)
+        :type progress: :class:`~dna.PullProgress`
+        :param on_line: a function to call with every line of pull output\
+            (defaults to ``None``); it isn't called for merged pulls
+        :type on_line: func
+
+        :return: a :class:`~concurrent.futures.Future` resolving to a dictionary\
+            containing the ``image``, ``tag``, whether the pull was ``skipped``,\
+            and its ``duration``
+        """
+        if not tag and ":" in image.rsplit("/", 1)[-1]:
+            image, tag = image.rsplit(":", 1)
+        tag = tag or "latest"
+        key = (image, tag)
+        progress = progress or self.progress
+        with self._lock:
+            if key in self._inflight:
+                future, watchers = self._inflight[key]
+                if progress not in watchers:
+                    watchers.append(progress)
+                metrics.inc("dna_pull_total", result="merged")
+                return future
+            watchers = [progress]
+            future = self.executor.submit(
+                self._pull, key, image, tag, digest, watchers, on_line
+            )
+            self._inflight[key] = (future, watchers)
+        return future
+
+    def pull_all(self, images, progress=None):
+        """Pull every image in ``images`` at once, and wait for them all
+
+        :param images: the images to pull, each either a name or a dictionary of\
+            arguments to :meth:`~dna.PullManager.pull` (with an ``image`` key)
+        :type images: list[str or dict]
+        :param progress: the progress to report to (defaults to ``None``, which\
+            creates a new one)
+        :type progress: :class:`~dna.PullProgress`
+
+        :return: a dictionary containing the result of each pull as ``pulls``\
+            (in the same order as ``images``) and the final ``progress``
+        """
+        progress = progress or PullProgress()
+        futures = []
+        for spec in images:
+            spec = {"image": spec} if isinstance(spec, str) else spec
+            futures.append(self.pull(progress=progress, **spec))
+        return {
+            "pulls": [future.result() for future in futures],
+            "progress": progress.to_json(),
+        }
+
+    def shutdown(self):
+        """Wait for pulls in flight to finish, and stop accepting new ones"""
+        self.executor.shutdown(wait=True)
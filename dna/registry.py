@@ -0,0 +1,167 @@
+from threading import RLock
+
+
+class ServiceRegistry:
+    """An in-memory index of the services managed by a DNA instance
+
+    The registry is loaded once (see :meth:`~dna.ServiceRegistry.load`) and
+    then kept up to date in place by each :class:`~dna.DNA` operation, so that
+    looking up a service by name or by domain never has to go back to Docker
+    or to the database.
+
+    A service is *active* if its container is running on the instance's bridge
+    network. Only active services are listed by :attr:`dna.DNA.services`, but
+    inactive ones can still be looked up.
+
+    The registry is shared with the background helpers (such as the
+    :class:`~dna.EventWatcher`), so every change is made under a lock, and
+    iterating over it goes through a snapshot.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._services = {}
+        self._domains = {}
+        self._active = set()
+
+    def load(self, services, active=None):
+        """Replace the contents of the registry with ``services``
+
+        :param services: all the services known to the database
+        :type services: list[:class:`~dna.utils.Service`]
+        :param active: the names of the services whose containers are running\
+            (defaults to ``None``, which marks every service as active)
+        :type active: set[str]
+        """
+        by_name, domains, running = {}, {}, set()
+        for service in services:
+            by_name[service.name] = service
+            for domain in service.domains:
+                domains[domain.url] = service.name
+            if active is None or service.name in active:
+                running.add(service.name)
+        with self._lock:
+            self._services, self._domains, self._active = by_name, domains, running
+
+    def add(self, service, active=True):
+        """Add ``service`` to the registry, replacing any previous entry
+
+        :param service: the service to add
+        :type service: :class:`~dna.utils.Service`
+        :param active: whether the service's container is running (defaults\
+            to ``True``)
+        :type active: bool
+        """
+        with self._lock:
+            self._services[service.name] = service
+            for domain in service.domains:
+                self._domains[domain.url] = service.name
+            if active:
+                self._active.add(service.name)
+            else:
+                self._active.discard(service.name)
+
+    def remove(self, name):
+        """Remove the service called ``name`` and all of its domains
+
+        :param name: the name of the service to remove
+        :type name: str
+
+        :return: the removed :class:`~dna.utils.Service`, if it was registered\
+            (else ``None``)
+        """
+        with self._lock:
+            service = self._services.pop(name, None)
+            self._active.discard(name)
+            for url in [url for url, owner in self._domains.items() if owner == name]:
+                del self._domains[url]
+            return service
+
+    def activate(self, name):
+        """Mark the service called ``name`` as running
+
+        :param name: the name of the service
+        :type name: str
+        """
+        with self._lock:
+            if name in self._services:
+                self._active.add(name)
+
+    def deactivate(self, name):
+        """Mark the service called ``name`` as stopped
+
+        :param name: the name of the service
+        :type name: str
+        """
+        with self._lock:
+            self._active.discard(name)
+
+    def bind_domain(self, domain, name):
+        """Record that ``domain`` now points to the service called ``name``
+
+        :param domain: the url of the domain
+        :type domain: str
+        :param name: the name of the service
+        :type name: str
+        """
+        with self._lock:
+            self._domains[domain] = name
+
+    def unbind_domain(self, domain):
+        """Forget the service that ``domain`` points to, if any
+
+        :param domain: the url of the domain
+        :type domain: str
+        """
+        with self._lock:
+            self._domains.pop(domain, None)
+
+    def get(self, name):
+        """Get the service called ``name``
+
+        :param name: the name of the service
+        :type name: str
+
+        :return: the requested :class:`~dna.utils.Service`, if it is\
+            registered (else ``None``)
+        """
+        return self._services.get(name)
+
+    def get_by_domain(self, domain):
+        """Get the service that ``domain`` points to
+
+        :param domain: the url of the domain
+        :type domain: str
+
+        :return: the requested :class:`~dna.utils.Service`, if there is\
+            one (else ``None``)
+        """
+        with self._lock:
+            name = self._domains.get(domain)
+            return self._services.get(name) if name else None
+
+    def is_active(self, name):
+        """Return whether the service called ``name`` is running
+
+        :param name: the name of the service
+        :type name: str
+        """
+        return name in self._active
+
+    def active(self):
+        """Get all the running services
+
+        :return: a list of :class:`~dna.utils.Service` objects
+        """
+        with self._lock:
+            return [s for n, s in list(self._services.items()) if n in self._active]
+
+    def __contains__(self, name):
+        return name in self._services
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._services.values()))
+
+    def __len__(self):
+        return len(self._services)
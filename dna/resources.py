@@ -0,0 +1,363 @@
+import re, traceback
+from threading import RLock
+from dna.utils import metrics
+from dna.hosts import LOCAL
+
+#: The multipliers of the memory size suffixes Docker accepts
+UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_memory(memory):
+    """Turn a memory size into a number of bytes
+
+    :param memory: the size, either as a number of bytes or as a string with a\
+        Docker-style suffix, such as ``512m`` or ``2g``
+    :type memory: int or str
+
+    :return: the number of bytes, or ``None`` if ``memory`` is ``None``
+    """
+    if memory is None or isinstance(memory, int):
+        return memory
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([bkmgt]?)b?\s*", str(memory).lower())
+    if not match:
+        raise ValueError(f"Invalid memory size {memory!r}")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def _cpus(cpuset):
+    """Turn a cpuset string such as ``2,3`` into a list of CPU numbers"""
+    return [int(cpu) for cpu in cpuset.split(",")] if cpuset else []
+
+
+class ResourceAllocator:
+    """Sets aside CPUs and memory for each service on a DNA instance's hosts, so
+    that services don't compete for the same cores
+
+    Services declare their needs when they are deployed (see the ``resources``
+    of :meth:`~dna.DNA.run_deploy`):
+
+    * ``cores``: a number of CPUs to dedicate to the service. It is pinned to\
+      that many CPUs (its ``cpuset``) that no other service is pinned to, and\
+      keeps them across redeploys.
+    * ``cpu_shares``: the relative CPU weight of a service without dedicated\
+      cores. Such services (and services that declare nothing) run on the\
+      *shared* CPUs, the ones nobody is pinned to. Whenever the shared CPUs\
+      change, the running containers on them are updated in place.
+    * ``memory``: a memory limit, in bytes or with a suffix such as ``512m``.\
+      The container may not use more, nor swap.
+
+    Deploys that would overcommit the host are refused with a
+    :class:`RuntimeError`, before any container is touched: the memory limits
+    may add up to at most ``overcommit`` times the host's memory, each CPU may
+    be dedicated to at most ``int(overcommit)`` services, and at least one CPU
+    is always left shared. Allocations are saved in the database as
+    :class:`~dna.utils.Allocation` objects, and kept until the service is
+    deleted.
+
+    Each Docker host of the :class:`~dna.HostPool` has its own CPUs and memory,
+    which are read from Docker the first time they are needed.
+
+    :param dna: the DNA instance whose services to allocate resources to
+    :type dna: :class:`~dna.DNA`
+    :param cpus: the CPUs services may use on the local host (defaults to\
+        ``None``, which uses every CPU)
+    :type cpus: list[int]
+    :param memory: the bytes of memory services may use on the local host\
+        (defaults to ``None``, which uses all of it)
+    :type memory: int or str
+    :param overcommit: how far a host may be overcommitted (defaults to ``1.0``,\
+        which never shares a dedicated CPU nor promises more memory than there is)
+    :type overcommit: float
+    """
+
+    def __init__(self, dna, cpus=None, memory=None, overcommit=1.0):
+        if overcommit < 1:
+            raise ValueError(
+                f"The overcommit ratio must be at least 1, not {overcommit}"
+            )
+        self.dna = dna
+        self.overcommit = overcommit
+        self._overrides = {
+            "cpus": sorted(cpus) if cpus is not None else None,
+            "memory": parse_memory(memory),
+        }
+        self._capacity = {}
+        self._lock = RLock()
+
+    def capacity(self, host=LOCAL):
+        """Get the CPUs and memory services may use on ``host``
+
+        :param host: the name of the Docker host (defaults to ``local``)
+        :type host: str
+
+        :return: a dictionary containing the sorted list of ``cpus`` and the\
+            bytes of ``memory``
+        """
+        if host not in self._capacity:
+            resources = self.dna.hosts.get(host).docker.host_resources()
+            capacity = {
+                "cpus": list(range(resources["cpus"])),
+                "memory": resources["memory"],
+            }
+            if host == LOCAL:
+                capacity.update(
+                    {k: v for k, v in self._overrides.items() if v is not None}
+                )
+            self._capacity[host] = capacity
+        return self._capacity[host]
+
+    def _usage(self, allocations, host):
+        """Count how many of ``allocations`` are pinned to each CPU of ``host``"""
+        usage = {cpu: 0 for cpu in self.capacity(host)["cpus"]}
+        for allocation in allocations:
+            for cpu in _cpus(allocation.cpuset):
+                if cpu in usage:
+                    usage[cpu] += 1
+        return usage
+
+    def shared_cpus(self, allocations=None, host=LOCAL):
+        """Get the CPUs of ``host`` that no service is pinned to
+
+        :param allocations: the allocations on ``host`` to consider (defaults to\
+            ``None``, which loads them from the database)
+        :type allocations: list[:class:`~dna.utils.Allocation`]
+        :param host: the name of the Docker host (defaults to ``local``)
+        :type host: str
+
+        :return: a sorted list of CPU numbers
+        """
+        if allocations is None:
+            allocations = self.dna.db.get_allocations(host)
+        cpus = self.capacity(host)["cpus"]
+        usage = self._usage(allocations, host)
+        return [cpu for cpu in cpus if not usage[cpu]] or list(cpus)
+
+    def _pick_cpus(self, service, cores, allocations, previous, host):
+        """Choose ``cores`` CPUs of ``host`` to dedicate to ``service``, preferring\
+            the ones it already has, then the least used ones, and always leaving\
+            one shared"""
+        cpus = self.capacity(host)["cpus"]
+        usage = self._usage(allocations, host)
+        keep = (
+            set(_cpus(previous.cpuset)) if previous and previous.host == host else set()
+        )
+        shared = [cpu for cpu in cpus if not usage[cpu]]
+        reserve = ([cpu for cpu in shared if cpu not in keep] or shared)[-1:]
+        limit = int(self.overcommit)
+        candidates = sorted(
+            (cpu for cpu in cpus if usage[cpu] < limit and cpu not in reserve),
+            key=lambda cpu: (usage[cpu], cpu not in keep, cpu),
+        )
+        if len(candidates) < cores:
+            raise RuntimeError(
+                f"Can't dedicate {cores} CPUs to {service} on {host}: only {len(candidates)} "
+                f"of {len(cpus)} can be, as one is always left shared"
+            )
+        return ",".join(map(str, sorted(candidates[:cores])))
+
+    def _check_memory(self, service, memory, allocations, host):
+        """Refuse ``memory`` for ``service`` if the limits on ``host`` would add\
+            up to more than it can promise"""
+        committed = sum(allocation.memory or 0 for allocation in allocations) + memory
+        capacity = int(self.capacity(host)["memory"] * self.overcommit)
+        if committed > capacity:
+            raise RuntimeError(
+                f"Can't limit {service} to {memory} bytes of memory on {host}: {committed} "
+                f"bytes would be committed, over the {capacity} allowed"
+            )
+
+    def _check(self, service, cores, memory, host):
+        """Refuse what ``service`` declares if ``host`` can't fit it
+
+        :return: the :class:`~dna.utils.Allocation` the service had (if any),\
+            and the cpuset it would get
+        """
+        allocations = self.dna.db.get_allocations()
+        previous = next((a for a in allocations if a.service == service), None)
+        others = [a for a in allocations if a.service != service and a.host == host]
+        cpuset = (
+            self._pick_cpus(service, cores, others, previous, host) if cores else None
+        )
+        if memory:
+            self._check_memory(service, memory, others, host)
+        return previous, cpuset
+
+    def fits(self, service, cores=None, cpu_shares=None, memory=None, host=LOCAL):
+        """Return whether ``host`` can fit what ``service`` declares, without\
+            setting anything aside (see :meth:`~dna.ResourceAllocator.allocate`)"""
+        try:
+            with self._lock:
+                self._check(service, cores, parse_memory(memory), host)
+            return True
+        except RuntimeError:
+            return False
+
+    def allocate(self, service, cores=None, cpu_shares=None, memory=None, host=LOCAL):
+        """Set aside resources for ``service``, replacing what it had before
+
+        :param service: the name of the service
+        :type service: str
+        :param cores: the number of CPUs to dedicate to the service (defaults to\
+            ``None``, which runs it on the shared CPUs)
+        :type cores: int
+        :param cpu_shares: the relative CPU weight of the service (defaults to\
+            ``None``, which is Docker's default of ``1024``)
+        :type cpu_shares: int
+        :param memory: the memory limit (defaults to ``None``, which doesn't limit it)
+        :type memory: int or str
+        :param host: the name of the Docker host the service runs on (defaults\
+            to ``local``)
+        :type host: str
+
+        :return: the saved :class:`~dna.utils.Allocation`
+
+        :raises RuntimeError: if the host can't fit the allocation, in which case\
+            the service keeps what it had
+        """
+        memory = parse_memory(memory)
+        with self._lock:
+            try:
+                previous, cpuset = self._check(service, cores, memory, host)
+            except RuntimeError:
+                metrics.inc("dna_resource_allocation_total", result="refused")
+                raise
+            allocation = self.dna.db.save_allocation(
+                service, cores or 0, cpuset, cpu_shares, memory, host
+            )
+            metrics.inc("dna_resource_allocation_total", result="allocated")
+            if previous and previous.cpuset and previous.host != host:
+                self._update_shared(previous.host)
+            if (
+                previous.cpuset if previous and previous.host == host else None
+            ) != cpuset:
+                self._update_shared(host)
+            return allocation
+
+    def release(self, service):
+        """Give back the resources set aside for ``service``
+
+        :param service: the name of the service
+        :type service: str
+        """
+        with self._lock:
+            allocation = self.dna.db.get_allocation(service)
+            if not allocation:
+                return
+            self.dna.db.delete_allocation(service)
+            if allocation.cpuset:
+                self._update_shared(allocation.host)
+
+    def restore(self, service, allocation=None):
+        """Put back what ``service`` had set aside before, such as when the deploy\
+            it was allocated for failed
+
+        :param service: the name of the service
+        :type service: str
+        :param allocation: what the service had (see\
+            :meth:`~dna.utils.Allocation.to_json`) (defaults to ``None``, which\
+            releases what it has)
+        :type allocation: dict
+        """
+        with self._lock:
+            current = self.dna.db.get_allocation(service)
+            if (current.to_json() if current else None) == allocation:
+                return
+            if allocation is None:
+                self.release(service)
+                return
+            hosts = {
+                allocation["host"],
+                current.host if current else allocation["host"],
+            }
+            self.dna.db.save_allocation(**allocation)
+            metrics.inc("dna_resource_allocation_total", result="restored")
+            for host in hosts:
+                self._update_shared(host)
+
+    def _update_shared(self, host):
+        """Move every running container on ``host`` that isn't pinned onto its\
+            current shared CPUs"""
+        allocations = self.dna.db.get_allocations(host)
+        pinned = {a.service for a in allocations if a.cpuset}
+        cpuset = ",".join(map(str, self.shared_cpus(allocations, host)))
+        docker = self.dna.hosts.get(host).docker
+        for service in self.dna.services:
+            if service.name in pinned or self.dna.hosts.placement(service.name) != host:
+                continue
+            try:
+                docker.update_container(service.name, cpuset_cpus=cpuset)
+            except Exception:
+                self.dna.print(traceback.format_exc())
+
+    def docker_options(self, service):
+        """Get the options to run the container of ``service`` with
+
+        :param service: the name of the service
+        :type service: str
+
+        :return: a dictionary of ``cpuset_cpus``, ``cpu_shares``, ``mem_limit``,\
+            and ``memswap_limit``, as far as they apply; empty if no service on\
+            its host has resources set aside, so that DNA doesn't restrict\
+            anything by default
+        """
+        allocation = self.dna.db.get_allocation(service)
+        host = allocation.host if allocation else self.dna.hosts.placement(service)
+        allocations = self.dna.db.get_allocations(host)
+        if not allocations:
+            return {}
+        options = {
+            "cpuset_cpus": ",".join(map(str, self.shared_cpus(allocations, host)))
+        }
+        if allocation:
+            if allocation.cpuset:
+                options["cpuset_cpus"] = allocation.cpuset
+            if allocation.cpu_shares:
+                options["cpu_shares"] = allocation.cpu_shares
+            if allocation.memory:
+                options["mem_limit"] = options["memswap_limit"] = allocation.memory
+        return options
+
+    def matches(self, service, resources):
+        """Return whether ``service`` already has the ``resources`` it declares
+
+        :param service: the name of the service
+        :type service: str
+        :param resources: the declared ``cores``, ``cpu_shares``, and ``memory``
+        :type resources: dict
+
+        :return: whether allocating ``resources`` would change nothing
+        """
+        allocation = self.dna.db.get_allocation(service)
+        if not allocation:
+            return not resources
+        return (
+            (resources.get("cores") or 0) == allocation.cores
+            and resources.get("cpu_shares") == allocation.cpu_shares
+            and parse_memory(resources.get("memory")) == allocation.memory
+        )
+
+    def usage(self, host=LOCAL):
+        """Summarize what has been set aside on ``host``
+
+        :param host: the name of the Docker host (defaults to ``local``)
+        :type host: str
+
+        :return: a dictionary containing the ``allocations`` (see\
+            :meth:`~dna.utils.Allocation.to_json`), the ``shared_cpus``, the\
+            services pinned to each CPU (``cpus``), the bytes of memory\
+            ``committed`` and their ``capacity``, and the ``overcommit`` ratio
+        """
+        allocations = self.dna.db.get_allocations(host)
+        capacity = self.capacity(host)
+        cpus = {cpu: [] for cpu in capacity["cpus"]}
+        for allocation in allocations:
+            for cpu in _cpus(allocation.cpuset):
+                cpus.setdefault(cpu, []).append(allocation.service)
+        return {
+            "allocations": [allocation.to_json() for allocation in allocations],
+            "shared_cpus": self.shared_cpus(allocations, host),
+            "cpus": cpus,
+            "committed": sum(allocation.memory or 0 for allocation in allocations),
+            "capacity": int(capacity["memory"] * self.overcommit),
+            "overcommit": self.overcommit,
+        }
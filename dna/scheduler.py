@@ -0,0 +1,322 @@
+import itertools, time, traceback
+from collections import OrderedDict
+from threading import Condition, Event, Lock, Thread
+
+
+class DeployJob:
+    """Represents a deploy submitted to a :class:`~dna.DeployScheduler`
+
+    :param service: the name of the service being deployed
+    :type service: str
+    :param func: the function that performs the deploy
+    :type func: func
+    :param args: positional arguments to pass into ``func``
+    :type args: tuple
+    :param kwargs: keyword arguments to pass into ``func``
+    :type kwargs: dict
+    :param ref: an optional label for what is being deployed, such as a commit hash
+    :type ref: str
+
+    :ivar id: a number identifying this job within its scheduler
+    :ivar state: one of ``queued``, ``running``, ``done``, ``failed``, or\
+        ``superseded`` (dropped in favor of a newer job for the same service)
+    :ivar queued_at: the timestamp the job was submitted at
+    :ivar started_at: the timestamp the job started running at, if it has
+    :ivar finished_at: the timestamp the job finished (or was superseded) at, if it has
+    :ivar result: the return value of ``func``, if the job is ``done``
+    :ivar error: the exception raised by ``func``, if the job ``failed``
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    SUPERSEDED = "superseded"
+
+    _ids = itertools.count(1)
+
+    def __init__(self, service, func, args=(), kwargs={}, ref=None):
+        self.id = next(DeployJob._ids)
+        self.service = service
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.ref = ref
+
+        self.state = DeployJob.QUEUED
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._finished = Event()
+        self._callbacks = []
+        self._callbacks_lock = Lock()
+
+    def __repr__(self):
+        return f"DeployJob({self.id}, {self.service}, {self.state})"
+
+    def _start(self):
+        """Mark this job as running"""
+        self.state = DeployJob.RUNNING
+        self.started_at = time.time()
+
+    def _finish(self, state):
+        """Mark this job as finished in the given ``state``
+
+        The done callbacks aren't called here, so that this can be called while
+        holding the scheduler's lock; pass them to
+        :meth:`~dna.DeployJob._run_callbacks` once it is released.
+
+        :param state: the final state of the job
+        :type state: str
+
+        :return: the done callbacks that are now due
+        """
+        with self._callbacks_lock:
+            self.state = state
+            self.finished_at = time.time()
+            self._finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        return callbacks
+
+    def _run_callbacks(self, callbacks):
+        """Call each of the done ``callbacks`` returned by :meth:`~dna.DeployJob._finish`
+
+        :param callbacks: the callbacks to call
+        :type callbacks: list
+        """
+        for func in callbacks:
+            func(self)
+
+    def add_done_callback(self, func):
+        """Call ``func(job)`` once this job is finished, or now if it already is
+
+        :param func: the callback
+        :type func: func
+        """
+        with self._callbacks_lock:
+            if not self.is_finished():
+                self._callbacks.append(func)
+                return
+        func(self)
+
+    def is_finished(self):
+        """Return whether this job is ``done``, ``failed``, or ``superseded``"""
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Block until this job is finished
+
+        :param timeout: the maximum number of seconds to wait (defaults to\
+            ``None``, which waits forever)
+        :type timeout: float
+
+        :return: whether the job finished within ``timeout``
+        """
+        return self._finished.wait(timeout)
+
+    def to_json(self):
+        """Represent this job as a JSON dictionary
+
+        :return: a dictionary containing the id, service, ref, state,\
+            timestamps, and error (if any) of this job
+        """
+        return {
+            "id": self.id,
+            "service": self.service,
+            "ref": self.ref,
+            "state": self.state,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": repr(self.error) if self.error else None,
+        }
+
+
+class DeployScheduler:
+    """A bounded pool of workers that runs deploys for a DNA instance
+
+    :param dna: the DNA instance to deploy with
+    :type dna: :class:`~dna.DNA`
+    :param workers: the maximum number of deploys to run at once (defaults to ``4``)
+    :type workers: int
+    :param history: the number of finished jobs to remember (defaults to ``1000``)
+    :type history: int
+
+    The scheduler makes the following guarantees:
+
+    * At most ``workers`` deploys run at the same time.
+    * At most one deploy runs for any given service at a time.
+    * At most one deploy is queued for any given service at a time. Submitting
+      a new deploy for a service that already has one queued supersedes the
+      queued one (latest wins); a deploy that is already running is allowed
+      to finish.
+    * Services are deployed in the order they were first queued.
+    """
+
+    def __init__(self, dna, workers=4, history=1000):
+        self.dna = dna
+        self.history = history
+
+        self._cond = Condition()
+        self._order = []
+        self._pending = {}
+        self._running = set()
+        self._jobs = OrderedDict()
+        self._closed = False
+
+        self._workers = [
+            Thread(target=self._work, name=f"dna-deploy-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, service, func, *args, ref=None, **kwargs):
+        """Queue ``func(*args, **kwargs)`` as a deploy of ``service``
+
+        :param service: the name of the service being deployed
+        :type service: str
+        :param func: the function that performs the deploy, such as a function\
+            that builds an image and then calls :meth:`~dna.DNA.run_deploy`
+        :type func: func
+        :param ref: an optional label for what is being deployed, such as a\
+            commit hash
+        :type ref: str
+
+        :return: the queued :class:`~dna.DeployJob`
+        """
+        job = DeployJob(service, func, args, kwargs, ref=ref)
+        old, callbacks = None, []
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Cannot submit deploys to a closed scheduler")
+            old = self._pending.get(service)
+            if old:
+                callbacks = old._finish(DeployJob.SUPERSEDED)
+                self.dna.print(
+                    f"Deploy {old.id} of {service} was superseded by {job.id}."
+                )
+            else:
+                self._order.append(service)
+            self._pending[service] = job
+            self._jobs[job.id] = job
+            self._trim()
+            self._cond.notify()
+        if old:
+            old._run_callbacks(callbacks)
+        return job
+
+    def submit_deploy(self, service, image, port, ref=None, **docker_options):
+        """Queue a call to :meth:`~dna.DNA.run_deploy`
+
+        The image is held (see :meth:`~dna.ImageCollector.hold`) until the job\
+            finishes, so it isn't collected while the deploy is queued.
+
+        :return: the queued :class:`~dna.DeployJob`
+        """
+        self.dna.gc.hold(image)
+        try:
+            job = self.submit(
+                service,
+                self.dna.run_deploy,
+                service,
+                image,
+                port,
+                ref=ref,
+                **docker_options,
+            )
+        except Exception:
+            self.dna.gc.release(image)
+            raise
+        job.add_done_callback(lambda job: self.dna.gc.release(image))
+        return job
+
+    def get_job(self, id):
+        """Get the job with the given ``id``
+
+        :param id: the id of the job
+        :type id: int
+
+        :return: the requested :class:`~dna.DeployJob`, if it is remembered\
+            (else ``None``)
+        """
+        with self._cond:
+            return self._jobs.get(id)
+
+    def get_jobs(self, service=None):
+        """Get all the remembered jobs, oldest first
+
+        :param service: only return jobs for this service (defaults to ``None``,\
+            which returns jobs for all services)
+        :type service: str
+
+        :return: a list of :class:`~dna.DeployJob` objects
+        """
+        with self._cond:
+            return [
+                job
+                for job in self._jobs.values()
+                if service is None or job.service == service
+            ]
+
+    def shutdown(self, wait=True):
+        """Stop accepting deploys, and let the workers exit once the queue is empty
+
+        :param wait: flag to block until the workers have exited (defaults to ``True``)
+        :type wait: bool
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond ``history``"""
+        finished = [id for id, job in self._jobs.items() if job.is_finished()]
+        for id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[id]
+
+    def _next_job(self):
+        """Wait for a job whose service isn't already being deployed, and claim it
+
+        :return: the claimed :class:`~dna.DeployJob`, or ``None`` if the\
+            scheduler was shut down and there is nothing left to do
+        """
+        with self._cond:
+            while True:
+                for service in self._order:
+                    if service not in self._running:
+                        self._order.remove(service)
+                        self._running.add(service)
+                        job = self._pending.pop(service)
+                        job._start()
+                        return job
+                if self._closed and not self._order:
+                    return None
+                self._cond.wait()
+
+    def _work(self):
+        """Run jobs until the scheduler is shut down"""
+        while True:
+            job = self._next_job()
+            if not job:
+                return
+            self.dna.print(f"Starting deploy {job.id} of {job.service}...")
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+                state = DeployJob.DONE
+            except Exception as e:
+                job.error = e
+                state = DeployJob.FAILED
+                self.dna.print(traceback.format_exc())
+            with self._cond:
+                callbacks = job._finish(state)
+                self._running.discard(job.service)
+                self._trim()
+                self._cond.notify_all()
+            job._run_callbacks(callbacks)
+            self.dna.print(f"Deploy {job.id} of {job.service} is {state}.")
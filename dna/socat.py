@@ -1,7 +1,242 @@
-import time, os
+import time, os, socket, stat, json
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
-from threading import Thread
-from dna.utils import sh
+from threading import Lock, RLock
+from dna.utils import HashRing, PathWatcher
+import dna.proxy as proxy
+
+
+class ForkEngine:
+    """The ``socat`` engine, which runs one ``socat`` process per binding in the
+    sidecar, and forks it for every connection
+
+    :param shard: the sidecar this engine binds sockets in
+    :type shard: :class:`~dna.socat.SocatShard`
+    """
+
+    #: The name of the engine
+    NAME = "socat"
+
+    #: The image the sidecar runs
+    IMAGE = "socat:latest"
+
+    #: The Dockerfile of the sidecar image
+    DOCKERFILE = """FROM alpine:edge\nARG VERSION=1.7.3.4-r1\nRUN apk --no-cache add socat=${VERSION}\n"""
+
+    #: Whether a bind returns once the socket is live
+    SYNC = False
+
+    #: The maximum number of ``socat`` processes to start in one exec
+    BATCH = 50
+
+    def __init__(self, shard):
+        self.shard = shard
+
+    def run_options(self):
+        """Get the options to run the sidecar container with
+
+        :return: a dictionary of options for :meth:`~dna.utils.Docker.run_image`
+        """
+        return {"tty": True}
+
+    def bind_many(self, bindings):
+        """Start proxying ``service.sock`` to ``port`` in the ``service`` container\
+            for each ``(service, port)`` in ``bindings``, starting up to ``BATCH``\
+            ``socat`` processes per exec
+
+        :param bindings: the services and ports to bind
+        :type bindings: list[tuple[str, str]]
+
+        :return: a dictionary mapping each service to the pid of its ``socat`` process
+        """
+        pids = {}
+        for i in range(0, len(bindings), ForkEngine.BATCH):
+            script = "; ".join(
+                f"nohup {SocatHelper.SOCAT_CMD.format(service=service, port=port)}"
+                f" >/dev/null 2>&1 & echo {service} $!"
+                for service, port in bindings[i : i + ForkEngine.BATCH]
+            )
+            out = self.shard.docker.exec_command(
+                self.shard.container, ["/bin/sh", "-c", script]
+            )
+            for line in out.output.decode("utf-8").splitlines():
+                service, pid = line.split()
+                pids[service] = int(pid)
+        return pids
+
+    def bind(self, service, port):
+        """Start proxying ``service.sock`` to ``port`` in the ``service`` container
+
+        :return: the pid of the ``socat`` process
+        """
+        return self.bind_many([(service, port)]).get(service)
+
+    def unbind(self, service, port, pid=None):
+        """Stop proxying ``service.sock`` to ``port`` in the ``service`` container
+
+        With a ``pid``, this sends a single signal (after checking that the pid\
+            still belongs to the service's ``socat`` process, in case it was reused).\
+            Otherwise, the process is found by its command line.
+        """
+        if pid:
+            script = (
+                f"case \"$(tr '\\0' ' ' < /proc/{pid}/cmdline)\" in"
+                f" *'/socks/{service}.sock,'*) kill {pid};; esac"
+            )
+        else:
+            cmd = SocatHelper.SOCAT_CMD.format(service=service, port=port)
+            script = f'kill $(pgrep -f "{cmd}")'
+        self.shard.docker.exec_command(self.shard.container, ["/bin/sh", "-c", script])
+
+
+class MuxEngine:
+    """The ``mux`` engine, which runs a single event-driven proxy process (see
+    :mod:`dna.proxy`) in the sidecar for every binding
+
+    Its routing table is updated at runtime through a control socket in the
+    mounted socket folder, so binding and unbinding don't go through Docker at
+    all, and a bind returns once the socket is live.
+
+    :param shard: the sidecar this engine binds sockets in
+    :type shard: :class:`~dna.socat.SocatShard`
+    :param timeout: the number of seconds to wait for the proxy to answer\
+        (defaults to ``10``)
+    :type timeout: float
+    """
+
+    NAME = "mux"
+    IMAGE = "dna-mux:latest"
+    DOCKERFILE = (
+        """FROM python:3.9-alpine\nCMD ["python", "/dna/proxy.py", "/socks"]\n"""
+    )
+    SYNC = True
+
+    def __init__(self, shard, timeout=10):
+        self.shard = shard
+        self.timeout = timeout
+
+    def run_options(self):
+        """Get the options to run the sidecar container with, which mount the\
+            proxy script into it
+
+        :return: a dictionary of options for :meth:`~dna.utils.Docker.run_image`
+        """
+        script = os.path.abspath(proxy.__file__)
+        return {"mounts": [self.shard.docker.make_mount(script, "/dna/proxy.py")]}
+
+    def request_many(self, requests):
+        """Send requests to the proxy's control socket over one connection,\
+            waiting for it to come up if needed
+
+        :param requests: the requests (see :mod:`dna.proxy`)
+        :type requests: list[dict]
+
+        :return: the decoded replies
+        """
+        path = f"{self.shard.socks}/{proxy.CONTROL}"
+        payload = "".join(json.dumps(request) + "\n" for request in requests)
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(self.timeout)
+                    sock.connect(path)
+                    sock.sendall(payload.encode("utf-8"))
+                    f = sock.makefile()
+                    replies = [json.loads(f.readline()) for _ in requests]
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        for request, reply in zip(requests, replies):
+            if not reply["ok"]:
+                raise RuntimeError(f"The proxy rejected {request}: {reply['error']}")
+        return replies
+
+    def request(self, **request):
+        """Send one request to the proxy's control socket (see\
+            :meth:`~dna.socat.MuxEngine.request_many`)
+
+        :param request: the request (see :mod:`dna.proxy`)
+        :type request: kwargs
+
+        :return: the decoded reply
+        """
+        return self.request_many([request])[0]
+
+    def bind_many(self, bindings):
+        """Start proxying ``service.sock`` to ``port`` in the ``service`` container\
+            for each ``(service, port)`` in ``bindings``, over one connection
+
+        :param bindings: the services and ports to bind
+        :type bindings: list[tuple[str, str]]
+
+        :return: a dictionary mapping each service to ``None``, since every\
+            binding is served by the same process
+        """
+        self.request_many(
+            [
+                {"op": "bind", "name": service, "host": service, "port": port}
+                for service, port in bindings
+            ]
+        )
+        return {service: None for service, _ in bindings}
+
+    def bind(self, service, port):
+        """Start proxying ``service.sock`` to ``port`` in the ``service`` container
+
+        :return: ``None``, since every binding is served by the same process
+        """
+        self.request(op="bind", name=service, host=service, port=port)
+
+    def unbind(self, service, port, pid=None):
+        """Stop proxying ``service.sock`` to ``port`` in the ``service`` container"""
+        self.request(op="unbind", name=service)
+
+
+class SocatShard:
+    """One sidecar container of a :class:`~dna.SocatHelper`, along with the
+    socket folder mounted into it (as ``/socks``) and the engine that binds
+    sockets in it
+
+    :param helper: the helper this shard belongs to
+    :type helper: :class:`~dna.SocatHelper`
+    :param index: the position of this shard on the helper's hash ring
+    :type index: int
+    :param container: the name of the sidecar container
+    :type container: str
+    :param socks: the folder the sidecar creates sockets in
+    :type socks: str
+    :param engine: the name of the engine (see :attr:`~dna.SocatHelper.ENGINES`)
+    :type engine: str
+    """
+
+    def __init__(self, helper, index, container, socks, engine):
+        self.helper = helper
+        self.docker = helper.docker
+        self.index = index
+        self.container = container
+        self.socks = socks
+        os.makedirs(socks, exist_ok=True)
+        self.engine = SocatHelper.ENGINES[engine](self)
+        self.watcher = PathWatcher(socks)
+        self._started_at = None
+
+    def started_at(self):
+        """Get the time the sidecar container last started, which identifies the\
+            run of the sidecar that its current bindings belong to
+
+        :return: the timestamp, as reported by Docker
+        """
+        if self._started_at is None:
+            self._started_at = self.docker.container_started_at(self.container)
+        return self._started_at
+
+    def forget(self):
+        """Forget when the sidecar container started, such as after it restarts"""
+        self._started_at = None
 
 
 class SocatHelper:
@@ -16,104 +251,570 @@ class SocatHelper:
 
     :param dna: the DNA instance
     :type dna: :class:`~dna.DNA`
-
-    The ``socat`` container for a DNA instance ``inst`` is called ``inst-socat``.
-    The bridge network for a DNA instance ``inst`` is called ``inst``.
+    :param engine: the name of the engine that runs the proxies in the sidecar:\
+        either ``socat`` (one ``socat`` process per service, which forks for\
+        every connection) or ``mux`` (one event-driven process for every service,\
+        see :class:`~dna.socat.MuxEngine`) (defaults to ``socat``)
+    :type engine: str
+    :param timeout: the default number of seconds to wait for a socket to appear\
+        after binding it (defaults to ``30``)
+    :type timeout: float
+    :param workers: the maximum number of threads that finish binds (setting\
+        permissions and calling callbacks) at once (defaults to ``4``)
+    :type workers: int
+    :param shards: the number of sidecar containers to spread the sockets over\
+        (defaults to ``1``)
+    :type shards: int
+    :param pins: a dictionary mapping services to the index of the shard they\
+        should be bound on, regardless of the hash ring (defaults to ``None``)
+    :type pins: dict
+
+    Sockets are detected as soon as they are created, using a
+    :class:`~dna.utils.PathWatcher` on each socket folder, rather than a
+    thread per bind. Binding, unbinding, and rebinding the same service are
+    serialized (such as a deploy and the :class:`~dna.EventWatcher` binding it
+    at once), so only one listener is ever started for it.
+
+    The ``socat`` container for a DNA instance ``inst`` is called ``inst-socat``
+    (or ``inst-mux`` with the ``mux`` engine). The bridge network for a DNA
+    instance ``inst`` is called ``inst``.
+
+    With several ``shards``, the sidecars are called ``inst-socat-0``,
+    ``inst-socat-1``, and so on, and each creates its sockets in its own
+    subfolder (``shard-0``, ``shard-1``, ...) of the socket folder. Services are
+    assigned to shards by a :class:`~dna.utils.HashRing`, so changing the number
+    of shards only moves about one in ``shards`` sockets. Every socket is linked
+    back into the socket folder, so nginx always proxies to ``service.sock``
+    whichever shard serves it.
+
+    Bindings are persisted in the DNA database along with the pid of their
+    process, their shard, and the time its sidecar container started, so that
+    a new DNA process can adopt the bindings that are still live instead of
+    binding everything again.
+
+    :ivar bindings: a dictionary mapping each bound service to its port
+    :ivar pids: a dictionary mapping each bound service to the pid of its process\
+        in the sidecar (``None`` with the ``mux`` engine)
+    :ivar placement: a dictionary mapping each bound service to the index of\
+        the shard serving it
+    :ivar shards: the :class:`~dna.socat.SocatShard` objects, in order
+    :ivar containers: a dictionary mapping the name of each sidecar container\
+        to its shard
     """
 
     #: The command to bind ``port`` in the ``service`` container to a socket named ``service.sock``
-    SOCAT_CMD = "socat unix-listen:/socks/{service}.sock,fork,reuseaddr tcp-connect:{service}:{port}"
+    SOCAT_CMD = "socat unix-listen:/socks/{service}.sock,fork,reuseaddr,perm=0666 tcp-connect:{service}:{port}"
 
-    #: The Dockerfile for ``socat```
-    DOCKERFILE = """FROM alpine:edge\nARG VERSION=1.7.3.4-r1\nRUN apk --no-cache add socat=${VERSION}\n"""
+    #: The available engines, by name
+    ENGINES = {ForkEngine.NAME: ForkEngine, MuxEngine.NAME: MuxEngine}
 
-    def __init__(self, dna):
+    def __init__(self, dna, engine="socat", timeout=30, workers=4, shards=1, pins=None):
+        if engine not in SocatHelper.ENGINES:
+            raise ValueError(f"Unknown socat engine {engine}")
+        if shards < 1:
+            raise ValueError("There must be at least one socat shard")
         self.dna = dna
+        self.engine = SocatHelper.ENGINES[engine]
         self.service = dna.service_name
         self.bridge = self.service
-        self.container = f"{self.service}-socat"
         self.docker = dna.docker
         self.path = dna.path
         self.socks = dna.path + "/socks"
+        self.bindings = {}
+        self.pids = {}
+        self.placement = {}
+        self.timeout = timeout
+        self._locks = {}
+        self._locks_lock = Lock()
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="dna-socat"
+        )
+
+        if shards == 1:
+            self.shards = [
+                SocatShard(self, 0, f"{self.service}-{engine}", self.socks, engine)
+            ]
+        else:
+            self.shards = [
+                SocatShard(
+                    self,
+                    i,
+                    f"{self.service}-{engine}-{i}",
+                    f"{self.socks}/shard-{i}",
+                    engine,
+                )
+                for i in range(shards)
+            ]
+        self.containers = {shard.container: shard for shard in self.shards}
+        self.ring = HashRing(range(shards))
+        self.pins = {}
+        for service, index in (pins or {}).items():
+            self._check_shard(index)
+            self.pins[service] = index
 
         self._setup()
 
-    def _fix_permissions(self, service, port):
-        """Wait for the socket binding to complete, then make the
-        socket visible to nginx
+    @property
+    def sharded(self):
+        """Whether sockets are spread over several sidecars"""
+        return len(self.shards) > 1
+
+    def _check_shard(self, index):
+        if not 0 <= index < len(self.shards):
+            raise ValueError(f"There is no socat shard {index}")
+
+    def _lock(self, service):
+        """Get the lock that serializes changes to the binding of ``service``"""
+        with self._locks_lock:
+            return self._locks.setdefault(service, RLock())
+
+    def _sock(self, service):
+        """Get the path nginx proxies to for ``service``"""
+        return f"{self.socks}/{service}.sock"
+
+    def shard_for(self, service):
+        """Get the shard that ``service`` should be bound on: the one it is\
+            pinned to, if any, or else the one the hash ring assigns it
 
         :param service: the name of the service
         :type service: str
-        :param port: the port to be bound
-        :type port: str
+
+        :return: a :class:`~dna.socat.SocatShard`
         """
-        path = f"{self.socks}/{service}.sock"
-        while not os.path.exists(path):
-            time.sleep(1)
+        index = self.pins.get(service)
+        return self.shards[self.ring.get(service) if index is None else index]
 
-        out = sh("chmod", "666", path, stream=False)
-        self.dna.print(out)
+    def pin(self, service, shard=None):
+        """Pin ``service`` to a shard, such as to keep a noisy service away from\
+            quiet ones, moving its binding if needed
 
-        self.dna.print(f"Bound {service}:{port} to {service}.sock.")
+        Pins only last as long as this helper; to keep them when DNA restarts,\
+            pass them to :class:`~dna.DNA` as ``socat_pins``.
 
-    def bind(self, service, port):
+        :param service: the name of the service
+        :type service: str
+        :param shard: the index of the shard to pin it to (defaults to ``None``,\
+            which unpins it, returning it to its place on the hash ring)
+        :type shard: int
+
+        :return: a future for the moved binding (see :meth:`~dna.SocatHelper.bind`),\
+            or ``None`` if the service isn't bound
+        """
+        if shard is None:
+            self.pins.pop(service, None)
+        else:
+            self._check_shard(shard)
+            self.pins[service] = shard
+        if service in self.bindings:
+            return self.bind(service, self.bindings[service])
+        return None
+
+    def _record(self, shard, bindings):
+        """Remember new bindings on ``shard``, in memory and in the database
+
+        :param shard: the shard serving the bindings
+        :type shard: :class:`~dna.socat.SocatShard`
+        :param bindings: a dictionary mapping each newly bound service to a\
+            ``(port, pid)`` tuple
+        :type bindings: dict
+        """
+        for service, (port, pid) in bindings.items():
+            self.bindings[service] = port
+            self.pids[service] = pid
+            self.placement[service] = shard.index
+        self.dna.db.save_bindings(
+            [(service, port, pid) for service, (port, pid) in bindings.items()],
+            self.engine.NAME,
+            shard.started_at(),
+            shard=shard.index,
+        )
+
+    def _is_live(self, service, port):
+        """Return whether ``service`` is already bound to ``port`` on the right\
+            shard and its socket exists"""
+        return (
+            self.bindings.get(service) == port
+            and self.placement.get(service) == self.shard_for(service).index
+            and os.path.exists(self._sock(service))
+        )
+
+    def _track(self, shard, service, port, callback=None, timeout=None):
+        """Get a future that resolves once the socket of a new binding is live
+
+        :return: a :class:`~concurrent.futures.Future` (see :meth:`~dna.SocatHelper.bind`)
+        """
+        future = Future()
+        if self.engine.SYNC:
+            ready = Future()
+            ready.set_result(f"{shard.socks}/{service}.sock")
+            self._finish_bind(shard, service, port, ready, future, callback)
+            return future
+
+        timeout = self.timeout if timeout is None else timeout
+        ready = shard.watcher.wait_for(f"{service}.sock", timeout=timeout)
+        ready.add_done_callback(
+            lambda ready: self.pool.submit(
+                self._finish_bind, shard, service, port, ready, future, callback
+            )
+        )
+        return future
+
+    def _link(self, shard, service):
+        """Atomically point ``service.sock`` in the socket folder to the socket\
+            ``shard`` created for it
+
+        :return: the path of the link
+        """
+        link = self._sock(service)
+        tmp = f"{self.socks}/.{service}.sock.tmp"
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.symlink(os.path.relpath(f"{shard.socks}/{service}.sock", self.socks), tmp)
+        os.replace(tmp, link)
+        return link
+
+    def _finish_bind(self, shard, service, port, ready, future, callback=None):
+        """Once the socket exists, make sure it is visible to nginx, then resolve\
+            ``future``
+
+        Both engines create sockets with the right permissions, so this only\
+            changes them if something else created the socket. With several\
+            shards, this also links the socket into the socket folder.
+
+        :param shard: the shard serving the binding
+        :type shard: :class:`~dna.socat.SocatShard`
+        :param service: the name of the service
+        :type service: str
+        :param port: the port that was bound
+        :type port: str
+        :param ready: the future that resolves once the socket exists
+        :type ready: :class:`~concurrent.futures.Future`
+        :param future: the future returned by :meth:`~dna.SocatHelper.bind`
+        :type future: :class:`~concurrent.futures.Future`
+        :param callback: an optional function to call once the socket is visible
+        :type callback: func
+        """
+        where = f" on shard {shard.index}" if self.sharded else ""
+        try:
+            path = ready.result()
+            if stat.S_IMODE(os.stat(path).st_mode) & 0o666 != 0o666:
+                os.chmod(path, 0o666)
+            if shard.socks != self.socks:
+                path = self._link(shard, service)
+            self.dna.print(f"Bound {service}:{port} to {service}.sock{where}.")
+            if callback:
+                callback()
+        except Exception as e:
+            self.dna.print(
+                f"Failed to bind {service}:{port} to {service}.sock{where}: {e!r}"
+            )
+            future.set_exception(e)
+            return
+        future.set_result(path)
+
+    def _retire(self, shard, service, port, pid):
+        """Stop the binding of ``service`` on a shard it has moved away from,\
+            once the new one is live"""
+        try:
+            shard.engine.unbind(service, port, pid)
+        except Exception as e:
+            self.dna.print(f"Couldn't unbind {service} from shard {shard.index}: {e!r}")
+
+    def bind(self, service, port, callback=None, timeout=None):
         """Bind ``port`` inside the ``service`` container to a socket called ``service.sock``
 
         :param service: the name of the service
         :type service: str
         :param port: the port to be bound
         :type port: str
+        :param callback: an optional function to call (from another thread, unless\
+            the engine binds synchronously) once the socket is visible to nginx
+        :type callback: func
+        :param timeout: the maximum number of seconds to wait for the socket to\
+            appear (defaults to ``None``, which uses ``timeout``)
+        :type timeout: float
+
+        :return: a :class:`~concurrent.futures.Future` that resolves to the path\
+            of the socket once it is live, or fails if it doesn't appear in time
+
+        If ``service`` is already bound to ``port``, it isn't bound again (since\
+            the container's address is resolved on every connection). If it is\
+            bound to another port, it is unbound first. If it is bound on another\
+            shard, the old binding keeps serving until the new one is live.
         """
-        self.docker.exec_command(
-            self.container,
-            f"/bin/sh -c '{SocatHelper.SOCAT_CMD.format(service=service, port = port)}'",
-            detach=True,
-        )
+        with self._lock(service):
+            return self._bind(service, port, callback, timeout)
+
+    def _bind(self, service, port, callback=None, timeout=None):
+        """Bind ``service`` while holding its lock (see :meth:`~dna.SocatHelper.bind`)"""
+        if self._is_live(service, port):
+            future = Future()
+            future.set_result(self._sock(service))
+            if callback:
+                callback()
+            return future
+
+        shard = self.shard_for(service)
+        old = self.placement.get(service)
+        moving = service in self.bindings and old is not None and old != shard.index
+        if moving:
+            retired = (
+                self.shards[old],
+                service,
+                self.bindings[service],
+                self.pids.get(service),
+            )
+        elif service in self.bindings:
+            self.unbind(service, self.bindings[service])
 
-        Thread(
-            target=self._fix_permissions,
-            kwargs={
-                "service": service,
-                "port": port,
-            },
-        ).start()
+        pid = shard.engine.bind(service, port)
+        self._record(shard, {service: (port, pid)})
+        future = self._track(shard, service, port, callback, timeout)
+        if moving:
+            future.add_done_callback(lambda _: self._retire(*retired))
+        return future
 
     def unbind(self, service, port):
         """Unbind ``port`` inside the ``service`` container from ``service.sock``
 
-        The ``port`` is required here to determine which ``socat`` process to terminate
-        on the ``socat`` container for this DNA instance.
+        The ``port`` is only needed to find the ``socat`` process of a binding\
+        this instance doesn't know the pid of.
 
         :param service: the name of the service
         :type service: str
         :param port: the port to be unbound
         :type port: str
         """
-        pid = self.docker.exec_command(
-            self.container,
-            f"/bin/sh -c 'pgrep -f \"{SocatHelper.SOCAT_CMD.format(service=service, port = port)}\"'",
-        ).output.decode("utf-8")[:-1]
-        self.docker.exec_command(self.container, f"/bin/sh -c 'kill {pid}'")
+        with self._lock(service):
+            index = self.placement.pop(service, None)
+            shard = self.shards[index] if index is not None else self.shard_for(service)
+            shard.engine.unbind(service, port, self.pids.pop(service, None))
+            self.bindings.pop(service, None)
+            self.dna.db.delete_binding(service)
+            if shard.socks != self.socks and os.path.islink(self._sock(service)):
+                os.remove(self._sock(service))
 
         self.dna.print(f"Unbound {service}:{port} from {service}.sock.")
 
+    def check(self, service, timeout=2):
+        """Check both the listener behind ``service.sock`` and the ``service``\
+            container behind the listener
+
+        Sends a minimal HTTP request through the socket. If the socket refuses\
+            the connection, its listener is gone. Otherwise, the listener only\
+            answers once it has connected to the container, and closes the\
+            connection if the container port isn't accepting connections, so\
+            any response at all means the service is up.
+
+        :param service: the name of the service
+        :type service: str
+        :param timeout: the maximum number of seconds to wait for a response\
+            (defaults to ``2``)
+        :type timeout: float
+
+        :return: a tuple of whether the listener accepted the connection, and\
+            the number of seconds it took to get a response (``None`` if there\
+            was no response)
+        """
+        start = time.time()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            try:
+                sock.connect(self._sock(service))
+            except OSError:
+                return False, None
+            try:
+                sock.sendall(b"HEAD / HTTP/1.0\r\n\r\n")
+                if not sock.recv(1):
+                    return True, None
+            except OSError:
+                return True, None
+        return True, time.time() - start
+
+    def probe(self, service, timeout=2):
+        """Check whether the ``service`` container answers through ``service.sock``
+        (see :meth:`~dna.SocatHelper.check`)
+
+        :param service: the name of the service
+        :type service: str
+        :param timeout: the maximum number of seconds to wait for a response\
+            (defaults to ``2``)
+        :type timeout: float
+
+        :return: the number of seconds it took to get a response, or ``None``\
+            if there was no response
+        """
+        return self.check(service, timeout)[1]
+
+    def rebind(self, service, port, timeout=None):
+        """Bind ``service`` again, even if its socket exists, such as when the\
+            listener behind the socket died
+
+        :param service: the name of the service
+        :type service: str
+        :param port: the port to be bound
+        :type port: str
+        :param timeout: the maximum number of seconds to wait for the socket to\
+            appear (defaults to ``None``, which uses ``timeout``)
+        :type timeout: float
+
+        :return: a future (see :meth:`~dna.SocatHelper.bind`)
+        """
+        with self._lock(service):
+            if service in self.bindings:
+                shard = self.shards[
+                    self.placement.get(service, self.shard_for(service).index)
+                ]
+                self.unbind(service, self.bindings[service])
+                # a listener that was killed may have left its socket behind
+                stale = f"{shard.socks}/{service}.sock"
+                if os.path.lexists(stale):
+                    os.remove(stale)
+            return self._bind(service, port, timeout=timeout)
+
+    def wait_ready(self, service, timeout=60, interval=0.5):
+        """Wait until :meth:`~dna.SocatHelper.probe` succeeds for ``service``
+
+        :param service: the name of the service
+        :type service: str
+        :param timeout: the maximum number of seconds to wait (defaults to ``60``)
+        :type timeout: float
+        :param interval: the number of seconds between probes (defaults to ``0.5``)
+        :type interval: float
+
+        :return: whether the service became ready within ``timeout``
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.probe(service) is not None:
+                return True
+            time.sleep(interval)
+        return False
+
+    def reset(self, shard=None):
+        """Forget the bindings of a shard and remove their socket files
+
+        Use this when a sidecar container has lost its processes (for example,
+        because it restarted), so that the sockets can be bound again.
+
+        :param shard: the shard to reset (defaults to ``None``, which resets\
+            every shard)
+        :type shard: :class:`~dna.socat.SocatShard`
+
+        :return: the names of the services that were bound on the shard
+        """
+        shards = self.shards if shard is None else [shard]
+        indices = {shard.index for shard in shards}
+        services = [s for s, index in self.placement.items() if index in indices]
+        for service in services:
+            self.bindings.pop(service, None)
+            self.pids.pop(service, None)
+            self.placement.pop(service, None)
+        self.dna.db.clear_bindings(None if shard is None else shard.index)
+
+        for shard in shards:
+            shard.forget()
+            for sock in os.listdir(shard.socks):
+                if sock.endswith(".sock"):
+                    os.remove(f"{shard.socks}/{sock}")
+            if shard.socks != self.socks:
+                prefix = os.path.basename(shard.socks) + "/"
+                for sock in os.listdir(self.socks):
+                    link = f"{self.socks}/{sock}"
+                    if os.path.islink(link) and os.readlink(link).startswith(prefix):
+                        os.remove(link)
+        return services
+
     def bind_all(self, services):
-        """Bind all the ``services`` to their respective ports
+        """Bind all the ``services`` to their respective ports, at once
+
+        Bindings recorded in the database that are still live (made on the same\
+            shard during the current run of its sidecar, to the same port, and\
+            whose socket still exists) are adopted rather than bound again. The\
+            rest are started together, one batch per shard (see\
+            :meth:`~dna.socat.ForkEngine.bind_many`).
 
         :param services: the services to bind
         :type services: list[:class:`~dna.utils.Service`]
+
+        :return: a list of futures, one per service (see :meth:`~dna.SocatHelper.bind`)
         """
+        recorded = {b.service: b for b in self.dna.db.get_bindings()}
+        futures, pending = {}, {}
         for service in services:
-            self.bind(service.name, service.port)
+            name, port = service.name, service.port
+            shard = self.shard_for(name)
+            b = recorded.get(name)
+            old = (
+                self.shards[b.shard or 0]
+                if b and (b.shard or 0) < len(self.shards)
+                else None
+            )
+            if (
+                b
+                and old
+                and b.engine == self.engine.NAME
+                and b.started_at == old.started_at()
+            ):
+                if old is shard and b.port == port and os.path.exists(self._sock(name)):
+                    self.bindings[name], self.pids[name], self.placement[name] = (
+                        port,
+                        b.pid,
+                        shard.index,
+                    )
+                    futures[name] = Future()
+                    futures[name].set_result(self._sock(name))
+                    continue
+                old.engine.unbind(name, b.port, b.pid)
+            elif self._is_live(name, port):
+                continue
+            pending.setdefault(shard.index, []).append((name, port))
+
+        if pending:
+            count = sum(len(bindings) for bindings in pending.values())
+            self.dna.print(
+                f"Binding {count} services ({len(futures)} already bound)..."
+            )
+        for index, bindings in pending.items():
+            shard = self.shards[index]
+            pids = shard.engine.bind_many(bindings)
+            self._record(
+                shard, {name: (port, pids.get(name)) for name, port in bindings}
+            )
+            for name, port in bindings:
+                futures[name] = self._track(shard, name, port)
+        return [
+            futures.get(service.name) or self.bind(service.name, service.port)
+            for service in services
+        ]
+
+    def _retired_containers(self, engine):
+        """Get the sidecar containers left over from a different number of shards
+
+        :param engine: the name of the engine
+        :type engine: str
+
+        :return: a list of container names
+        """
+        prefix = f"{self.service}-{engine}"
+        retired = (
+            [prefix] if self.sharded and self.docker.container_exists(prefix) else []
+        )
+        i = len(self.shards) if self.sharded else 0
+        while self.docker.container_exists(f"{prefix}-{i}"):
+            retired.append(f"{prefix}-{i}")
+            i += 1
+        return retired
 
     def _setup(self, force=False):
-        """Set up the ``socat`` container for this DNA instance, if needed
+        """Set up the ``socat`` containers for this DNA instance, if needed
 
-        If the bridge network doesn't exist, create it. If the ``socat``
+        If the bridge network doesn't exist, create it. If the engine's
         image doesn't exist or we want to ``force`` it to rebuild, build it.
-        If the image was rebuilt, kill and remove the ``socat`` container
-        for this DNA instance. Lastly, if the ``socat`` container for this
-        DNA instance doesn't exist, create and start it.
+        If the image was rebuilt, kill and remove the ``socat`` containers
+        for this DNA instance. Sidecars left over from a different number of
+        shards are removed too. Lastly, if the ``socat`` container of a shard
+        doesn't exist, create and start it.
 
         :param force: flag to force the ``socat`` image to rebuild (defaults\
             to ``False``)
@@ -122,32 +823,46 @@ class SocatHelper:
         self.dna.print("Setting up socat, if needed...")
 
         docker = self.docker
-        mounts = [docker.make_mount(self.socks, "/socks")]
 
         if not docker.network_exists(self.bridge):
             self.dna.print(f"Creating {self.bridge} bridge network...")
             docker.create_network(self.bridge)
 
-        if force or not docker.image_exists("socat:latest"):
-            self.dna.print("Building socat image...")
+        image = self.engine.IMAGE
+        if force or not docker.image_exists(image):
+            self.dna.print(f"Building {image} image...")
 
-            f = BytesIO(SocatHelper.DOCKERFILE.encode("utf-8"))
+            f = BytesIO(self.engine.DOCKERFILE.encode("utf-8"))
 
-            for line in docker.build_image_stream(
-                path=self.path, fileobj=f, tag="socat:latest"
-            ):
+            for line in docker.build_image_stream(path=self.path, fileobj=f, tag=image):
                 self.dna.print(line.get("stream", ""))
-            docker.wipe_container(self.container)
-
-        if not docker.container_exists(self.container):
-            self.dna.print(f"Starting socat container at {self.container}...")
-            con = docker.run_image(
-                "socat",
-                self.container,
-                tty=True,
+            for shard in self.shards:
+                docker.wipe_container(shard.container)
+
+        for container in self._retired_containers(self.engine.NAME):
+            self.dna.print(f"Removing retired socat container {container}...")
+            docker.wipe_container(container)
+        if not self.sharded:
+            # links left over from when the sockets were sharded
+            for sock in os.listdir(self.socks):
+                if os.path.islink(f"{self.socks}/{sock}"):
+                    os.remove(f"{self.socks}/{sock}")
+
+        for shard in self.shards:
+            if docker.container_exists(shard.container):
+                continue
+            self.dna.print(f"Starting socat container at {shard.container}...")
+            options = shard.engine.run_options()
+            mounts = [docker.make_mount(shard.socks, "/socks")] + options.pop(
+                "mounts", []
+            )
+            docker.run_image(
+                image,
+                shard.container,
                 detach=True,
                 network=self.bridge,
                 mounts=mounts,
+                **options,
             )
 
         self.dna.print("Done! Socat setup complete.")
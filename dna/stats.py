@@ -0,0 +1,271 @@
+import time, traceback
+from collections import deque
+from threading import Event, Lock, Thread, current_thread
+from dna.utils import metrics
+
+
+def summarize(stats):
+    """Turn one raw Docker stats reading into a flat sample
+
+    :param stats: the reading, as decoded from the Docker stats stream
+    :type stats: dict
+
+    :return: a dictionary containing the ``cpu`` usage (in percent of one core),\
+        the ``memory`` usage and ``memory_limit`` (in bytes), and the total bytes\
+        received (``net_rx``), sent (``net_tx``), read from disk (``block_read``),\
+        and written to disk (``block_write``) since the container started
+    """
+    cpu, precpu = stats.get("cpu_stats", {}), stats.get("precpu_stats", {})
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get(
+        "cpu_usage", {}
+    ).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    cpus = (
+        cpu.get("online_cpus")
+        or len(cpu.get("cpu_usage", {}).get("percpu_usage") or [])
+        or 1
+    )
+    cpu_percent = (
+        cpu_delta / system_delta * cpus * 100
+        if system_delta > 0 and cpu_delta > 0
+        else 0.0
+    )
+
+    memory = stats.get("memory_stats", {})
+    # page cache can be reclaimed, so it isn't counted (``cache`` on cgroup v1,
+    # ``inactive_file`` on cgroup v2)
+    details = memory.get("stats", {})
+    cache = details.get("cache", details.get("inactive_file", 0))
+    usage = max(memory.get("usage", 0) - cache, 0)
+
+    networks = (stats.get("networks") or {}).values()
+    io = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    return {
+        "cpu": cpu_percent,
+        "memory": usage,
+        "memory_limit": memory.get("limit", 0),
+        "net_rx": sum(net.get("rx_bytes", 0) for net in networks),
+        "net_tx": sum(net.get("tx_bytes", 0) for net in networks),
+        "block_read": sum(
+            op.get("value", 0) for op in io if op.get("op", "").lower() == "read"
+        ),
+        "block_write": sum(
+            op.get("value", 0) for op in io if op.get("op", "").lower() == "write"
+        ),
+    }
+
+
+class StatsSampler:
+    """Samples the resource usage of every container on a DNA instance's bridge
+    network, in the background
+
+    Each container's stats are read from one long-lived Docker stats stream
+    (which Docker updates about once a second), rather than requesting them
+    once per container per tick. Every ``interval`` seconds, the latest reading
+    of each container is appended to its history, a ring buffer of the last
+    ``history`` samples kept in memory. Every ``rollup`` seconds, the samples
+    taken since the last rollup are summarized into a
+    :class:`~dna.utils.StatsRollup` per container and saved to the database,
+    where they are kept for ``retention`` seconds.
+
+    :param dna: the DNA instance whose containers to sample
+    :type dna: :class:`~dna.DNA`
+    :param interval: the number of seconds between samples (defaults to ``5``)
+    :type interval: float
+    :param history: the number of samples to keep in memory per container\
+        (defaults to ``720``, an hour at the default interval)
+    :type history: int
+    :param rollup: the number of seconds each rollup covers (defaults to ``300``)
+    :type rollup: float
+    :param retention: the number of seconds to keep rollups for (defaults to\
+        ``604800``, a week)
+    :type retention: float
+    """
+
+    def __init__(self, dna, interval=5, history=720, rollup=300, retention=604800):
+        self.dna = dna
+        self.interval = interval
+        self.history = history
+        self.rollup = rollup
+        self.retention = retention
+
+        self._lock = Lock()
+        self._latest = {}
+        self._samples = {}
+        self._streams = {}
+        self._pending = {}
+        self._window_start = time.time()
+        self._wake = Event()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start sampling in a background thread
+
+        :return: this sampler
+        """
+        if self._running:
+            return self
+        self._running = True
+        self._window_start = time.time()
+        self._thread = Thread(target=self._loop, name="dna-stats", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling, and save a rollup of the samples taken since the last one"""
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self._flush(time.time())
+
+    def _containers(self):
+        """Get the names of the containers on the bridge network"""
+        network = self.dna.docker.get_network(self.dna.socat.bridge, low_level=True)
+        return {con["Name"] for con in (network or {}).get("Containers", {}).values()}
+
+    def _follow(self, name):
+        """Keep the latest stats reading of ``name`` until its stream ends"""
+        try:
+            for stats in self.dna.docker.stream_stats(name):
+                if not self._running or self._streams.get(name) is not current_thread():
+                    return
+                if stats.get("read", "").startswith("0001"):
+                    continue  # the container stopped
+                with self._lock:
+                    self._latest[name] = summarize(stats)
+        except Exception:
+            pass  # the container went away; the next refresh notices
+        finally:
+            with self._lock:
+                if self._streams.get(name) is current_thread():
+                    del self._streams[name]
+                    self._latest.pop(name, None)
+
+    def _refresh(self):
+        """Open a stats stream for every container on the bridge that doesn't\
+            have one yet, and drop the streams of containers that left it (or\
+            were renamed, such as by a blue/green deploy)"""
+        names = self._containers()
+        with self._lock:
+            for name in list(self._streams):
+                if name not in names:
+                    # the thread notices at its next reading, and exits
+                    del self._streams[name]
+                    self._latest.pop(name, None)
+        for name in names:
+            with self._lock:
+                if name in self._streams:
+                    continue
+                thread = Thread(
+                    target=self._follow,
+                    args=(name,),
+                    name=f"dna-stats-{name}",
+                    daemon=True,
+                )
+                self._streams[name] = thread
+            thread.start()
+
+    def sample(self):
+        """Append the latest reading of every container to its history
+
+        :return: a dictionary mapping each container to its new sample
+        """
+        now = time.time()
+        with self._lock:
+            latest = {
+                name: dict(sample, time=now) for name, sample in self._latest.items()
+            }
+            for name, sample in latest.items():
+                self._samples.setdefault(name, deque(maxlen=self.history)).append(
+                    sample
+                )
+                self._pending.setdefault(name, []).append(sample)
+        return latest
+
+    def _rollup(self, name, samples, started_at, duration):
+        """Summarize ``samples`` of ``name`` as the fields of a :class:`~dna.utils.StatsRollup`"""
+        delta = lambda key: max(samples[-1][key] - samples[0][key], 0)
+        return {
+            "service": name,
+            "started_at": started_at,
+            "duration": duration,
+            "samples": len(samples),
+            "cpu_avg": sum(s["cpu"] for s in samples) / len(samples),
+            "cpu_max": max(s["cpu"] for s in samples),
+            "memory_avg": sum(s["memory"] for s in samples) / len(samples),
+            "memory_max": max(s["memory"] for s in samples),
+            "memory_limit": samples[-1]["memory_limit"],
+            "net_rx": delta("net_rx"),
+            "net_tx": delta("net_tx"),
+            "block_read": delta("block_read"),
+            "block_write": delta("block_write"),
+        }
+
+    def _flush(self, now):
+        """Save a rollup of the samples taken since the last one"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            started_at, self._window_start = self._window_start, now
+        rollups = [
+            self._rollup(name, samples, started_at, now - started_at)
+            for name, samples in pending.items()
+            if samples
+        ]
+        if rollups:
+            self.dna.db.record_stats_rollups(rollups)
+        self.dna.db.prune_stats_rollups(now - self.retention)
+
+    def _loop(self):
+        """Sample every ``interval`` seconds and roll up every ``rollup``\
+            seconds, until stopped"""
+        while self._running:
+            try:
+                with metrics.track("dna_stats_sample"):
+                    self._refresh()
+                    self.sample()
+                now = time.time()
+                if now - self._window_start >= self.rollup:
+                    self._flush(now)
+            except Exception:
+                self.dna.print(traceback.format_exc())
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def samples(self, service=None, since=None):
+        """Get the samples kept in memory
+
+        :param service: the name of the container (defaults to ``None``, which\
+            gets every container)
+        :type service: str
+        :param since: only get samples taken after this timestamp (defaults to ``None``)
+        :type since: float
+
+        :return: a list of samples, oldest first (see :func:`~dna.stats.summarize`,\
+            plus the ``time`` of each sample); or, without ``service``, a dictionary\
+            mapping each container to its samples
+        """
+        with self._lock:
+            history = {name: list(samples) for name, samples in self._samples.items()}
+        if since is not None:
+            history = {
+                name: [s for s in samples if s["time"] >= since]
+                for name, samples in history.items()
+            }
+        if service is not None:
+            return history.get(service, [])
+        return history
+
+    def latest(self):
+        """Get the most recent sample of every container that is still running
+
+        :return: a dictionary mapping each container to its latest sample
+        """
+        with self._lock:
+            running = set(self._streams)
+            return {
+                name: samples[-1]
+                for name, samples in self._samples.items()
+                if samples and name in running
+            }
@@ -1,11 +1,30 @@
 from dna.utils.certbot_utils import Certbot
-from dna.utils.db_utils import SQLite, Service, Domain, ApiKey
-from dna.utils.docker_utils import Docker
+from dna.utils.db_utils import SQLite, Service, Domain, ApiKey, DeployPhase, ServiceImage, Build, Binding, ProxyRoute, StatsRollup, Allocation, Placement, DeployOptions
+from dna.utils.docker_utils import Docker, MetadataIndex
 from dna.utils.nginx_utils import Nginx, Block
 from dna.utils.log_utils import Logger
-from dna.utils.flask_utils import create_api_client, create_logs_client
+from dna.utils.flask_utils import create_api_client, create_logs_client, create_metrics_client
+from dna.utils.sync_utils import Debouncer
+from dna.utils.watch_utils import PathWatcher
+from dna.utils.ring_utils import HashRing
+from dna.utils.metrics_utils import Metrics, metrics
+
+import subprocess, time
+
+def _record_subprocess(command, start, returncode):
+    """Record a finished subprocess in :data:`~dna.utils.metrics`
+
+    :param command: the name of the program that was run
+    :type command: str
+    :param start: the timestamp the subprocess started at
+    :type start: float
+    :param returncode: the exit code of the subprocess
+    :type returncode: int
+    """
+    status = "success" if returncode == 0 else "error"
+    metrics.observe("dna_subprocess_duration_seconds", time.time() - start, command=command)
+    metrics.inc("dna_subprocess_total", command=command, status=status)
 
-import subprocess
 
 def sh(*args, stream=True, **kwargs):
     """A wrapper around ``subprocess.Popen`` that returns a generator
@@ -19,9 +38,14 @@ def sh(*args, stream=True, **kwargs):
 
     :return: a generator to stream lines from the subprocess output if stream\
         is ``True``, else the subprocess output as a completed string
+
+    The duration of every subprocess is recorded in :data:`~dna.utils.metrics`.
     """
+    start = time.time()
     if not stream:
-        return subprocess.run(args, capture_output=True).stdout.decode("utf-8")
+        out = subprocess.run(args, capture_output=True)
+        _record_subprocess(args[0], start, out.returncode)
+        return out.stdout.decode("utf-8")
 
     out = subprocess.Popen(
         args,
@@ -38,6 +62,7 @@ def sh(*args, stream=True, **kwargs):
             yield line
             returncode = out.poll()
             if returncode is not None:
+                _record_subprocess(args[0], start, returncode)
                 return f"Process completed with code {returncode}."
 
     return generator()
@@ -1,5 +1,6 @@
 from certbot._internal import cli, configuration, storage
 from certbot._internal.plugins import disco as plugins_disco
+from threading import Lock
 
 
 class Certbot:
@@ -11,6 +12,9 @@ class Certbot:
 
     When used with :class:`~dna.DNA`, the arguments will always be
     supplemented by ``-i nginx`` to force the nginx webserver.
+
+    Since ``certbot`` refuses to run while another instance is running, calls
+    to :meth:`~dna.utils.Certbot.run_bot` from different threads take turns.
     """
 
     def __init__(self, args=[]):
@@ -19,6 +23,7 @@ class Certbot:
         self.sh = sh
         self.plugins = plugins_disco.PluginsRegistry.find_all()
         self.args = args
+        self.lock = Lock()
 
     def _config(self, args=[]):
         """Generate a ``certbot`` configuration with the given arguments
@@ -81,18 +86,48 @@ class Certbot:
                 found_wildcard = cert
         return found_wildcard
 
+    def match_certs(self, domains, force_exact=False, force_wildcard=False):
+        """Like :meth:`~dna.utils.Certbot.cert_else_false`, but for many domains\
+            at once, reading the certificates on this machine only once
+
+        :param domains: the domains to match
+        :type domains: list[str]
+        :param force_exact: forcibly search for exact match certificates only\
+            (defaults to ``False``)
+        :type force_exact: bool
+        :param force_wildcard: forcibly search for wildcard certificates only\
+            (defaults to ``False``)
+        :type force_wildcard: bool
+
+        :return: a dictionary mapping each domain that has a matching certificate\
+            to that :class:`~certbot.interfaces.RenewableCert`
+
+        .. important: Only one of ``force_exact`` and ``force_wildcard`` may be ``True``.
+        """
+        assert not (force_exact and force_wildcard)
+
+        exact, wildcard = {}, {}
+        for cert in self._cert_iter():
+            names = cert.names()
+            for domain in domains:
+                if not force_wildcard and domain in names:
+                    exact.setdefault(domain, cert)
+                if not force_exact and ".".join(["*"] + domain.split(".")[1:]) in names:
+                    wildcard[domain] = cert
+        return {**wildcard, **exact}
+
     def attach_cert(self, cert, domain, logger=print):
         """Install ``cert`` on ``domain``
 
         :param cert: the certificate to install
         :type cert: :class:`~certbot.interfaces.RenewableCert`
-        :param domain: the domain to install the certificate on
-        :type domain: str
+        :param domain: the domain (or domains) to install the certificate on
+        :type domain: str or list[str]
         :param logger: the function to stream output to
         :type logger: func
         """
         self.run_bot(
-            [domain],
+            [domain] if isinstance(domain, str) else domain,
             ["install", "--cert-name", cert.live_dir.split("/")[-1]],
             logger=logger,
         )
@@ -111,5 +146,6 @@ class Certbot:
         for domain in domains:
             args.extend(["-d", domain])
         args.extend(self.args)
-        out = self.sh("certbot", *args, stream=False)
+        with self.lock:
+            out = self.sh("certbot", *args, stream=False)
         logger(out)
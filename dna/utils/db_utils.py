@@ -1,6 +1,8 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, create_engine
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, create_engine, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, relationship, backref
+from sqlalchemy.orm import Session, relationship, backref, joinedload
+from functools import wraps
+from threading import RLock
 import time
 
 Base = declarative_base()
@@ -100,6 +102,279 @@ class ApiKey(Base):
         return self.issued_at + self.expires_in <= time.time() + 10
 
 
+class ServiceImage(Base):
+    """Represents a deploy of an image to a service, for image retention
+
+    :param service: the name of the service
+    :type service: str
+    :param image_id: the id of the deployed image
+    :type image_id: str
+    :param deployed_at: the timestamp of the deploy
+    :type deployed_at: float
+    """
+
+    __tablename__ = "service_image"
+    id = Column(Integer, primary_key=True)
+    service = Column(String, index=True)
+    image_id = Column(String)
+    deployed_at = Column(Float)
+
+
+class Build(Base):
+    """Represents an image built from a build context, for build caching
+
+    :param context_hash: the hash of the build context (see :class:`~dna.BuildCache`)
+    :type context_hash: str
+    :param image_id: the id of the image built from the context
+    :type image_id: str
+    :param tag: the tag the image was built with
+    :type tag: str
+    :param built_at: the timestamp of the build
+    :type built_at: float
+    """
+
+    __tablename__ = "build"
+    context_hash = Column(String, primary_key=True)
+    image_id = Column(String)
+    tag = Column(String)
+    built_at = Column(Float)
+
+
+class Binding(Base):
+    """Represents a socket binding in the ``socat`` sidecar (see :class:`~dna.SocatHelper`)
+
+    :param service: the name of the bound service
+    :type service: str
+    :param port: the bound port
+    :type port: str
+    :param pid: the pid of the process serving the binding in the sidecar, if\
+        it has its own
+    :type pid: int
+    :param engine: the name of the engine that made the binding
+    :type engine: str
+    :param started_at: the time the sidecar container started, as reported by Docker
+    :type started_at: str
+    :param shard: the index of the sidecar shard serving the binding
+    :type shard: int
+    """
+
+    __tablename__ = "binding"
+    service = Column(String, primary_key=True)
+    port = Column(String)
+    pid = Column(Integer)
+    engine = Column(String)
+    started_at = Column(String)
+    shard = Column(Integer, default=0)
+
+
+class ProxyRoute(Base):
+    """Represents how nginx reaches a service, if not through its socket
+
+    :param service: the name of the service
+    :type service: str
+    :param mode: either ``socket`` or ``direct`` (see :meth:`~dna.DNA.set_proxy_mode`)
+    :type mode: str
+    :param address: in ``direct`` mode, the ``ip:port`` the nginx configs point to
+    :type address: str
+    """
+
+    __tablename__ = "proxy_route"
+    service = Column(String, primary_key=True)
+    mode = Column(String)
+    address = Column(String)
+
+
+class DeployPhase(Base):
+    """Represents how long one phase of a deploy took
+
+    :param deploy_id: the id shared by all the phases of one deploy
+    :type deploy_id: str
+    :param service: the name of the service that was deployed
+    :type service: str
+    :param phase: the name of the phase, such as ``run`` or ``nginx_reload``
+    :type phase: str
+    :param started_at: the timestamp the phase started at
+    :type started_at: float
+    :param duration: the number of seconds the phase took
+    :type duration: float
+    """
+
+    __tablename__ = "deploy_phase"
+    id = Column(Integer, primary_key=True)
+    deploy_id = Column(String, index=True)
+    service = Column(String, index=True)
+    phase = Column(String)
+    started_at = Column(Float, index=True)
+    duration = Column(Float)
+
+    def to_json(self):
+        """Represent this DeployPhase as a JSON dictionary
+
+        :return: a dictionary containing the deploy id, service, phase,\
+            start timestamp, and duration of this phase
+        """
+        return {
+            "deploy_id": self.deploy_id,
+            "service": self.service,
+            "phase": self.phase,
+            "started_at": self.started_at,
+            "duration": self.duration,
+        }
+
+
+class StatsRollup(Base):
+    """Summarizes the resource usage of a container over a window of time
+
+    :param service: the name of the container
+    :type service: str
+    :param started_at: the timestamp the window started at
+    :type started_at: float
+    :param duration: the length of the window, in seconds
+    :type duration: float
+    :param samples: the number of samples taken during the window
+    :type samples: int
+    :param cpu_avg: the average CPU usage, in percent of one core
+    :type cpu_avg: float
+    :param cpu_max: the highest CPU usage, in percent of one core
+    :type cpu_max: float
+    :param memory_avg: the average memory usage, in bytes
+    :type memory_avg: float
+    :param memory_max: the highest memory usage, in bytes
+    :type memory_max: float
+    :param memory_limit: the memory limit of the container, in bytes
+    :type memory_limit: float
+    :param net_rx: the number of bytes received during the window
+    :type net_rx: float
+    :param net_tx: the number of bytes sent during the window
+    :type net_tx: float
+    :param block_read: the number of bytes read from disk during the window
+    :type block_read: float
+    :param block_write: the number of bytes written to disk during the window
+    :type block_write: float
+    """
+
+    __tablename__ = "stats_rollup"
+    id = Column(Integer, primary_key=True)
+    service = Column(String, index=True)
+    started_at = Column(Float, index=True)
+    duration = Column(Float)
+    samples = Column(Integer)
+    cpu_avg = Column(Float)
+    cpu_max = Column(Float)
+    memory_avg = Column(Float)
+    memory_max = Column(Float)
+    memory_limit = Column(Float)
+    net_rx = Column(Float)
+    net_tx = Column(Float)
+    block_read = Column(Float)
+    block_write = Column(Float)
+
+    #: The fields of a rollup, besides its id
+    FIELDS = (
+        "service", "started_at", "duration", "samples", "cpu_avg", "cpu_max", "memory_avg",
+        "memory_max", "memory_limit", "net_rx", "net_tx", "block_read", "block_write",
+    )
+
+    def to_json(self):
+        """Represent this StatsRollup as a JSON dictionary
+
+        :return: a dictionary containing every field of this rollup
+        """
+        return {field: getattr(self, field) for field in StatsRollup.FIELDS}
+
+
+class Allocation(Base):
+    """Represents the host resources set aside for a service (see :class:`~dna.ResourceAllocator`)
+
+    :param service: the name of the service
+    :type service: str
+    :param cores: the number of CPUs dedicated to the service, or ``0`` if it\
+        runs on the shared CPUs
+    :type cores: int
+    :param cpuset: the CPUs dedicated to the service, such as ``2,3``
+    :type cpuset: str
+    :param cpu_shares: the relative CPU weight of the service, where containers\
+        have ``1024`` by default
+    :type cpu_shares: int
+    :param memory: the memory limit of the service, in bytes
+    :type memory: int
+    :param host: the name of the Docker host the resources are on (see\
+        :class:`~dna.HostPool`)
+    :type host: str
+    """
+
+    __tablename__ = "allocation"
+    service = Column(String, primary_key=True)
+    cores = Column(Integer, default=0)
+    cpuset = Column(String)
+    cpu_shares = Column(Integer)
+    memory = Column(Integer)
+    host = Column(String, default="local")
+
+    def to_json(self):
+        """Represent this Allocation as a JSON dictionary
+
+        :return: a dictionary containing the service, dedicated cores and\
+            cpuset, CPU shares, memory limit, and host of this allocation
+        """
+        return {
+            "service": self.service,
+            "cores": self.cores,
+            "cpuset": self.cpuset,
+            "cpu_shares": self.cpu_shares,
+            "memory": self.memory,
+            "host": self.host,
+        }
+
+
+class Placement(Base):
+    """Represents the Docker host a service was placed on (see :class:`~dna.HostPool`)
+
+    :param service: the name of the service
+    :type service: str
+    :param host: the name of the host
+    :type host: str
+    :param placed_at: the timestamp the service was placed on the host
+    :type placed_at: float
+    """
+
+    __tablename__ = "placement"
+    service = Column(String, primary_key=True)
+    host = Column(String, index=True)
+    placed_at = Column(Float)
+
+
+class DeployOptions(Base):
+    """Represents the docker options a service was last deployed with
+
+    :param service: the name of the service
+    :type service: str
+    :param options_hash: a stable hash of the options (see\
+        :func:`~dna.manifest.hash_options`)
+    :type options_hash: str
+    """
+
+    __tablename__ = "deploy_options"
+    service = Column(String, primary_key=True)
+    options_hash = Column(String)
+
+
+def synchronized(func):
+    """Decorate a :class:`~dna.utils.SQLite` method so that it holds the
+    database lock while it runs
+
+    :param func: the method to wrap
+    :type func: func
+    """
+
+    @wraps(func)
+    def wrapped(self, *args, **kwargs):
+        with self.lock:
+            return func(self, *args, **kwargs)
+
+    return wrapped
+
+
 class SQLite:
     """Various utilities to interface with SQLite
 
@@ -107,6 +382,11 @@ class SQLite:
     :type rel: str
     :param name: the name of the database file (minus the ``.db`` extension)
     :type name: str
+
+    The underlying session is shared, so every method holds ``lock`` while it
+    runs. This makes it safe to use one instance from several threads, such as
+    the workers of a :class:`~dna.DeployScheduler`. Objects are not expired on
+    commit, so reading their attributes afterwards doesn't touch the session.
     """
 
     def __init__(self, rel="/", name="app"):
@@ -114,8 +394,10 @@ class SQLite:
             rel = rel + "/"
         engine = create_engine(f"sqlite://{rel}{name}.db?check_same_thread=False")
         Base.metadata.create_all(engine)
-        self.s = Session(engine)
+        self.s = Session(engine, expire_on_commit=False)
+        self.lock = RLock()
 
+    @synchronized
     def create_service(self, name, image, port):
         """Create a new service with the given parameters
 
@@ -132,6 +414,26 @@ class SQLite:
         self._add(s)
         return s
 
+    @synchronized
+    def update_service(self, name, image, port):
+        """Update the image and port of the service called ``name``
+
+        :param name: the name of the service
+        :type name: str
+        :param image: the docker image now holding the service
+        :type image: str
+        :param port: the container port now running the front-end of the service
+        :type port: str
+
+        :return: the updated :class:`~dna.utils.Service`, if it exists (else ``None``)
+        """
+        service = self.get_service_by_name(name)
+        if service:
+            service.image, service.port = image, port
+            self.s.commit()
+        return service
+
+    @synchronized
     def add_domain_to_service(self, domain, service):
         """Bind ``domain`` to ``service`` if it is not bound elsewhere
 
@@ -155,6 +457,7 @@ class SQLite:
         self.s.commit()
         return True
 
+    @synchronized
     def remove_domain_from_service(self, domain, service):
         """Unbind ``domain`` from ``service`` if it is bound to it
 
@@ -178,6 +481,7 @@ class SQLite:
         self.s.commit()
         return True
 
+    @synchronized
     def delete_service(self, service):
         """Remove all records related to ``service``, including
         the associated :class:`~dna.utils.Service` object and any
@@ -193,13 +497,15 @@ class SQLite:
         self.s.delete(service)
         self.s.commit()
 
+    @synchronized
     def get_services(self):
-        """Get all the services stored in this database
+        """Get all the services stored in this database, along with their domains
 
         :return: a list of :class:`~dna.utils.Service` objects
         """
-        return self.s.query(Service).all()
+        return self.s.query(Service).options(joinedload(Service.domains)).all()
 
+    @synchronized
     def get_service_by_name(self, name):
         """Get information on the service called ``name``
 
@@ -211,6 +517,7 @@ class SQLite:
         """
         return self.s.query(Service).filter(Service.name == name).one_or_none()
 
+    @synchronized
     def get_service_by_domain(self, domain):
         """Get information on the service that ``domain`` is bound to
 
@@ -232,6 +539,7 @@ class SQLite:
             .one_or_none()
         )
 
+    @synchronized
     def get_domains(self):
         """Get all the domains stored in this database
 
@@ -239,6 +547,7 @@ class SQLite:
         """
         return self.s.query(Domain).all()
 
+    @synchronized
     def get_domain_by_url(self, url, create=False):
         """Get information on the domain pointing to ``url``
 
@@ -258,6 +567,7 @@ class SQLite:
         self._add(domain)
         return domain
     
+    @synchronized
     def get_active_keys(self):
         """Get all the active API Keys in this DNA instance
 
@@ -267,6 +577,7 @@ class SQLite:
         keys = [k for k in keys if not k.is_expired()]
         return keys
 
+    @synchronized
     def get_key_info(self, key):
         """Get info for the API key represented by the given key
 
@@ -277,6 +588,7 @@ class SQLite:
         """
         return self.s.query(ApiKey).filter(ApiKey.key == key).one_or_none()
 
+    @synchronized
     def new_api_key(self, key, ip, expires_in=3600):
         """Create a new API key
 
@@ -293,6 +605,7 @@ class SQLite:
         self._add(key_obj)
         return key_obj
     
+    @synchronized
     def check_api_key(self, key, ip):
         """Check whether the given IP can request the given key, if the key is valid
 
@@ -308,6 +621,7 @@ class SQLite:
             return False
         return get.ip == ip and not get.is_expired()
     
+    @synchronized
     def revoke_api_key(self, key):
         """Revoke the given key early
 
@@ -324,6 +638,403 @@ class SQLite:
         self.s.commit()
         return get.is_expired()
 
+    @synchronized
+    def record_deployed_image(self, service, image_id):
+        """Record that the image with id ``image_id`` was just deployed to ``service``
+
+        :param service: the name of the service
+        :type service: str
+        :param image_id: the id of the image
+        :type image_id: str
+
+        :return: the new :class:`~dna.utils.ServiceImage` object
+        """
+        record = ServiceImage(service=service, image_id=image_id, deployed_at=time.time())
+        self._add(record)
+        return record
+
+    @synchronized
+    def get_image_deploys(self):
+        """Get when each image was last deployed, to any service
+
+        :return: a dictionary mapping image ids to the timestamp of their latest deploy
+        """
+        latest = func.max(ServiceImage.deployed_at)
+        return dict(
+            self.s.query(ServiceImage.image_id, latest).group_by(ServiceImage.image_id).all()
+        )
+
+    @synchronized
+    def get_deployed_images(self, service, limit=None):
+        """Get the ids of the images most recently deployed to ``service``
+
+        :param service: the name of the service
+        :type service: str
+        :param limit: the maximum number of ids to return (defaults to ``None``,\
+            which returns all of them)
+        :type limit: int
+
+        :return: a list of distinct image ids, most recently deployed first
+        """
+        latest = func.max(ServiceImage.deployed_at)
+        query = (
+            self.s.query(ServiceImage.image_id)
+            .filter(ServiceImage.service == service)
+            .group_by(ServiceImage.image_id)
+            .order_by(latest.desc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return [row.image_id for row in query]
+
+    @synchronized
+    def record_build(self, context_hash, image_id, tag=None):
+        """Record that the build context hashed to ``context_hash`` was built\
+            into the image with id ``image_id``
+
+        :param context_hash: the hash of the build context
+        :type context_hash: str
+        :param image_id: the id of the image
+        :type image_id: str
+        :param tag: the tag the image was built with (defaults to ``None``)
+        :type tag: str
+
+        :return: the :class:`~dna.utils.Build` object
+        """
+        build = self.s.merge(
+            Build(context_hash=context_hash, image_id=image_id, tag=tag, built_at=time.time())
+        )
+        self.s.commit()
+        return build
+
+    @synchronized
+    def get_build(self, context_hash):
+        """Get the build of the context hashed to ``context_hash``
+
+        :param context_hash: the hash of the build context
+        :type context_hash: str
+
+        :return: the requested :class:`~dna.utils.Build`, if it exists (else ``None``)
+        """
+        return self.s.query(Build).filter(Build.context_hash == context_hash).one_or_none()
+
+    @synchronized
+    def save_bindings(self, bindings, engine, started_at, shard=0):
+        """Save several socket bindings at once, replacing any existing ones for\
+            the same services
+
+        :param bindings: a list of ``(service, port, pid)`` tuples
+        :type bindings: list[tuple]
+        :param engine: the name of the engine that made the bindings
+        :type engine: str
+        :param started_at: the time the sidecar container started
+        :type started_at: str
+        :param shard: the index of the sidecar shard serving the bindings\
+            (defaults to ``0``)
+        :type shard: int
+        """
+        for service, port, pid in bindings:
+            self.s.merge(
+                Binding(
+                    service=service, port=port, pid=pid, engine=engine, started_at=started_at, shard=shard
+                )
+            )
+        self.s.commit()
+
+    @synchronized
+    def get_bindings(self):
+        """Get all the saved socket bindings
+
+        :return: a list of :class:`~dna.utils.Binding` objects
+        """
+        return self.s.query(Binding).all()
+
+    @synchronized
+    def delete_binding(self, service):
+        """Forget the socket binding of ``service``, if there is one
+
+        :param service: the name of the service
+        :type service: str
+        """
+        self.s.query(Binding).filter(Binding.service == service).delete()
+        self.s.commit()
+
+    @synchronized
+    def clear_bindings(self, shard=None):
+        """Forget every socket binding
+
+        :param shard: only forget the bindings served by this sidecar shard\
+            (defaults to ``None``, which forgets all of them)
+        :type shard: int
+        """
+        query = self.s.query(Binding)
+        if shard is not None:
+            query = query.filter(Binding.shard == shard)
+        query.delete()
+        self.s.commit()
+
+    @synchronized
+    def get_proxy_route(self, service):
+        """Get the proxy route of ``service``
+
+        :param service: the name of the service
+        :type service: str
+
+        :return: the requested :class:`~dna.utils.ProxyRoute`, if it exists (else ``None``)
+        """
+        return self.s.query(ProxyRoute).filter(ProxyRoute.service == service).one_or_none()
+
+    @synchronized
+    def set_proxy_route(self, service, mode, address=None):
+        """Save the proxy route of ``service``
+
+        :param service: the name of the service
+        :type service: str
+        :param mode: either ``socket`` or ``direct``
+        :type mode: str
+        :param address: the ``ip:port`` the nginx configs point to (defaults to ``None``)
+        :type address: str
+
+        :return: the :class:`~dna.utils.ProxyRoute` object
+        """
+        route = self.s.merge(ProxyRoute(service=service, mode=mode, address=address))
+        self.s.commit()
+        return route
+
+    @synchronized
+    def delete_proxy_route(self, service):
+        """Forget the proxy route of ``service``, if there is one
+
+        :param service: the name of the service
+        :type service: str
+        """
+        self.s.query(ProxyRoute).filter(ProxyRoute.service == service).delete()
+        self.s.commit()
+
+    @synchronized
+    def record_deploy_phase(self, deploy_id, service, phase, started_at, duration):
+        """Save how long one phase of a deploy took
+
+        :param deploy_id: the id shared by all the phases of the deploy
+        :type deploy_id: str
+        :param service: the name of the service being deployed
+        :type service: str
+        :param phase: the name of the phase
+        :type phase: str
+        :param started_at: the timestamp the phase started at
+        :type started_at: float
+        :param duration: the number of seconds the phase took
+        :type duration: float
+
+        :return: the new :class:`~dna.utils.DeployPhase` object
+        """
+        phase_obj = DeployPhase(
+            deploy_id=deploy_id,
+            service=service,
+            phase=phase,
+            started_at=started_at,
+            duration=duration,
+        )
+        self._add(phase_obj)
+        return phase_obj
+
+    @synchronized
+    def get_deploy_phases(self, deploy_id=None, service=None, since=None):
+        """Get the recorded deploy phases, oldest first
+
+        :param deploy_id: only return phases of this deploy (defaults to ``None``)
+        :type deploy_id: str
+        :param service: only return phases of deploys of this service (defaults\
+            to ``None``)
+        :type service: str
+        :param since: only return phases that started after this timestamp\
+            (defaults to ``None``)
+        :type since: float
+
+        :return: a list of :class:`~dna.utils.DeployPhase` objects
+        """
+        query = self.s.query(DeployPhase)
+        if deploy_id is not None:
+            query = query.filter(DeployPhase.deploy_id == deploy_id)
+        if service is not None:
+            query = query.filter(DeployPhase.service == service)
+        if since is not None:
+            query = query.filter(DeployPhase.started_at >= since)
+        return query.order_by(DeployPhase.started_at).all()
+
+    @synchronized
+    def record_stats_rollups(self, rollups):
+        """Save several stats rollups at once
+
+        :param rollups: dictionaries of the fields of each rollup (see\
+            :class:`~dna.utils.StatsRollup`)
+        :type rollups: list[dict]
+        """
+        self.s.add_all([StatsRollup(**rollup) for rollup in rollups])
+        self.s.commit()
+
+    @synchronized
+    def get_stats_rollups(self, service=None, since=None):
+        """Get the recorded stats rollups, oldest first
+
+        :param service: only return rollups of this container (defaults to ``None``)
+        :type service: str
+        :param since: only return rollups of windows that started after this\
+            timestamp (defaults to ``None``)
+        :type since: float
+
+        :return: a list of :class:`~dna.utils.StatsRollup` objects
+        """
+        query = self.s.query(StatsRollup)
+        if service is not None:
+            query = query.filter(StatsRollup.service == service)
+        if since is not None:
+            query = query.filter(StatsRollup.started_at >= since)
+        return query.order_by(StatsRollup.started_at).all()
+
+    @synchronized
+    def prune_stats_rollups(self, before):
+        """Forget the stats rollups of windows that started before ``before``
+
+        :param before: the timestamp to prune up to
+        :type before: float
+        """
+        self.s.query(StatsRollup).filter(StatsRollup.started_at < before).delete()
+        self.s.commit()
+
+    @synchronized
+    def get_allocation(self, service):
+        """Get the resources set aside for ``service``
+
+        :param service: the name of the service
+        :type service: str
+
+        :return: the requested :class:`~dna.utils.Allocation`, if it exists (else ``None``)
+        """
+        return self.s.query(Allocation).filter(Allocation.service == service).one_or_none()
+
+    @synchronized
+    def get_allocations(self, host=None):
+        """Get the resources set aside for every service
+
+        :param host: only get the resources on this Docker host (defaults to ``None``)
+        :type host: str
+
+        :return: a list of :class:`~dna.utils.Allocation` objects
+        """
+        query = self.s.query(Allocation)
+        if host is not None:
+            query = query.filter(Allocation.host == host)
+        return query.all()
+
+    @synchronized
+    def save_allocation(self, service, cores=0, cpuset=None, cpu_shares=None, memory=None, host="local"):
+        """Save the resources set aside for ``service``, replacing any previous ones
+
+        :param service: the name of the service
+        :type service: str
+        :param cores: the number of dedicated CPUs (defaults to ``0``)
+        :type cores: int
+        :param cpuset: the dedicated CPUs (defaults to ``None``)
+        :type cpuset: str
+        :param cpu_shares: the relative CPU weight (defaults to ``None``)
+        :type cpu_shares: int
+        :param memory: the memory limit, in bytes (defaults to ``None``)
+        :type memory: int
+        :param host: the name of the Docker host (defaults to ``local``)
+        :type host: str
+
+        :return: the :class:`~dna.utils.Allocation` object
+        """
+        allocation = self.s.merge(
+            Allocation(
+                service=service, cores=cores, cpuset=cpuset, cpu_shares=cpu_shares, memory=memory, host=host
+            )
+        )
+        self.s.commit()
+        return allocation
+
+    @synchronized
+    def delete_allocation(self, service):
+        """Forget the resources set aside for ``service``, if there are any
+
+        :param service: the name of the service
+        :type service: str
+        """
+        self.s.query(Allocation).filter(Allocation.service == service).delete()
+        self.s.commit()
+
+    @synchronized
+    def get_placements(self):
+        """Get the Docker host of every placed service
+
+        :return: a list of :class:`~dna.utils.Placement` objects
+        """
+        return self.s.query(Placement).all()
+
+    @synchronized
+    def set_placement(self, service, host):
+        """Save the Docker host ``service`` was placed on, replacing any previous one
+
+        :param service: the name of the service
+        :type service: str
+        :param host: the name of the host
+        :type host: str
+
+        :return: the :class:`~dna.utils.Placement` object
+        """
+        placement = self.s.merge(Placement(service=service, host=host, placed_at=time.time()))
+        self.s.commit()
+        return placement
+
+    @synchronized
+    def delete_placement(self, service):
+        """Forget the Docker host of ``service``, if it was placed
+
+        :param service: the name of the service
+        :type service: str
+        """
+        self.s.query(Placement).filter(Placement.service == service).delete()
+        self.s.commit()
+
+    @synchronized
+    def get_options_hash(self, service):
+        """Get the hash of the docker options ``service`` was last deployed with
+
+        :param service: the name of the service
+        :type service: str
+
+        :return: the hash, or ``None`` if it was never recorded
+        """
+        options = self.s.query(DeployOptions).filter(DeployOptions.service == service).one_or_none()
+        return options.options_hash if options else None
+
+    @synchronized
+    def set_options_hash(self, service, options_hash):
+        """Save the hash of the docker options ``service`` was just deployed with
+
+        :param service: the name of the service
+        :type service: str
+        :param options_hash: the hash of the options
+        :type options_hash: str
+
+        :return: the :class:`~dna.utils.DeployOptions` object
+        """
+        options = self.s.merge(DeployOptions(service=service, options_hash=options_hash))
+        self.s.commit()
+        return options
+
+    @synchronized
+    def delete_options_hash(self, service):
+        """Forget the docker options of ``service``, if they were recorded
+
+        :param service: the name of the service
+        :type service: str
+        """
+        self.s.query(DeployOptions).filter(DeployOptions.service == service).delete()
+        self.s.commit()
+
+    @synchronized
     def _add(self, obj):
         """Add and commit the specified object to the database
 
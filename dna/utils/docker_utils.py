@@ -1,14 +1,205 @@
-import docker
+import docker, re, time
+from threading import Lock
 from docker.types import Mount
+from dna.utils.metrics_utils import metrics
+
+
+class MetadataIndex:
+    """A short-lived cache of one kind of Docker object, indexed by every key
+    the object can be looked up by (such as its name, id, or tags)
+
+    Lookups are served from the cache while the entry is younger than ``ttl``
+    seconds. Misses are remembered too, so checking for something that doesn't
+    exist doesn't hit the Docker API every time either. Entries are dropped
+    whenever :class:`~dna.utils.Docker` changes the objects behind them.
+
+    :param kind: the kind of object, such as ``container``
+    :type kind: str
+    :param ttl: the number of seconds an entry stays fresh (defaults to ``5``)
+    :type ttl: float
+
+    :ivar hits: the number of lookups served from the cache
+    :ivar misses: the number of lookups that went to Docker
+    """
+
+    def __init__(self, kind, ttl=5):
+        self.kind = kind
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries = {}
+
+    def get(self, key, load, keys=lambda value: []):
+        """Get the object indexed by ``key``, loading it on a miss
+
+        :param key: the key to look up
+        :type key: str
+        :param load: a function that finds the object for ``key`` in Docker,\
+            returning ``None`` if there isn't one
+        :type load: func
+        :param keys: a function that returns the other keys a loaded object\
+            should be indexed by (defaults to none)
+        :type keys: func
+
+        :return: the object, or ``None``
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires"] > now:
+                self.hits += 1
+                metrics.inc("dna_docker_cache_total", kind=self.kind, result="hit")
+                return entry["value"]
+            self.misses += 1
+        metrics.inc("dna_docker_cache_total", kind=self.kind, result="miss")
+
+        value = load(key)
+        self.put([key] + (keys(value) if value is not None else []), value)
+        return value
+
+    def put(self, keys, value):
+        """Index ``value`` by every key in ``keys``
+
+        :param keys: the keys to index the value by
+        :type keys: list[str]
+        :param value: the object (or ``None``, to remember it doesn't exist)
+        """
+        entry = {"value": value, "keys": set(keys), "expires": time.time() + self.ttl}
+        with self._lock:
+            for key in keys:
+                self._invalidate(key)
+                self._entries[key] = entry
+
+    def _invalidate(self, key):
+        """Drop the entry indexed by ``key`` under every key (without locking)"""
+        entry = self._entries.pop(key, None)
+        if entry:
+            for other in entry["keys"]:
+                if self._entries.get(other) is entry:
+                    del self._entries[other]
+
+    def invalidate(self, *keys):
+        """Drop the entries indexed by any of ``keys``, under every key they\
+            are indexed by
+
+        :param keys: the keys of the entries to drop
+        :type keys: str
+        """
+        with self._lock:
+            for key in keys:
+                self._invalidate(key)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get the hit rate of this index
+
+        :return: a dictionary containing the number of ``hits`` and ``misses``,\
+            the ``hit_rate``, and the number of keys currently indexed (``size``)
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0,
+                "size": len(self._entries),
+            }
+
+
+def _exact(name):
+    """Make a Docker name filter that only matches ``name`` exactly"""
+    return f"^/?{re.escape(name)}$"
 
 
 class Docker:
-    """Various utilities to interface with Docker"""
+    """Various utilities to interface with Docker
+
+    The latency and outcome of every call is recorded in :data:`~dna.utils.metrics`.
+
+    Containers, images, and networks are looked up with filters rather than by
+    listing every object, and the results are kept in a :class:`~dna.utils.MetadataIndex`
+    per kind for ``cache_ttl`` seconds. Every method that changes an object
+    drops it from the cache, so only changes made outside of this class can go
+    unnoticed, for at most ``cache_ttl`` seconds.
+
+    :param base_url: the URL of the Docker daemon, such as ``tcp://10.0.0.2:2376``\
+        (defaults to ``None``, which uses the environment and the local socket)
+    :type base_url: str
+    :param tls: the TLS configuration to reach ``base_url`` with (defaults to ``False``)
+    :type tls: bool or :class:`~docker.tls.TLSConfig`
+    :param cache_ttl: the number of seconds lookups are cached for (defaults to ``5``)
+    :type cache_ttl: float
+
+    :ivar base_url: the URL of the Docker daemon, or ``None`` for the local one
+    :ivar containers: the :class:`~dna.utils.MetadataIndex` of containers, by name and id
+    :ivar images: the :class:`~dna.utils.MetadataIndex` of images, by tag and id
+    :ivar networks: the :class:`~dna.utils.MetadataIndex` of networks, by name and id
+    """
+
+    def __init__(self, base_url=None, tls=False, cache_ttl=5):
+        self.base_url = base_url
+        if base_url is None:
+            self.client = docker.from_env()
+            self.api = docker.APIClient(base_url="unix://var/run/docker.sock")
+        else:
+            self.client = docker.DockerClient(base_url=base_url, tls=tls)
+            self.api = docker.APIClient(base_url=base_url, tls=tls)
+        self.containers = MetadataIndex("container", cache_ttl)
+        self.images = MetadataIndex("image", cache_ttl)
+        self.networks = MetadataIndex("network", cache_ttl)
+
+    def cache_stats(self):
+        """Get the hit rate of the metadata cache
+
+        :return: a dictionary mapping each kind of object to the stats of its\
+            index (see :meth:`~dna.utils.MetadataIndex.stats`)
+        """
+        return {
+            index.kind: index.stats()
+            for index in (self.containers, self.images, self.networks)
+        }
+
+    def _find_container(self, name):
+        """Get the container called ``name`` (or ``None``), through the cache"""
+
+        def load(name):
+            for con in self.client.containers.list(
+                all=True, filters={"name": _exact(name)}
+            ):
+                if con.name == name:
+                    return con
+            return None
+
+        return self.containers.get(name, load, lambda con: [con.id])
 
-    def __init__(self):
-        self.client = docker.from_env()
-        self.api = docker.APIClient(base_url="unix://var/run/docker.sock")
+    def _find_network(self, name):
+        """Get the network called ``name`` (or ``None``), through the cache"""
 
+        def load(name):
+            for net in self.client.networks.list(names=[name]):
+                if net.name == name:
+                    return net
+            return None
+
+        return self.networks.get(name, load, lambda net: [net.id])
+
+    def _find_image(self, name):
+        """Get the image with the id or tag ``name`` (or ``None``), through the cache"""
+
+        def load(name):
+            try:
+                return self.client.images.get(name)
+            except docker.errors.ImageNotFound:
+                return None
+
+        return self.images.get(name, load, lambda img: [img.id] + img.tags)
+
+    @metrics.instrument("dna_docker_call", "call")
     def network_exists(self, name):
         """Return whether the internal network called ``name`` exists
 
@@ -17,8 +208,9 @@ class Docker:
 
         :return: a boolean representing whether the network exists
         """
-        return name in [net.name for net in self.client.networks.list()]
+        return self._find_network(name) is not None
 
+    @metrics.instrument("dna_docker_call", "call")
     def create_network(self, name):
         """Return an internal network called ``name``, creating it if
         it doesn't already exist
@@ -30,8 +222,10 @@ class Docker:
         """
         if self.network_exists(name):
             return self.get_network(name)
+        self.networks.invalidate(name)
         return self.client.networks.create(name)
 
+    @metrics.instrument("dna_docker_call", "call")
     def get_network(self, name, low_level=False):
         """Return the requested network, or its details
 
@@ -44,11 +238,34 @@ class Docker:
         :return: the requested :class:`~docker.models.networks.Network`,\
             or a dictionary representing it
         """
-        for net in self.client.networks.list():
-            if net.name == name:
-                if low_level:
-                    return self.api.inspect_network(net.id)
-                return net
+        net = self._find_network(name)
+        if net and low_level:
+            # the connected containers change all the time, so this isn't cached
+            return self.api.inspect_network(net.id)
+        return net
+
+    @metrics.instrument("dna_docker_call", "call")
+    def connect_container(self, network, con, aliases=None):
+        """Connect ``con`` to ``network``, reachable by its name and ``aliases``
+
+        If ``con`` is already connected to ``network``, it is disconnected
+        first so that the new aliases take effect.
+
+        :param network: the name of the network
+        :type network: str
+        :param con: the (name of the) container to connect
+        :type con: str or :class:`~docker.models.containers.Container`
+        :param aliases: additional names to resolve to ``con`` on ``network``
+        :type aliases: list[str]
+        """
+        if isinstance(con, str):
+            con = self.client.containers.get(con)
+        net = self.get_network(network)
+        con.reload()
+        if network in con.attrs["NetworkSettings"]["Networks"]:
+            net.disconnect(con)
+        net.connect(con, aliases=aliases)
+        self.containers.invalidate(con.name)
 
     def make_mount(self, host, internal):
         """Create a mount object representing a binding between ``host``
@@ -63,6 +280,7 @@ class Docker:
         """
         return Mount(internal, host, type="bind")
 
+    @metrics.instrument("dna_docker_call", "call")
     def image_exists(self, name):
         """Return whether the image tagged ``name`` exists
 
@@ -78,11 +296,9 @@ class Docker:
         if not ":" in name:
             name = name + ":latest"
 
-        for img in self.client.images.list():
-            if name in img.tags:
-                return True
-        return False
+        return self._find_image(name) is not None
 
+    @metrics.instrument("dna_docker_call", "call")
     def pull_image(self, image, tag=None):
         """Pull and save a Docker image by name or URL
 
@@ -93,7 +309,9 @@ class Docker:
         :type tag: str
         """
         self.client.images.pull(image, tag=tag)
+        self.images.clear()
 
+    @metrics.instrument("dna_docker_call", "call")
     def pull_image_stream(self, image, tag=None):
         """Pull and save a Docker image by name or URL and stream the output
 
@@ -105,17 +323,27 @@ class Docker:
 
         :yields: dictionaries representing each streamed output line
         """
-        yield from self.api.pull(image, tag, stream=True, decode=True)
+        try:
+            yield from self.api.pull(image, tag, stream=True, decode=True)
+        finally:
+            self.images.clear()
 
+    @metrics.instrument("dna_docker_call", "call")
     def build_image(self, **options):
         """Build a Docker image using the given options
 
         :param options: options to use to the build the image (ideally contains\
             at least a path to a build context, as well as a Dockerfile)
         :type options: kwargs
+
+        :return: the built :class:`~docker.models.images.Image`
         """
-        self.client.images.build(**options)
+        try:
+            return self.client.images.build(**options)[0]
+        finally:
+            self.images.clear()
 
+    @metrics.instrument("dna_docker_call", "call")
     def build_image_stream(self, **options):
         """Build a Docker image using the given options and stream the output
 
@@ -125,12 +353,111 @@ class Docker:
 
         :yields: dictionaries representing each streamed output line
         """
-        yield from self.api.build(decode=True, **options)
+        try:
+            yield from self.api.build(decode=True, **options)
+        finally:
+            self.images.clear()
+
+    @metrics.instrument("dna_docker_call", "call")
+    def get_image(self, id):
+        """Get the image with the given ``id`` (or tag)
 
+        :param id: the id or tag of the image
+        :type id: str
+
+        :return: the requested :class:`~docker.models.images.Image`, or ``None``\
+            if it doesn't exist
+        """
+        return self._find_image(id)
+
+    @metrics.instrument("dna_docker_call", "call")
+    def tag_image(self, id, tag):
+        """Tag the image with the given ``id`` as ``tag``
+
+        :param id: the id of the image
+        :type id: str
+        :param tag: the new tag, such as ``name`` or ``registry/name:version``
+        :type tag: str
+
+        .. note::
+            If ``tag`` does not contain a version, ``latest`` is used.
+        """
+        repository, version = tag, "latest"
+        if ":" in tag.rsplit("/", 1)[-1]:
+            repository, version = tag.rsplit(":", 1)
+        self.client.images.get(id).tag(repository, version)
+        self.images.invalidate(id, f"{repository}:{version}")
+
+    @metrics.instrument("dna_docker_call", "call")
     def prune_images(self):
-        """Remove all dangling images"""
-        self.client.images.prune()
+        """Remove all dangling images
+
+        If the daemon is already running a prune (for example, one started by\
+            a concurrent deploy), this does nothing.
+        """
+        try:
+            self.client.images.prune()
+        except docker.errors.APIError as e:
+            if e.status_code != 409:
+                raise
+        finally:
+            self.images.clear()
+
+    @metrics.instrument("dna_docker_call", "call")
+    def list_images(self):
+        """List all the top-level images, including dangling ones
+
+        :return: a list of :class:`~docker.models.images.Image` objects
+        """
+        return self.client.images.list()
 
+    @metrics.instrument("dna_docker_call", "call")
+    def images_in_use(self):
+        """Get the ids of the images used by containers, running or not
+
+        :return: a set of image ids
+        """
+        return {con.attrs["Image"] for con in self.client.containers.list(all=True)}
+
+    @metrics.instrument("dna_docker_call", "call")
+    def remove_image(self, id):
+        """Remove the image with the given ``id``, along with all its tags
+
+        :param id: the id of the image
+        :type id: str
+
+        :return: whether the image was removed; it won't be if it is used by a\
+            container or has dependent child images
+        """
+        image = self._find_image(id)
+        try:
+            # without forcing, an image with several tags can't be removed by id,
+            # so remove each of its tags instead (the last one removes the image)
+            for name in (image.tags if image else None) or [id]:
+                self.client.images.remove(name, noprune=False)
+            return True
+        except docker.errors.APIError:
+            return False
+        finally:
+            self.images.invalidate(id)
+
+    @metrics.instrument("dna_docker_call", "call")
+    def disk_usage(self):
+        """Get the number of bytes taken up by image layers
+
+        :return: the size of all image layers, in bytes
+        """
+        return self.client.df()["LayersSize"]
+
+    @metrics.instrument("dna_docker_call", "call")
+    def root_dir(self):
+        """Get the directory Docker stores its data in
+
+        :return: the path of the Docker root directory
+        """
+        return self.client.info()["DockerRootDir"]
+
+    @metrics.instrument("dna_docker_call", "call")
     def container_exists(self, name):
         """Return whether the container called ``name`` exists
 
@@ -139,8 +466,25 @@ class Docker:
 
         :return: a boolean representing whether the container exists
         """
-        return name in [con.name for con in self.client.containers.list(all=True)]
+        return self._find_container(name) is not None
+
+    def _fresh_container(self, name):
+        """Get the container called ``name`` with its current state, or ``None``
 
+        The cache only tells us which container to inspect, so this costs one\
+            inspect rather than a listing of every container.
+        """
+        con = self._find_container(name)
+        if con is None:
+            return None
+        try:
+            con.reload()
+        except docker.errors.NotFound:
+            self.containers.invalidate(name)
+            return None
+        return con
+
+    @metrics.instrument("dna_docker_call", "call")
     def run_image(self, img, name, **options):
         """Run the requested image as a container
 
@@ -153,8 +497,108 @@ class Docker:
 
         :return: the created :class:`~docker.models.containers.Container`
         """
-        return self.client.containers.run(img, name=name, **options)
+        try:
+            return self.client.containers.run(img, name=name, **options)
+        finally:
+            self.containers.invalidate(name)
+
+    @metrics.instrument("dna_docker_call", "call")
+    def container_address(self, name, network):
+        """Get the IP address of the container called ``name`` on ``network``
+
+        :param name: the name of the container
+        :type name: str
+        :param network: the name of the network
+        :type network: str
+
+        :return: the IP address, or ``None`` if the container doesn't exist or\
+            isn't connected to ``network``
+        """
+        try:
+            networks = self.client.containers.get(name).attrs["NetworkSettings"][
+                "Networks"
+            ]
+        except docker.errors.NotFound:
+            return None
+        return networks.get(network, {}).get("IPAddress") or None
+
+    @metrics.instrument("dna_docker_call", "call")
+    def update_container(self, name, **limits):
+        """Change the resource limits of the container called ``name`` while it runs
+
+        :param name: the name of the container
+        :type name: str
+        :param limits: the limits to change, such as ``cpuset_cpus`` or ``mem_limit``
+        :type limits: kwargs
+
+        :return: whether the container existed and was updated
+        """
+        con = self._find_container(name)
+        if con is None:
+            return False
+        try:
+            con.update(**limits)
+        except docker.errors.NotFound:
+            self.containers.invalidate(name)
+            return False
+        return True
+
+    @metrics.instrument("dna_docker_call", "call")
+    def host_resources(self):
+        """Get the CPUs and memory of the Docker host
+
+        :return: a dictionary containing the number of ``cpus`` and the bytes\
+            of ``memory`` of the host
+        """
+        info = self.client.info()
+        return {"cpus": info["NCPU"], "memory": info["MemTotal"]}
+
+    @metrics.instrument("dna_docker_call", "call")
+    def published_port(self, name, port):
+        """Get the host port that ``port`` of the container called ``name`` is\
+            published on
+
+        :param name: the name of the container
+        :type name: str
+        :param port: the port inside the container
+        :type port: str
+
+        :return: the host port, or ``None`` if the container doesn't exist or\
+            doesn't publish ``port``
+        """
+        try:
+            ports = (
+                self.client.containers.get(name).attrs["NetworkSettings"]["Ports"] or {}
+            )
+        except docker.errors.NotFound:
+            return None
+        bindings = ports.get(f"{port}/tcp") or []
+        return bindings[0]["HostPort"] if bindings else None
+
+    @metrics.instrument("dna_docker_call", "call")
+    def running_containers(self):
+        """Get the names of every running container
+
+        :return: a set of container names
+        """
+        return {con.name for con in self.client.containers.list()}
+
+    @metrics.instrument("dna_docker_call", "call")
+    def container_started_at(self, name):
+        """Get the time the container called ``name`` last started
+
+        :param name: the name of the container
+        :type name: str
+
+        :return: the timestamp, as reported by Docker, or ``None`` if the\
+            container doesn't exist
+        """
+        try:
+            return self.client.containers.get(name).attrs["State"]["StartedAt"]
+        except docker.errors.NotFound:
+            return None
 
+    @metrics.instrument("dna_docker_call", "call")
     def start_container(self, name):
         """Start the requested container, if it is not running
 
@@ -163,13 +607,14 @@ class Docker:
 
         :return: whether the container was started successfully
         """
-        if self.container_exists(name):
-            con = self.client.containers.get(name)
-            if con.status == "exited":
-                con.start()
-                return True
+        con = self._fresh_container(name)
+        if con and con.status == "exited":
+            con.start()
+            self.containers.invalidate(name)
+            return True
         return False
 
+    @metrics.instrument("dna_docker_call", "call")
     def stop_container(self, name):
         """Stop the requested container, if it is not stopped
 
@@ -178,31 +623,107 @@ class Docker:
 
         :return: whether the container was stopped successfully
         """
-        if self.container_exists(name):
-            con = self.client.containers.get(name)
-            if con.status != "exited":
-                con.kill()
-                return True
+        con = self._fresh_container(name)
+        if con and con.status != "exited":
+            con.kill()
+            self.containers.invalidate(name)
+            return True
         return False
 
-    def wipe_container(self, name):
+    @metrics.instrument("dna_docker_call", "call")
+    def rename_container(self, name, new_name):
+        """Rename the container called ``name`` to ``new_name``
+
+        :param name: the current name of the container
+        :type name: str
+        :param new_name: the new name of the container
+        :type new_name: str
+        """
+        self.client.containers.get(name).rename(new_name)
+        self.containers.invalidate(name, new_name)
+
+    @metrics.instrument("dna_docker_call", "call")
+    def wipe_container(self, name, timeout=None):
         """Kill and remove the container named ``name``, if needed,
         and return it if it existed
 
         :param name: the name of the container to act on
         :type name: str
+        :param timeout: if set, stop the container gracefully, waiting up to\
+            this many seconds before killing it (defaults to ``None``, which\
+            kills it immediately)
+        :type timeout: int
 
         :return: the removed :class:`~docker.models.containers.Container`\
             if it existed, else the string "not found"
         """
-        for con in self.client.containers.list(all=True):
-            if name == con.name:
-                if con.status == "running":
+        con = self._fresh_container(name)
+        if not con:
+            return "not found"
+        try:
+            if con.status == "running":
+                if timeout is None:
                     con.kill()
-                con.remove()
-                return name
-        return "not found"
+                else:
+                    con.stop(timeout=timeout)
+            con.remove()
+        finally:
+            self.containers.invalidate(name)
+        return name
+
+    @metrics.instrument("dna_docker_call", "call")
+    def container_id(self, name):
+        """Get the id of the container called ``name``
+
+        :param name: the name of the container
+        :type name: str
+
+        :return: the id of the container, or ``None`` if it doesn't exist
+        """
+        con = self._find_container(name)
+        return con.id if con else None
+
+    @metrics.instrument("dna_docker_call", "call")
+    def container_name(self, id):
+        """Get the name of the container with the given ``id``
+
+        :param id: the id of the container
+        :type id: str
+
+        :return: the name of the container, or ``None`` if it doesn't exist
+        """
+        try:
+            return self.client.containers.get(id).name
+        except docker.errors.NotFound:
+            return None
+
+    def stream_stats(self, name):
+        """Stream the resource usage of the container called ``name``, over a\
+            single connection
+
+        :param name: the name of the container
+        :type name: str
+
+        :return: a stream of dictionaries, one about every second, as reported\
+            by Docker; it ends when the container stops
+        """
+        return self.api.stats(name, stream=True, decode=True)
+
+    def events(self, since=None, **filters):
+        """Subscribe to the Docker event stream
+
+        :param since: only include events after this timestamp (defaults to\
+            ``None``, which starts from now)
+        :type since: float
+        :param filters: filters to apply to the stream, such as ``type="network"``
+        :type filters: kwargs
 
+        :return: a stream of dictionaries representing each event, which can be\
+            stopped by calling its ``close`` method
+        """
+        return self.client.events(since=since, filters=filters, decode=True)
+
+    @metrics.instrument("dna_docker_call", "call")
     def exec_command(self, con, command, **options):
         """Run a command on the given container
 
@@ -219,14 +740,65 @@ class Docker:
             con = self.client.containers.get(con)
         return con.exec_run(command, **options)
 
-    def service_logs(self, con):
-        """Get the most recent 100 logs for ``con``
+    @metrics.instrument("dna_docker_call", "call")
+    def service_logs(self, con, tail=100, since=None, until=None):
+        """Get the most recent ``tail`` logs for ``con``
 
         :param con: the name of the container
         :type con: str
+        :param tail: the number of lines to get, or ``"all"`` (defaults to ``100``)
+        :type tail: int or str
+        :param since: only get logs after this unix timestamp (defaults to ``None``)
+        :type since: int
+        :param until: only get logs before this unix timestamp (defaults to ``None``)
+        :type until: int
 
         :return: a string of log messages
         """
         if isinstance(con, str):
             con = self.client.containers.get(con)
-        return con.logs(tail=100, timestamps=True).decode("utf-8")
+        return con.logs(tail=tail, since=since, until=until, timestamps=True).decode(
+            "utf-8"
+        )
+
+    def stream_logs(self, con, tail=100, since=None, until=None, follow=True):
+        """Stream the logs of ``con`` over a single connection, as they are written
+
+        :param con: the name of the container
+        :type con: str
+        :param tail: the number of existing lines to start with, or ``"all"``\
+            (defaults to ``100``)
+        :type tail: int or str
+        :param since: only get logs after this unix timestamp (defaults to ``None``)
+        :type since: int
+        :param until: only get logs before this unix timestamp (defaults to ``None``)
+        :type until: int
+        :param follow: flag to keep waiting for new lines once the existing ones\
+            have been sent (defaults to ``True``)
+        :type follow: bool
+
+        :yields: each line (with its timestamp, and without its line break)
+
+        Closing the generator closes the connection to Docker.
+        """
+        if isinstance(con, str):
+            con = self.client.containers.get(con)
+        stream = con.logs(
+            stream=True,
+            follow=follow,
+            tail=tail,
+            since=since,
+            until=until,
+            timestamps=True,
+        )
+        buffer = b""
+        try:
+            for chunk in stream:
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    yield line.decode("utf-8", errors="replace")
+            if buffer:
+                yield buffer.decode("utf-8", errors="replace")
+        finally:
+            stream.close()
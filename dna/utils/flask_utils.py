@@ -1,6 +1,7 @@
 from functools import wraps
 from dna.utils.jinja_utils import *
-import os, datetime
+from dna.utils.metrics_utils import metrics
+import os, datetime, time
 
 def create_api_client(dna, precheck=None):
     """Create a Flask Blueprint to expose DNA functions as a REST API
@@ -65,7 +66,10 @@ def create_api_client(dna, precheck=None):
     def _check_key():
         key = request.headers.get("App-Key-DNA", "")
         ip = request.environ.get("HTTP_X_FORWARDED_FOR", "0.0.0.0")
-        if not dna.db.check_api_key(key, ip):
+        start = time.time()
+        valid = dna.db.check_api_key(key, ip)
+        metrics.observe("dna_api_key_check_duration_seconds", time.time() - start)
+        if not valid:
             abort(403)
         return True
 
@@ -87,6 +91,16 @@ def create_api_client(dna, precheck=None):
 
         return Response(stream_with_context(dna.build_image(stream=True, **options)))
     
+    @api.route("/build_images", methods=["POST"])
+    def build_images():
+        _check_key()
+        data = request.get_json()
+
+        specs = data.get("specs")
+        workers = data.get("workers", 2)
+
+        return jsonify(dna.build_images(specs, workers=workers))
+
     @api.route("/run_deploy", methods=["POST"])
     def run_deploy():
         _check_key()
@@ -96,10 +110,24 @@ def create_api_client(dna, precheck=None):
         image = data.get("image")
         port = data.get("port")
         options = data.get("options")
+        resources = data.get("resources")
+        host = data.get("host")
 
-        dna.run_deploy(service, image, port, **options)
+        dna.run_deploy(service, image, port, resources=resources, host=host, **options)
         return jsonify(success=True)
     
+    @api.route("/apply", methods=["POST"])
+    def apply():
+        _check_key()
+        data = request.get_json()
+
+        manifest = data.get("manifest")
+        dry_run = data.get("dry_run", False)
+        prune = data.get("prune", False)
+
+        actions = dna.apply(manifest, dry_run=dry_run, prune=prune)
+        return jsonify(actions=[a.to_json() for a in actions])
+
     @api.route("/propagate_services", methods=["POST"])
     def propagate_services():
         _check_key()
@@ -111,6 +139,32 @@ def create_api_client(dna, precheck=None):
         _check_key()
         return jsonify(dna.get_service_info(name).to_json())
     
+    @api.route("/service_health")
+    @api.route("/service_health/<name>")
+    def service_health(name=None):
+        _check_key()
+        return jsonify(dna.service_health(name))
+
+    @api.route("/service_stats")
+    @api.route("/service_stats/<name>")
+    def service_stats(name=None):
+        _check_key()
+        since = request.args.get("since", type=float)
+        return jsonify(
+            samples=dna.service_stats(name, since),
+            rollups=dna.stats_rollups(name, since),
+        )
+
+    @api.route("/resource_usage")
+    def resource_usage():
+        _check_key()
+        return jsonify(dna.resource_usage(request.args.get("host", "local")))
+
+    @api.route("/host_usage")
+    def host_usage():
+        _check_key()
+        return jsonify(dna.host_usage())
+
     @api.route("/start_service", methods=["POST"])
     def start_service():
         _check_key()
@@ -131,6 +185,18 @@ def create_api_client(dna, precheck=None):
 
         return jsonify(success=dna.add_domain(service, domain, force_wildcard, force_provision))
 
+    @api.route("/add_domains", methods=["POST"])
+    def add_domains():
+        _check_key()
+        data = request.get_json()
+
+        service = data.get("service")
+        domains = data.get("domains", [])
+        force_wildcard = data.get("force_wildcard", False)
+        force_provision = data.get("force_provision", False)
+
+        return jsonify(domains=dna.add_domains(service, domains, force_wildcard, force_provision))
+
     @api.route("/remove_domain", methods=["POST"])
     def remove_domain():
         _check_key()
@@ -141,6 +207,18 @@ def create_api_client(dna, precheck=None):
 
         return jsonify(success=dna.remove_domain(service, domain))
 
+    @api.route("/set_proxy_mode", methods=["POST"])
+    def set_proxy_mode():
+        _check_key()
+        data = request.get_json()
+
+        service = data.get("service")
+        mode = data.get("mode")
+
+        if mode not in dna.PROXY_MODES:
+            abort(400)
+        return jsonify(success=dna.set_proxy_mode(service, mode))
+
     @api.route("/stop_service", methods=["POST"])
     def stop_service():
         _check_key()
@@ -179,9 +257,24 @@ def create_logs_client(dna, fallback=None, precheck=lambda f: f):
     :return: a Flask :class:`~flask.Blueprint` that can be registered to a\
         :class:`~flask.Flask` app
     """
-    from flask import abort, url_for, Blueprint
+    from flask import abort, url_for, request, Response, stream_with_context, render_template_string, Blueprint
     logs = Blueprint('dna_logs', __name__)
 
+    def _log_options():
+        def timestamp(name):
+            value = request.args.get(name)
+            return int(float(value)) if value else None
+
+        tail = request.args.get("tail", "100")
+        try:
+            return {
+                "tail": tail if tail == "all" else int(tail),
+                "since": timestamp("since"),
+                "until": timestamp("until"),
+            }
+        except ValueError:
+            abort(400)
+
     def _spcss(content=""):
         return '<link rel="stylesheet" href="https://unpkg.com/spcss">\n' + content
     
@@ -203,6 +296,7 @@ def create_logs_client(dna, fallback=None, precheck=lambda f: f):
             content += f'<li>{_link(service, "nginx", "Nginx Access")}</li>\n'
             content += f'<li>{_link(service, "error", "Nginx Errors")}</li>\n'
             content += f'<li>{_link(service, "docker", "Container")}</li>\n'
+            content += f'<li><a href={url_for("dna_logs.livelog", service=service.name)}>Container (Live)</a></li>\n'
             content += "</ul>\n"
 
         return content
@@ -228,10 +322,71 @@ def create_logs_client(dna, fallback=None, precheck=lambda f: f):
                 dna.nginx_logs(service.name, error=True).split("\n")
             )
         if log == "docker":
-            return "<br />".join(dna.docker_logs(service.name).split("\n"))
+            return "<br />".join(dna.docker_logs(service.name, **_log_options()).split("\n"))
 
         if fallback:
             return fallback(service.name, log)
         abort(404)
+
+    @logs.route("/<service>/docker/stream")
+    @precheck
+    def streamlog(service):
+        if not dna.get_service_info(service):
+            abort(404)
+        options = _log_options()
+        follow = request.args.get("follow", "true") != "false"
+        lines = dna.stream_docker_logs(service, follow=follow, **options)
+
+        def events():
+            try:
+                for line in lines:
+                    yield f"data: {line}\n\n"
+            finally:
+                lines.close()
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @logs.route("/<service>/docker/live")
+    @precheck
+    def livelog(service):
+        if not dna.get_service_info(service):
+            abort(404)
+        stream = url_for("dna_logs.streamlog", service=service, **request.args)
+        return render_template_string(JINJA_LIVE_LOGS, service=service, stream=stream)
     
     return logs
+
+def create_metrics_client(dna, precheck=lambda f: f):
+    """Create a Flask Blueprint that serves DNA's metrics in the Prometheus
+    text exposition format, for scraping
+
+    In addition to everything recorded in :data:`~dna.utils.metrics`, this
+    reports the number of services (running and total) and socat bindings of
+    the DNA instance.
+
+    :param dna: the dna instance to interface with
+    :type dna: :class:`~dna.DNA`
+    :param precheck: an optional decorator that wraps the metrics endpoint
+    :type precheck: decorator
+
+    :return: a Flask :class:`~flask.Blueprint` that can be registered to a\
+        :class:`~flask.Flask` app
+    """
+    from flask import Response, Blueprint
+    client = Blueprint('dna_metrics', __name__)
+
+    instance = dna.service_name
+    metrics.gauge("dna_services", lambda: len(dna.services), instance=instance, state="running")
+    metrics.gauge("dna_services", lambda: len(dna.registry), instance=instance, state="all")
+    metrics.gauge("dna_socat_bindings", lambda: len(dna.socat.bindings), instance=instance)
+
+    @client.route("/")
+    @precheck
+    def scrape():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return client
@@ -43,4 +43,29 @@ JINJA_API_KEY = """<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/spc
 
 <a href="{{ url_for('dna_api.keys_index') }}">Active API Keys</a>
 <br />
-"""
\ No newline at end of file
+"""
+
+#: The Jinja Template to follow the container logs of a service as they are written
+JINJA_LIVE_LOGS = """<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/spcss@0.5.0">
+<style>pre{white-space:pre-wrap}body{margin-bottom:10px}</style>
+<title>{{ service }} Logs</title>
+
+<h1>{{ service }} Logs</h1>
+
+<pre id="logs"></pre>
+<p id="status">Following...</p>
+
+<script>
+  const logs = document.getElementById("logs");
+  const source = new EventSource({{ stream | tojson }});
+  source.onmessage = (e) => {
+    const follow = window.innerHeight + window.scrollY >= document.body.offsetHeight - 10;
+    logs.appendChild(document.createTextNode(e.data + "\\n"));
+    if (follow) window.scrollTo(0, document.body.scrollHeight);
+  };
+  source.onerror = () => {
+    source.close();
+    document.getElementById("status").textContent = "The log stream ended.";
+  };
+</script>
+"""
@@ -0,0 +1,269 @@
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+import inspect, time
+
+
+class Metrics:
+    """A minimal, thread-safe registry of counters, gauges and histograms that
+    renders in the Prometheus text exposition format
+
+    Metrics don't need to be declared before they're used; their type is set
+    by the first call that touches them. Use :meth:`~dna.utils.Metrics.describe`
+    to attach a help string.
+
+    :param buckets: the upper bounds (in seconds) of the histogram buckets
+    :type buckets: list[float]
+    """
+
+    #: The default histogram buckets, which span quick API calls to slow builds
+    BUCKETS = [
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+        30,
+        60,
+        120,
+        300,
+    ]
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = sorted(buckets)
+        self._lock = Lock()
+        self._types = {}
+        self._help = {}
+        self._values = {}
+        self._gauges = {}
+
+    def describe(self, name, help):
+        """Attach a help string to the metric called ``name``
+
+        :param name: the name of the metric
+        :type name: str
+        :param help: a short description of the metric
+        :type help: str
+        """
+        self._help[name] = help
+
+    def _declare(self, name, kind):
+        """Set the type of ``name`` on first use, and make sure it is used consistently"""
+        if self._types.setdefault(name, kind) != kind:
+            raise ValueError(f"{name} is a {self._types[name]}, not a {kind}")
+
+    def inc(self, name, amount=1, **labels):
+        """Increment the counter called ``name``
+
+        :param name: the name of the counter
+        :type name: str
+        :param amount: the amount to increment by (defaults to ``1``)
+        :type amount: float
+        :param labels: the labels identifying the series to increment
+        :type labels: kwargs
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._declare(name, "counter")
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record ``value`` in the histogram called ``name``
+
+        :param name: the name of the histogram
+        :type name: str
+        :param value: the value to record
+        :type value: float
+        :param labels: the labels identifying the series to record in
+        :type labels: kwargs
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._declare(name, "histogram")
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts, _, _ = hist = self._values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            hist[1] += 1
+            hist[2] += value
+
+    def gauge(self, name, func, **labels):
+        """Register ``func`` as the source of the gauge called ``name``
+
+        :param name: the name of the gauge
+        :type name: str
+        :param func: a function returning the current value, which is called\
+            every time the metrics are rendered
+        :type func: func
+        :param labels: the labels identifying the series
+        :type labels: kwargs
+        """
+        with self._lock:
+            self._declare(name, "gauge")
+            self._gauges[(name, tuple(sorted(labels.items())))] = func
+
+    @contextmanager
+    def track(self, name, **labels):
+        """Time the block, recording ``name_duration_seconds`` and counting\
+            ``name_total`` with a ``status`` label of ``success`` or ``error``
+
+        :param name: the prefix of the two metrics
+        :type name: str
+        :param labels: the labels identifying the series
+        :type labels: kwargs
+        """
+        start, status = time.time(), "error"
+        try:
+            yield
+            status = "success"
+        finally:
+            self.observe(f"{name}_duration_seconds", time.time() - start, **labels)
+            self.inc(f"{name}_total", status=status, **labels)
+
+    def instrument(self, name, label):
+        """Decorate a function so that every call is tracked by\
+            :meth:`~dna.utils.Metrics.track`, labelled with the function's name
+
+        Generator functions are timed until they're exhausted.
+
+        :param name: the prefix of the metrics to record
+        :type name: str
+        :param label: the name of the label to store the function's name in
+        :type label: str
+        """
+
+        def decorator(func):
+            labels = {label: func.__name__}
+
+            if inspect.isgeneratorfunction(func):
+
+                @wraps(func)
+                def wrapped_gen(*args, **kwargs):
+                    with self.track(name, **labels):
+                        return (yield from func(*args, **kwargs))
+
+                return wrapped_gen
+
+            @wraps(func)
+            def wrapped(*args, **kwargs):
+                with self.track(name, **labels):
+                    return func(*args, **kwargs)
+
+            return wrapped
+
+        return decorator
+
+    def _format(self, name, labels, value, extra=()):
+        """Format one sample line"""
+        labels = list(labels) + list(extra)
+        if labels:
+            pairs = ",".join(
+                '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                for k, v in labels
+            )
+            name = f"{name}{{{pairs}}}"
+        return f"{name} {value}\n"
+
+    def render(self):
+        """Render all the metrics in the Prometheus text exposition format
+
+        :return: the metrics, as a string
+        """
+        with self._lock:
+            values = {
+                key: (list(v[0]), v[1], v[2]) if isinstance(v, list) else v
+                for key, v in self._values.items()
+            }
+            gauges = dict(self._gauges)
+            types = dict(self._types)
+
+        for key, func in gauges.items():
+            values[key] = func()
+
+        out = ""
+        for name in sorted(types):
+            if name in self._help:
+                out += f"# HELP {name} {self._help[name]}\n"
+            out += f"# TYPE {name} {types[name]}\n"
+            for (metric, labels), value in sorted(values.items(), key=str):
+                if metric != name:
+                    continue
+                if types[name] != "histogram":
+                    out += self._format(name, labels, value)
+                    continue
+                counts, count, total = value
+                for bound, bucket in zip(self.buckets, counts):
+                    out += self._format(
+                        f"{name}_bucket", labels, bucket, [("le", bound)]
+                    )
+                out += self._format(f"{name}_bucket", labels, count, [("le", "+Inf")])
+                out += self._format(f"{name}_sum", labels, total)
+                out += self._format(f"{name}_count", labels, count)
+        return out
+
+
+#: The process-wide :class:`~dna.utils.Metrics` registry that DNA records into
+metrics = Metrics()
+
+metrics.describe("dna_operation_duration_seconds", "Latency of DNA operations")
+metrics.describe("dna_operation_total", "Number of DNA operations, by outcome")
+metrics.describe("dna_docker_call_duration_seconds", "Latency of Docker calls")
+metrics.describe("dna_docker_call_total", "Number of Docker calls, by outcome")
+metrics.describe(
+    "dna_subprocess_duration_seconds",
+    "Duration of subprocesses such as nginx and certbot",
+)
+metrics.describe("dna_subprocess_total", "Number of subprocesses run, by outcome")
+metrics.describe("dna_api_key_check_duration_seconds", "Latency of API key checks")
+metrics.describe(
+    "dna_image_gc_reclaimed_bytes_total", "Bytes reclaimed by image garbage collection"
+)
+metrics.describe(
+    "dna_image_gc_removed_images_total", "Images removed by image garbage collection"
+)
+metrics.describe(
+    "dna_build_duration_seconds", "Duration of builds run by a BuildExecutor"
+)
+metrics.describe(
+    "dna_build_total", "Number of builds run by a BuildExecutor, by outcome"
+)
+metrics.describe(
+    "dna_build_cache_total", "Number of builds looked up in the build cache, by result"
+)
+metrics.describe(
+    "dna_pull_total",
+    "Number of image pulls requested, by whether they were pulled, skipped, or merged",
+)
+metrics.describe(
+    "dna_socket_probe_duration_seconds", "Latency of successful socket health probes"
+)
+metrics.describe(
+    "dna_socket_rebind_total",
+    "Number of dead sockets rebound by the health monitor, by outcome",
+)
+metrics.describe(
+    "dna_docker_cache_total",
+    "Number of Docker metadata lookups, by kind and whether they hit the cache",
+)
+metrics.describe(
+    "dna_stats_sample_duration_seconds",
+    "Duration of each round of container stats sampling",
+)
+metrics.describe(
+    "dna_stats_sample_total", "Number of rounds of container stats sampling, by outcome"
+)
+metrics.describe(
+    "dna_resource_allocation_total",
+    "Number of service resource allocations, by whether they were allocated, refused, or restored",
+)
+metrics.describe("dna_placement_total", "Number of services placed on each Docker host")
+metrics.describe("dna_services", "Number of services managed by a DNA instance")
+metrics.describe("dna_socat_bindings", "Number of socat bindings of a DNA instance")
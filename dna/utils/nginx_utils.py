@@ -1,3 +1,6 @@
+import re
+
+
 class Block:
     """Represents a block in an nginx configuration
 
@@ -78,8 +81,8 @@ class Nginx:
     def __init__(self, default):
         self.default = default
 
-    def gen_config_with_port(self, domain, port, logs_pre="/var/log/nginx/", proxy_set_header={}):
-        """Generate an nginx config that proxies ``domain`` to ``port``
+    def gen_config_with_port(self, domain, port, logs_pre="/var/log/nginx/", proxy_set_header={}, host="127.0.0.1"):
+        """Generate an nginx config that proxies ``domain`` to ``port`` on ``host``
 
         :param domain: the domain to proxy
         :type domain: str
@@ -91,10 +94,12 @@ class Nginx:
         :param proxy_set_header: a dictionary of proxy headers to pass into\
             nginx
         :type proxy_set_header: dict
+        :param host: the address to proxy to (defaults to ``127.0.0.1``)
+        :type host: str
 
         :return: the generated nginx config, as a string
         """
-        return self.gen_config(domain, f"http://127.0.0.1:{port}", logs_pre, proxy_set_header)
+        return self.gen_config(domain, f"http://{host}:{port}", logs_pre, proxy_set_header)
 
     def gen_config_with_sock(self, domain, sock, logs_pre="/var/log/nginx/", proxy_set_header={}):
         """Generate an nginx config that proxies ``domain`` to ``sock``
@@ -114,6 +119,28 @@ class Nginx:
         """
         return self.gen_config(domain, f"http://unix:{sock}", logs_pre, proxy_set_header)
 
+    def set_proxy_pass(self, path, proxy_pass):
+        """Point every ``proxy_pass`` in the config at ``path`` to ``proxy_pass``
+
+        The rest of the config (such as the changes ``certbot`` makes to it) is\
+            left as is.
+
+        :param path: the path to the config
+        :type path: str
+        :param proxy_pass: the new destination to pass to
+        :type proxy_pass: str
+
+        :return: whether the config changed
+        """
+        with open(path) as f:
+            config = f.read()
+        updated = re.sub(r"(\bproxy_pass\s+)[^;]+;", lambda m: f"{m.group(1)}{proxy_pass};", config)
+        if updated == config:
+            return False
+        with open(path, "w") as f:
+            f.write(updated)
+        return True
+
     def gen_config(self, domain, proxy_pass, logs_pre, proxy_set_header={}):
         """Generate an nginx config that proxies ``domain`` to ``proxy_pass``
 
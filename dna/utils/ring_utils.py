@@ -0,0 +1,76 @@
+from bisect import bisect
+import hashlib
+
+
+def _hash(key):
+    """Hash ``key`` to a point on the ring
+
+    :param key: the key to hash
+    :type key: str
+
+    :return: a 64-bit integer
+    """
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """A consistent hash ring that assigns keys to nodes
+
+    Every node is placed at ``replicas`` points on the ring, and a key belongs
+    to the node at the first point after the key's own hash. Adding or removing
+    a node only moves the keys on either side of its points, which is about
+    ``1 / len(nodes)`` of all keys, rather than nearly every key.
+
+    :param nodes: the nodes to start with
+    :type nodes: list
+    :param replicas: the number of points per node, which evens out the share\
+        of keys each node gets (defaults to ``64``)
+    :type replicas: int
+    """
+
+    def __init__(self, nodes=[], replicas=64):
+        self.replicas = replicas
+        self.nodes = []
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        """Add ``node`` to the ring, if it isn't on it already
+
+        :param node: the node to add
+        """
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            index = bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        """Remove ``node`` from the ring, if it is on it
+
+        :param node: the node to remove
+        """
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def get(self, key):
+        """Get the node ``key`` belongs to
+
+        :param key: the key to look up
+        :type key: str
+
+        :return: the node, or ``None`` if the ring is empty
+        """
+        if not self._points:
+            return None
+        index = bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
@@ -0,0 +1,58 @@
+from threading import Condition
+import time
+
+
+class Debouncer:
+    """Coalesces calls to ``func`` made from several threads
+
+    Calling the debouncer runs ``func`` at most once per ``window``: the first
+    caller waits ``window`` seconds for others to pile on, then runs ``func``
+    once on behalf of all of them. Every caller blocks until a run of ``func``
+    that started *after* its call has finished, so the effect of anything it
+    did beforehand (such as writing an nginx config) is always picked up. If
+    ``func`` raises, the exception propagates to the caller that ran it, and
+    the others try again.
+
+    :param func: the function to coalesce calls to
+    :type func: func
+    :param window: the number of seconds to wait for other callers before\
+        running ``func`` (defaults to ``0.1``)
+    :type window: float
+
+    :ivar calls: the number of times the debouncer was called
+    :ivar runs: the number of times ``func`` actually ran
+    """
+
+    def __init__(self, func, window=0.1):
+        self.func = func
+        self.window = window
+        self.calls = 0
+        self.runs = 0
+
+        self._cond = Condition()
+        self._running = False
+        self._done = 0
+
+    def __call__(self):
+        with self._cond:
+            self.calls += 1
+            ticket = self.calls
+            while self._running:
+                self._cond.wait()
+            if self._done >= ticket:
+                return
+            self._running = True
+
+        covered = self._done
+        try:
+            time.sleep(self.window)
+            with self._cond:
+                pending = self.calls
+            self.func()
+            covered = pending
+        finally:
+            with self._cond:
+                self.runs += 1
+                self._running = False
+                self._done = max(self._done, covered)
+                self._cond.notify_all()
@@ -0,0 +1,183 @@
+from concurrent.futures import Future
+from threading import Lock, Thread
+import ctypes, ctypes.util, os, select, struct, time
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct("iIII")
+
+
+def _inotify():
+    """Load the ``inotify`` functions from libc, if they are available
+
+    :return: the libc library, or ``None`` if ``inotify`` isn't available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class PathWatcher:
+    """Waits for files to appear in a folder, without a thread per waiter
+
+    A single background thread watches ``folder`` for new entries using
+    ``inotify``, so waiters are woken up as soon as their file is created. On
+    systems without ``inotify``, the thread checks for the files every
+    ``poll`` seconds instead.
+
+    :param folder: the folder to watch
+    :type folder: str
+    :param poll: the number of seconds between checks when ``inotify`` isn't\
+        available (defaults to ``0.1``)
+    :type poll: float
+
+    :ivar inotify: whether ``inotify`` is being used
+    """
+
+    def __init__(self, folder, poll=0.1):
+        self.folder = folder
+        self.poll = poll
+
+        self._lock = Lock()
+        self._waiters = {}
+        self._fd = None
+        self._running = True
+
+        libc = _inotify()
+        if libc:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            mask = IN_CREATE | IN_MOVED_TO | IN_ATTRIB
+            if (
+                fd >= 0
+                and libc.inotify_add_watch(fd, folder.encode("utf-8"), mask) >= 0
+            ):
+                self._fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        self.inotify = self._fd is not None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+
+        self._thread = Thread(target=self._watch, name="dna-path-watcher", daemon=True)
+        self._thread.start()
+
+    def wait_for(self, name, timeout=None):
+        """Get a future that resolves once ``name`` exists in the folder
+
+        :param name: the name of the file, relative to the folder
+        :type name: str
+        :param timeout: the maximum number of seconds to wait (defaults to\
+            ``None``, which waits forever)
+        :type timeout: float
+
+        :return: a :class:`~concurrent.futures.Future` resolving to the full path\
+            of the file, or failing with a :class:`TimeoutError`
+        """
+        future = Future()
+        path = os.path.join(self.folder, name)
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            self._waiters.setdefault(name, []).append((future, deadline))
+        self._wake()
+        # the file may have been created before we started waiting for it
+        if os.path.exists(path):
+            self._resolve(name)
+        return future
+
+    def close(self):
+        """Stop watching the folder"""
+        self._running = False
+        self._wake()
+        self._thread.join()
+        if self._fd is not None:
+            os.close(self._fd)
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def _wake(self):
+        """Wake up the background thread"""
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # it already has wake-ups pending
+
+    def _resolve(self, name):
+        """Resolve every waiter for ``name``"""
+        with self._lock:
+            waiters = self._waiters.pop(name, [])
+        for future, _ in waiters:
+            if not future.done():
+                future.set_result(os.path.join(self.folder, name))
+
+    def _expire(self):
+        """Fail every waiter whose deadline has passed
+
+        :return: the number of seconds until the next deadline, or ``None``
+        """
+        now, expired, next_deadline = time.time(), [], None
+        with self._lock:
+            for name, waiters in list(self._waiters.items()):
+                alive = []
+                for future, deadline in waiters:
+                    if deadline is not None and deadline <= now:
+                        expired.append((name, future))
+                    else:
+                        alive.append((future, deadline))
+                        if deadline is not None:
+                            next_deadline = min(next_deadline or deadline, deadline)
+                if alive:
+                    self._waiters[name] = alive
+                else:
+                    del self._waiters[name]
+        for name, future in expired:
+            future.set_exception(TimeoutError(f"{name} didn't appear in {self.folder}"))
+        return next_deadline - now if next_deadline else None
+
+    def _read_events(self):
+        """Read the pending ``inotify`` events
+
+        :return: the names of the files the events are about
+        """
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset < len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            names.append(data[offset : offset + length].rstrip(b"\0").decode("utf-8"))
+            offset += length
+        return names
+
+    def _watch(self):
+        """Resolve and expire waiters until closed"""
+        while self._running:
+            wait = self._expire()
+            if self._fd is None:
+                time.sleep(min(self.poll, wait) if wait is not None else self.poll)
+                with self._lock:
+                    names = list(self._waiters)
+                for name in names:
+                    if os.path.exists(os.path.join(self.folder, name)):
+                        self._resolve(name)
+                continue
+
+            # new waiters and close() write to the wake pipe, so that deadlines
+            # are recomputed
+            readable, _, _ = select.select([self._fd, self._wake_r], [], [], wait)
+            if self._wake_r in readable:
+                os.read(self._wake_r, 4096)
+            if self._fd in readable:
+                for name in self._read_events():
+                    with self._lock:
+                        waiting = name in self._waiters
+                    if waiting:
+                        self._resolve(name)
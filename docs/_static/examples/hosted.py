@@ -39,7 +39,8 @@ def new(img, name=None, env={}):
     name = name if name else img.split("/")[-1]
 
     img_name = f"{name}-img"
-    dna.pull_image(img, img_name)
+    dna.pull_image(img)
+    dna.docker.tag_image(img, img_name)
 
     if "ENV" not in env:
         env["ENV"] = "prod"
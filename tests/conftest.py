@@ -0,0 +1,152 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from dna import DNA, ServiceRegistry, HostPool, ResourceAllocator, ImageCollector
+from dna.utils import SQLite
+
+GB = 1024**3
+
+
+class FakeDocker:
+    """An in-memory stand-in for :class:`~dna.utils.Docker`, which keeps track
+    of the containers it was asked to run and the images it has"""
+
+    def __init__(self, cpus=4, memory=8 * GB, address=None):
+        self.cpus = cpus
+        self.memory = memory
+        self.base_url = f"tcp://{address}:2376" if address else None
+        self.containers = {}
+        self.images = []
+        self.in_use = set()
+        self.removed = []
+        self.builds = []
+        self.fail_runs = False
+
+    def host_resources(self):
+        return {"cpus": self.cpus, "memory": self.memory}
+
+    def run_image(self, img, name, **options):
+        if self.fail_runs:
+            raise RuntimeError(f"Couldn't run {img}")
+        image = SimpleNamespace(id=f"sha256:{img}")
+        self.containers[name] = {"image": img, "running": True, "options": options}
+        return SimpleNamespace(name=name, image=image)
+
+    def wipe_container(self, name, timeout=None):
+        self.containers.pop(name, None)
+
+    def container_exists(self, name):
+        return name in self.containers
+
+    def stop_container(self, name):
+        if name in self.containers:
+            self.containers[name]["running"] = False
+            return True
+        return False
+
+    def container_started_at(self, name):
+        return "2020-12-01T00:00:00Z"
+
+    def running_containers(self):
+        return {name for name, c in self.containers.items() if c["running"]}
+
+    def published_port(self, name, port):
+        return "32768" if name in self.containers else None
+
+    def container_id(self, name):
+        return f"id-{name}" if name in self.containers else None
+
+    def container_name(self, id):
+        for name in self.containers:
+            if f"id-{name}" == id:
+                return name
+        return None
+
+    def container_address(self, name, network):
+        return None
+
+    def get_network(self, name, low_level=False):
+        running = self.running_containers()
+        return {"Containers": {name: {"Name": name} for name in running}}
+
+    def list_images(self):
+        return list(self.images)
+
+    def images_in_use(self):
+        return set(self.in_use)
+
+    def build_image(self, **options):
+        self.builds.append(options)
+        image = self.add_image(f"sha256:build-{len(self.builds)}", [options["tag"]])
+        return image
+
+    def build_image_stream(self, **options):
+        image = self.build_image(**options)
+        yield {"stream": f"Successfully built {image.id}\n"}
+        yield {"aux": {"ID": image.id}}
+
+    def get_image(self, id):
+        return next((image for image in self.images if image.id == id), None)
+
+    def tag_image(self, id, tag):
+        self.get_image(id).tags.append(tag)
+
+    def add_image(self, id, tags=(), size=GB, created="2020-12-01T00:00:00Z"):
+        image = SimpleNamespace(
+            id=id, tags=list(tags), attrs={"Size": size, "Created": created}
+        )
+        self.images.append(image)
+        return image
+
+    def remove_image(self, id):
+        self.removed.append(id)
+        self.images = [image for image in self.images if image.id != id]
+        return True
+
+
+class FakeSocat:
+    """An in-memory stand-in for :class:`~dna.SocatHelper`"""
+
+    def __init__(self):
+        self.bridge = "test"
+        self.containers = {}
+        self.bindings = {}
+
+    def bind(self, service, port, callback=None):
+        self.bindings[service] = port
+        if callback:
+            callback()
+
+    def unbind(self, service, port=None):
+        self.bindings.pop(service, None)
+
+    def bind_all(self, services):
+        for service in services:
+            self.bind(service.name, service.port)
+
+
+@pytest.fixture
+def dna(tmp_path):
+    """A :class:`~dna.DNA` instance backed by a real database in ``tmp_path``,
+    whose Docker daemon, sidecars, and nginx reloads are fakes"""
+    instance = DNA.__new__(DNA)
+    instance.internal_logger = SimpleNamespace(close=lambda: None)
+    instance.service_name = "test"
+    instance.path = str(tmp_path)
+    instance.socks = f"{tmp_path}/socks"
+    instance.confs = f"{tmp_path}/nginx"
+    instance.db = SQLite(rel=f"/{tmp_path}/", name="test")
+    instance.docker = FakeDocker()
+    instance.print = lambda *args, **kwargs: None
+    instance.registry = ServiceRegistry()
+    instance._batch_lock = threading.Lock()
+    instance._batch_depth = 0
+    instance._deferred = {}
+    instance._timing = threading.local()
+    instance.nginx_reloader = lambda: None
+    instance.socat = FakeSocat()
+    instance.events = None
+    instance.gc = ImageCollector(instance)
+    instance.hosts = HostPool(instance)
+    instance.resources = ResourceAllocator(instance)
+    return instance
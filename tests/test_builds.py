@@ -0,0 +1,41 @@
+from dna import BuildCache
+
+
+def context(tmp_path):
+    path = tmp_path / "app"
+    path.mkdir()
+    (path / "Dockerfile").write_text("FROM python:3.9\n")
+    return str(path)
+
+
+def test_unchanged_context_hashes_the_same(dna, tmp_path):
+    path = context(tmp_path)
+    builds = BuildCache(dna)
+    assert builds.context_hash(path=path) == builds.context_hash(path=path, rm=True)
+
+
+def test_pull_and_nocache_bypass_the_cache(dna, tmp_path):
+    path = context(tmp_path)
+    builds = BuildCache(dna)
+    assert builds.context_hash(path=path, pull=True) is None
+    assert builds.context_hash(path=path, nocache=True) is None
+    assert builds.context_hash(path=path, pull=False) == builds.context_hash(path=path)
+
+
+def test_build_image_returns_the_image_id(dna, tmp_path):
+    dna.builds = BuildCache(dna)
+    path = context(tmp_path)
+    built = dna.build_image(path=path, tag="app:1")
+    assert built == "sha256:build-1"
+    assert dna.build_image(path=path, tag="app:2") == built
+    assert len(dna.docker.builds) == 1
+    assert dna.docker.get_image(built).tags == ["app:1", "app:2"]
+
+
+def test_build_image_streams_output(dna, tmp_path):
+    dna.builds = BuildCache(dna)
+    path = context(tmp_path)
+    lines = list(dna.build_image(path=path, tag="app:1", stream=True))
+    assert lines == ["Successfully built sha256:build-1\n", ""]
+    lines = list(dna.build_image(path=path, tag="app:1", stream=True))
+    assert lines[0].startswith("Build context unchanged")
@@ -0,0 +1,27 @@
+from dna import EventWatcher
+
+
+def disconnect(id):
+    return {"Action": "disconnect", "Actor": {"Attributes": {"container": id}}}
+
+
+def deployed(dna):
+    dna.run_deploy("app", "imvs/app:1", "80")
+    watcher = EventWatcher(dna)
+    watcher._names["id-app"] = "app"
+    dna.docker.wipe_container("app")
+    return watcher
+
+
+def test_disconnect_stops_service(dna):
+    watcher = deployed(dna)
+    watcher._handle(disconnect("id-app"))
+    assert not dna.registry.is_active("app")
+
+
+def test_retired_container_disconnect_is_ignored(dna):
+    watcher = deployed(dna)
+    watcher.retire("id-app")
+    watcher._handle(disconnect("id-app"))
+    assert dna.registry.is_active("app")
+    assert not watcher._retired
@@ -0,0 +1,90 @@
+import pytest
+from dna import HostPool
+from dna.hosts import LOCAL
+from tests.conftest import FakeDocker
+
+
+def add_remote(dna, **capacity):
+    remote = FakeDocker(address="10.0.0.2", **capacity)
+    dna.hosts.add("remote", remote)
+    return remote
+
+
+def test_new_service_goes_to_least_loaded_host(dna):
+    dna.run_deploy("one", "imvs/one", "80")
+    remote = add_remote(dna)
+    assert dna.hosts.choose("two").name == "remote"
+    dna.run_deploy("two", "imvs/two", "80")
+    assert dna.hosts.placement("two") == "remote"
+    assert "two" in remote.containers and "two" not in dna.docker.containers
+
+
+def test_ties_go_to_the_local_host(dna):
+    add_remote(dna)
+    assert dna.hosts.choose("app").name == LOCAL
+
+
+def test_services_deployed_before_placement_stay_local(dna):
+    dna.registry.add(dna.db.create_service("legacy", "imvs/legacy", "80"))
+    dna.docker.run_image("imvs/legacy", "legacy")
+    remote = add_remote(dna)
+    assert dna.hosts.choose("legacy").name == LOCAL
+    dna.run_deploy("legacy", "imvs/legacy:2", "80")
+    assert dna.hosts.placement("legacy") == LOCAL
+    assert dna.docker.containers["legacy"]["image"] == "imvs/legacy:2"
+    assert not remote.containers
+
+
+def test_host_must_fit_declared_resources(dna):
+    add_remote(dna, cpus=8)
+    dna.run_deploy("big", "imvs/big", "80", resources={"cores": 6})
+    assert dna.hosts.placement("big") == "remote"
+
+
+def test_moved_service_leaves_old_host_after_deploy(dna):
+    dna.run_deploy("app", "imvs/app", "80", resources={"memory": "1g"})
+    remote = add_remote(dna)
+    dna.run_deploy("app", "imvs/app", "80", host="remote")
+    assert dna.hosts.placement("app") == "remote"
+    assert "app" in remote.containers and "app" not in dna.docker.containers
+    assert "app" not in dna.socat.bindings
+    assert dna.db.get_allocation("app").host == "remote"
+    assert dna.get_proxy_mode("app") == "direct"
+
+
+def test_failed_move_keeps_service_on_old_host(dna):
+    dna.run_deploy("app", "imvs/app", "80", resources={"memory": "1g"})
+    remote = add_remote(dna)
+    remote.fail_runs = True
+    with pytest.raises(RuntimeError):
+        dna.run_deploy("app", "imvs/app", "80", host="remote")
+    assert dna.hosts.placement("app") == LOCAL
+    assert "app" in dna.docker.containers
+    assert dna.socat.bindings == {"app": "80"}
+    assert dna.db.get_allocation("app").host == LOCAL
+
+
+def test_failed_deploy_releases_new_allocation(dna):
+    dna.docker.fail_runs = True
+    with pytest.raises(RuntimeError):
+        dna.run_deploy("app", "imvs/app", "80", resources={"cores": 1})
+    assert dna.db.get_allocation("app") is None
+    assert dna.db.get_placements() == []
+
+
+def test_placements_survive_a_restart(dna):
+    add_remote(dna)
+    dna.run_deploy("app", "imvs/app", "80", host="remote")
+    pool = HostPool(dna, {"remote": dna.hosts.get("remote").docker})
+    assert pool.placement("app") == "remote"
+    assert pool.running() == {"app"}
+
+
+def test_host_with_services_cant_be_removed(dna):
+    add_remote(dna)
+    dna.run_deploy("app", "imvs/app", "80", host="remote")
+    with pytest.raises(RuntimeError):
+        dna.hosts.remove("remote")
+    dna.delete_service("app")
+    dna.hosts.remove("remote")
+    assert list(dna.hosts.hosts) == [LOCAL]
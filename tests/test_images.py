@@ -0,0 +1,59 @@
+from tests.conftest import GB
+
+
+def plan(dna):
+    images = dna.docker.list_images()
+    return [image.id for image in dna.gc._plan(images, dna.docker.images_in_use())]
+
+
+def test_dangling_images_are_removed(dna):
+    dna.docker.add_image("sha256:dangling")
+    dna.docker.add_image("sha256:used")
+    dna.docker.add_image("sha256:tagged", ["imvs/app:1"])
+    dna.docker.in_use.add("sha256:used")
+    assert plan(dna) == ["sha256:dangling"]
+
+
+def test_budget_only_evicts_images_deployed_before(dna):
+    dna.gc.budget, dna.gc.min_age = GB, 0
+    dna.docker.add_image("sha256:old", ["imvs/old:1"], created="2020-01-01T00:00:00Z")
+    dna.docker.add_image(
+        "sha256:pulled", ["imvs/new:1"], created="2019-01-01T00:00:00Z"
+    )
+    dna.db.record_deployed_image("gone", "sha256:old")
+    assert plan(dna) == ["sha256:old"]
+
+
+def test_budget_spares_recent_deploys(dna):
+    dna.gc.budget = GB
+    dna.docker.add_image("sha256:old", ["imvs/old:1"])
+    dna.docker.add_image("sha256:other", ["imvs/other:1"])
+    dna.db.record_deployed_image("gone", "sha256:old")
+    assert plan(dna) == []
+
+
+def test_budget_spares_held_images(dna):
+    dna.gc.budget, dna.gc.min_age = GB, 0
+    dna.docker.add_image("sha256:old", ["imvs/old:1"])
+    dna.docker.add_image("sha256:other", ["imvs/other:1"])
+    dna.db.record_deployed_image("gone", "sha256:old")
+    dna.gc.hold("imvs/old:1")
+    assert plan(dna) == []
+    dna.gc.release("imvs/old:1")
+    assert plan(dna) == ["sha256:old"]
+
+
+def test_latest_tag_is_implicit(dna):
+    dna.docker.add_image("sha256:app", ["imvs/app:latest"])
+    dna.gc.hold("imvs/app")
+    assert dna.gc._held == {"imvs/app:latest": 1}
+
+
+def test_keep_last_images_of_registered_services(dna):
+    dna.gc.budget, dna.gc.min_age, dna.gc.keep_last = GB, 0, 1
+    dna.docker.add_image("sha256:imvs/app:1", ["imvs/app:1"], created="2020-01-01")
+    dna.docker.add_image("sha256:imvs/app:2", ["imvs/app:2"], created="2020-02-01")
+    dna.run_deploy("app", "imvs/app:1", "80")
+    dna.run_deploy("app", "imvs/app:2", "80")
+    assert plan(dna) == ["sha256:imvs/app:1"]
+    assert not dna.gc._held
@@ -0,0 +1,79 @@
+from tests.conftest import FakeDocker
+from dna.manifest import plan_manifest
+
+
+def manifest(image):
+    return [{"name": "app", "image": image, "port": 80}]
+
+
+def test_new_service_is_deployed(dna):
+    actions = plan_manifest(dna, manifest("imvs/app:1"))
+    assert [(a.kind, a.reason) for a in actions] == [("deploy", "new service")]
+
+
+def test_applied_manifest_converges(dna):
+    dna.apply(manifest("imvs/app:1"))
+    assert plan_manifest(dna, manifest("imvs/app:1")) == []
+
+
+def test_changed_image_converges(dna):
+    dna.apply(manifest("imvs/app:1"))
+    first = dna.apply(manifest("imvs/app:2"))
+    assert [(a.kind, a.reason, a.state) for a in first] == [
+        ("deploy", "image or port changed", "done")
+    ]
+    assert dna.apply(manifest("imvs/app:2")) == []
+    assert dna.db.get_service_by_name("app").image == "imvs/app:2"
+    assert dna.docker.containers["app"]["image"] == "imvs/app:2"
+
+
+def test_changed_port_converges(dna):
+    dna.apply(manifest("imvs/app:1"))
+    dna.apply([{"name": "app", "image": "imvs/app:1", "port": 8080}])
+    assert (
+        plan_manifest(dna, [{"name": "app", "image": "imvs/app:1", "port": 8080}]) == []
+    )
+    assert dna.registry.get("app").port == "8080"
+
+
+def test_stopped_service_is_started(dna):
+    dna.apply(manifest("imvs/app:1"))
+    dna.stop_service("app")
+    actions = plan_manifest(dna, manifest("imvs/app:1"))
+    assert [(a.kind, a.reason) for a in actions] == [("start", "container is stopped")]
+
+
+def test_prune_deletes_unlisted_services(dna):
+    dna.apply(manifest("imvs/app:1"))
+    actions = plan_manifest(dna, [], prune=True)
+    assert [(a.kind, a.service) for a in actions] == [("delete", "app")]
+
+
+def test_changed_resources_and_host_are_deployed(dna):
+    dna.apply(manifest("imvs/app:1"))
+    spec = dict(manifest("imvs/app:1")[0], resources={"cores": 1})
+    actions = plan_manifest(dna, [spec])
+    assert [(a.kind, a.reason) for a in actions] == [("deploy", "resources changed")]
+    dna.apply([spec])
+    assert plan_manifest(dna, [spec]) == []
+
+    dna.hosts.add("remote", FakeDocker(address="10.0.0.2"))
+    spec["host"] = "remote"
+    actions = plan_manifest(dna, [spec])
+    assert [(a.kind, a.reason) for a in actions] == [("deploy", "host changed")]
+    dna.apply([spec])
+    assert plan_manifest(dna, [spec]) == []
+
+
+def test_changed_options_are_deployed(dna):
+    spec = dict(manifest("imvs/app:1")[0], options={"environment": {"A": "1"}})
+    dna.apply([spec])
+    assert plan_manifest(dna, [spec]) == []
+    assert dna.docker.containers["app"]["options"]["environment"] == {"A": "1"}
+
+    spec["options"] = {"environment": {"A": "2"}}
+    actions = plan_manifest(dna, [spec])
+    assert [(a.kind, a.reason) for a in actions] == [("deploy", "options changed")]
+    dna.apply([spec])
+    assert plan_manifest(dna, [spec]) == []
+    assert dna.docker.containers["app"]["options"]["environment"] == {"A": "2"}
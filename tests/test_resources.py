@@ -0,0 +1,99 @@
+import pytest
+from dna import ResourceAllocator
+from dna.resources import parse_memory
+from tests.conftest import GB
+
+
+def test_parse_memory():
+    assert parse_memory(None) is None
+    assert parse_memory(1024) == 1024
+    assert parse_memory("512m") == 512 * 1024**2
+    assert parse_memory("1.5GB") == int(1.5 * GB)
+    with pytest.raises(ValueError):
+        parse_memory("lots")
+
+
+def test_overcommit_must_be_at_least_one(dna):
+    with pytest.raises(ValueError):
+        ResourceAllocator(dna, overcommit=0.5)
+
+
+def test_dedicated_cores_leave_one_shared(dna):
+    allocation = dna.resources.allocate("one", cores=3)
+    assert allocation.cpuset == "0,1,2"
+    assert dna.resources.shared_cpus() == [3]
+    with pytest.raises(RuntimeError):
+        dna.resources.allocate("two", cores=1)
+    assert dna.db.get_allocation("two") is None
+
+
+def test_redeploy_keeps_its_cores(dna):
+    dna.resources.allocate("one", cores=1)
+    dna.resources.allocate("two", cores=1)
+    assert dna.resources.allocate("two", cores=2).cpuset == "1,2"
+
+
+def test_memory_overcommit_is_refused(dna):
+    dna.resources.allocate("one", memory="6g")
+    with pytest.raises(RuntimeError):
+        dna.resources.allocate("two", memory="4g")
+    assert not dna.resources.fits("two", memory="4g")
+
+
+def test_overcommit_ratio_allows_more(dna):
+    dna.resources = ResourceAllocator(dna, overcommit=2)
+    dna.resources.allocate("one", cores=3, memory="8g")
+    dna.resources.allocate("two", cores=3, memory="8g")
+    with pytest.raises(RuntimeError):
+        dna.resources.allocate("three", memory="1g")
+
+
+def test_refused_deploy_touches_nothing(dna):
+    with pytest.raises(RuntimeError):
+        dna.run_deploy("app", "imvs/app", "80", resources={"memory": "16g"})
+    assert not dna.docker.containers
+    assert dna.db.get_allocation("app") is None
+    assert "app" not in dna.registry
+
+
+def test_docker_options(dna):
+    assert dna.resources.docker_options("app") == {}
+    dna.resources.allocate("pinned", cores=2, cpu_shares=512, memory="1g")
+    assert dna.resources.docker_options("pinned") == {
+        "cpuset_cpus": "0,1",
+        "cpu_shares": 512,
+        "mem_limit": GB,
+        "memswap_limit": GB,
+    }
+    assert dna.resources.docker_options("app") == {"cpuset_cpus": "2,3"}
+
+
+def test_deploy_runs_container_with_limits(dna):
+    dna.run_deploy("app", "imvs/app", "80", resources={"cores": 1, "memory": "1g"})
+    options = dna.docker.containers["app"]["options"]
+    assert options["cpuset_cpus"] == "0"
+    assert options["mem_limit"] == GB
+    assert dna.resources.matches("app", {"cores": 1, "memory": "1g"})
+    assert not dna.resources.matches("app", {"cores": 2, "memory": "1g"})
+
+
+def test_restore(dna):
+    before = dna.resources.allocate("app", cores=1).to_json()
+    dna.resources.allocate("app", cores=2)
+    dna.resources.restore("app", before)
+    assert dna.db.get_allocation("app").to_json() == before
+    dna.resources.restore("app", None)
+    assert dna.db.get_allocation("app") is None
+
+
+def test_failed_deploy_restores_resources(dna, monkeypatch):
+    dna.run_deploy("app", "imvs/app", "80", resources={"cores": 1})
+    before = dna.db.get_allocation("app").to_json()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("Couldn't save the service")
+
+    monkeypatch.setattr(dna, "_do_db_deploy", fail)
+    with pytest.raises(RuntimeError):
+        dna.run_deploy("app", "imvs/app", "80", resources={"cores": 2})
+    assert dna.db.get_allocation("app").to_json() == before
@@ -0,0 +1,44 @@
+from threading import Event, Thread
+from dna.scheduler import DeployScheduler, DeployJob
+
+
+def test_only_the_newest_queued_deploy_runs(dna):
+    scheduler = DeployScheduler(dna, workers=2)
+    started, gate = Event(), Event()
+
+    def blocker():
+        started.set()
+        gate.wait(5)
+
+    running = scheduler.submit("app", blocker)
+    assert started.wait(5)
+    older = scheduler.submit_deploy("app", "imvs/app:1", 80)
+    newer = scheduler.submit_deploy("app", "imvs/app:2", 80)
+    assert older.state == DeployJob.SUPERSEDED
+    gate.set()
+    scheduler.shutdown()
+
+    assert running.state == DeployJob.DONE
+    assert newer.state == DeployJob.DONE
+    assert dna.docker.containers["app"]["image"] == "imvs/app:2"
+    assert not dna.gc._held
+
+
+def test_done_callbacks_run_without_the_scheduler_lock(dna):
+    scheduler = DeployScheduler(dna, workers=1)
+    unblocked = []
+
+    def callback(job):
+        # Another thread can only get the jobs if the lock isn't held
+        thread = Thread(target=scheduler.get_jobs)
+        thread.start()
+        thread.join(1)
+        unblocked.append(not thread.is_alive())
+
+    gate = Event()
+    scheduler.submit("app", gate.wait, 5)
+    scheduler.submit("other", lambda: None).add_done_callback(callback)
+    scheduler.submit("other", lambda: None).add_done_callback(callback)
+    gate.set()
+    scheduler.shutdown()
+    assert unblocked == [True, True]
@@ -0,0 +1,33 @@
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+from dna import SocatHelper
+
+
+class SlowEngine:
+    """A synchronous engine that takes a while to start each listener"""
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.binds = 0
+
+    def bind(self, service, port):
+        self.binds += 1
+        time.sleep(0.05)
+        open(f"{self.shard.socks}/{service}.sock", "w").close()
+        return None
+
+    def unbind(self, service, port, pid=None):
+        os.remove(f"{self.shard.socks}/{service}.sock")
+
+
+def test_concurrent_binds_start_one_listener(dna, monkeypatch):
+    monkeypatch.setattr(SocatHelper, "_setup", lambda self, force=False: None)
+    socat = SocatHelper(dna, engine="mux")
+    engine = socat.shards[0].engine = SlowEngine(socat.shards[0])
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(socat.bind, "app", "80") for _ in range(4)]
+    for future in futures:
+        assert future.result().result() == f"{socat.socks}/app.sock"
+    assert engine.binds == 1
+    assert socat.bindings == {"app": "80"}
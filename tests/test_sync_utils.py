@@ -0,0 +1,72 @@
+import time
+from threading import Barrier, Event, Thread
+from dna.utils import Debouncer
+
+
+def call_together(debouncer, count):
+    """Call ``debouncer`` from ``count`` threads at once
+
+    :return: the exception each call raised, or ``None``
+    """
+    barrier, outcomes = Barrier(count), [None] * count
+
+    def call(i):
+        barrier.wait()
+        try:
+            debouncer()
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_calls_collapse_into_one_run():
+    runs = []
+    debouncer = Debouncer(lambda: runs.append(1), window=0.2)
+    assert call_together(debouncer, 5) == [None] * 5
+    assert len(runs) == 1
+    assert (debouncer.calls, debouncer.runs) == (5, 1)
+
+
+def test_call_during_a_run_runs_again():
+    started, gate, runs = Event(), Event(), []
+
+    def func():
+        runs.append(1)
+        started.set()
+        gate.wait(5)
+
+    debouncer = Debouncer(func, window=0)
+    first = Thread(target=debouncer)
+    first.start()
+    assert started.wait(5)
+    second = Thread(target=debouncer)
+    second.start()
+    while debouncer.calls < 2:
+        time.sleep(0.01)
+    gate.set()
+    first.join(5)
+    second.join(5)
+    assert len(runs) == 2
+
+
+def test_failed_run_raises_for_its_caller_and_others_retry():
+    runs = []
+
+    def func():
+        runs.append(1)
+        if len(runs) == 1:
+            raise RuntimeError("nginx failed to reload")
+
+    debouncer = Debouncer(func, window=0.2)
+    outcomes = call_together(debouncer, 2)
+    assert sorted(map(repr, outcomes)) == [
+        "None",
+        repr(RuntimeError("nginx failed to reload")),
+    ]
+    assert len(runs) == 2